@@ -0,0 +1,90 @@
+import numpy as np
+
+import config
+
+def to_servo_angles(angles):
+    # angles: float[N][6][3] ik angles -> servo angles in degree
+    return np.asarray(config.servoAngleCenter) + np.asarray(config.servoAngleSign) * np.asarray(angles)
+
+def to_ticks(servo_angles):
+    # servo angle -> PCA9685 on-time ticks, same mapping as adafruit servokit
+    fraction = np.clip(np.asarray(servo_angles) / config.servoActuationRange, 0, 1)
+    pulse = config.servoMinPulse + fraction * (config.servoMaxPulse - config.servoMinPulse)
+    ticks = np.rint(pulse * config.servoFrequency * config.servoTickResolution / 1e6)
+    return ticks.astype(np.uint16)
+
+def generate_c_header():
+    return """struct AngleTable {
+    const AngleType (*angles)[6][3];
+    int length;
+    int duration;
+    const int* entries;
+    int entriesCount;
+    const float* durations;
+};"""
+
+def generate_c_body(path, angles, dur, entries, durations=None, ticks=False):
+    servo = to_servo_angles(angles)
+    if ticks:
+        servo = to_ticks(servo)
+        fmt = "{:d}"
+    else:
+        fmt = "{:.2f}"
+
+    result = "\nconst AngleType {}_angles[][6][3] {{\n".format(path)
+    for frame in servo:
+        result += "    {" + ", ".join(
+            "{" + ", ".join(fmt.format(a) for a in leg) + "}"
+            for leg in frame
+        ) + "},\n"
+
+    result += "};\n"
+    result += "const int {}_angle_entries[] {{ {} }};\n".format(path, ",".join(str(e) for e in entries))
+    if durations is not None:
+        # per-frame durations in ms, from frame i to frame i+1
+        result += "const float {}_durations[] {{ {} }};\n".format(path, ", ".join("{:.2f}".format(d) for d in durations))
+    result += "const AngleTable {name}_angle_table {{{name}_angles, {count}, {dur}, {name}_angle_entries, {ecount}, {durations} }};".format(
+        name=path, count=len(servo), dur=dur, ecount=len(entries),
+        durations="nullptr" if durations is None else path + "_durations")
+    return result
+
+def generate_c_def(path):
+    return """const AngleTable& {name}AngleTable() {{
+    return {name}_angle_table;
+}}""".format(name=path)
+
+def round_durations(durations):
+    # s -> ms, rounded up so the table never plays faster than allowed
+    return np.ceil(np.asarray(durations) * 1e5) / 100
+
+def write_c_file(out_path, tables, ticks=False):
+    # tables: {path: (angles, dur, entries, durations)}, durations in s or None
+    with open(out_path, "w") as f:
+        print("//", file=f)
+        print("// This file is generated, dont directly modify content...", file=f)
+        print("//", file=f)
+        print("typedef {} AngleType;".format("uint16_t" if ticks else "float"), file=f)
+        print(generate_c_header(), file=f)
+        print("namespace {", file=f)
+        for path, (angles, dur, entries, durations) in tables.items():
+            if durations is not None:
+                durations = round_durations(durations)
+            print(generate_c_body(path, angles, dur, entries, durations, ticks), file=f)
+        print("}\n", file=f)
+        for path in tables:
+            print(generate_c_def(path), file=f)
+
+def write_npz_file(out_path, tables, ticks=False):
+    # tables: {path: (angles, dur, entries, durations)}, durations in s or None
+    arrays = {}
+    for path, (angles, dur, entries, durations) in tables.items():
+        servo = to_servo_angles(angles)
+        arrays[path + "_angles"] = servo.astype(np.float32)
+        if ticks:
+            arrays[path + "_ticks"] = to_ticks(servo)
+        arrays[path + "_dur"] = np.array(dur)
+        arrays[path + "_entries"] = np.array(list(entries), dtype=np.int32)
+        if durations is not None:
+            arrays[path + "_durations"] = round_durations(durations).astype(np.float32)
+
+    np.savez(out_path, **arrays)
@@ -0,0 +1,162 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+import angle_table
+from main import collectPath, verify_path, generate_c_body
+
+STAGES = ("generate", "verify", "codegen", "angle_codegen")
+
+# synthetic path scripts, one per generation mode
+SYNTHETIC_SHIFT = '''from collections import deque
+
+from lib import semicircle2_generator
+
+g_steps = 20
+
+def path_generator():
+    assert (g_steps % 4) == 0
+    halfsteps = int(g_steps/2)
+
+    path = semicircle2_generator(g_steps, {radius}, 15, 5)
+    mir_path = deque(path)
+    mir_path.rotate(halfsteps)
+
+    return [path, mir_path, path, mir_path, path, mir_path, ], "shift", 20, (0, halfsteps)
+'''
+
+SYNTHETIC_MATRIX = '''import math
+
+from lib import get_rotate_x_matrix, get_rotate_z_matrix
+
+g_steps = 20
+
+def path_generator():
+    result = []
+    for i in range(g_steps):
+        angle = {angle} * math.sin(2 * math.pi * i / g_steps)
+        result.append(get_rotate_z_matrix(angle) @ get_rotate_x_matrix(angle / 2))
+
+    return result, "matrix", 20, range(g_steps)
+'''
+
+def write_synthetic(out_dir, count):
+    # count synthetic scripts, alternating shift and matrix mode
+    for i in range(count):
+        if i % 2 == 0:
+            source = SYNTHETIC_SHIFT.format(radius=10 + i % 20)
+        else:
+            source = SYNTHETIC_MATRIX.format(angle=2 + i % 10)
+        with open(os.path.join(out_dir, "synthetic{:04d}.py".format(i)), "w") as f:
+            f.write(source)
+
+def best_time(func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def bench_path(path, steps, repeat):
+    module = sys.modules[path]
+    if hasattr(module, "g_steps"):
+        module.g_steps = steps
+
+    gen_time, params = best_time(module.path_generator, repeat)
+    with contextlib.redirect_stdout(io.StringIO()):
+        verify_time, (_, angles) = best_time(lambda: verify_path(path, params), repeat)
+    codegen_time, body = best_time(lambda: generate_c_body(path, params), repeat)
+    angle_time, angle_body = best_time(lambda: angle_table.generate_c_body(path, angles, params[2], params[3]), repeat)
+
+    return {
+        "steps": len(angles),
+        "generate": gen_time,
+        "verify": verify_time,
+        "codegen": codegen_time,
+        "angle_codegen": angle_time,
+        "table_bytes": len(body),
+        "angle_table_bytes": len(angle_body),
+    }
+
+def bench(path_dirs, step_counts, repeat):
+    results = {"collect": {}, "paths": {}}
+
+    scripts = {}
+    for path_dir in path_dirs:
+        start = time.perf_counter()
+        scripts.update(collectPath(path_dir))
+        results["collect"][path_dir] = time.perf_counter() - start
+
+    defaults = {path: getattr(sys.modules[path], "g_steps", None) for path in scripts}
+    try:
+        for steps in step_counts:
+            for path in scripts:
+                try:
+                    result = bench_path(path, steps, repeat)
+                except (AssertionError, ValueError, ZeroDivisionError) as err:
+                    print("{} with {} steps failed: {!r}".format(path, steps, err))
+                    continue
+                results["paths"].setdefault(path, {})[str(steps)] = result
+    finally:
+        for path, value in defaults.items():
+            if value is not None:
+                sys.modules[path].g_steps = value
+
+    return results
+
+def summarize(results, step_counts):
+    # stage totals over all paths per step count, the largest is the bottleneck
+    print("{:>7} {:>10} {:>10} {:>10} {:>10} {:>12} {:>12}  bottleneck".format(
+        "steps", *STAGES, "table B", "angles B"))
+    for steps in step_counts:
+        rows = [r[str(steps)] for r in results["paths"].values() if str(steps) in r]
+        if not rows:
+            continue
+        totals = {stage: sum(r[stage] for r in rows) for stage in STAGES}
+        print("{:7d} {:9.3f}s {:9.3f}s {:9.3f}s {:9.3f}s {:12d} {:12d}  {}".format(
+            steps, *(totals[stage] for stage in STAGES),
+            sum(r["table_bytes"] for r in rows), sum(r["angle_table_bytes"] for r in rows),
+            max(STAGES, key=totals.get)))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='pathTool: benchmark generation, verification and code generation')
+    parser.add_argument('--pathDir', metavar='DIR',  dest='path_dir', default='path',
+                        help='path script directory (default: {})'.format('path'))
+    parser.add_argument('--steps', metavar='N,N,...', dest='steps', default='20,40,80,160,320,640,1280,2560',
+                        help='g_steps values, multiples of 4 (default: 20 to 2560)')
+    parser.add_argument('--synthetic', metavar='N', dest='synthetic', type=int, default=0,
+                        help='also benchmark N generated path scripts (default: 0)')
+    parser.add_argument('--repeat', metavar='N', dest='repeat', type=int, default=3,
+                        help='runs per measurement, the fastest is kept (default: 3)')
+    parser.add_argument('--out', metavar='PATH', dest='out', default=None,
+                        help='write results as json')
+    args = parser.parse_args()
+
+    step_counts = [int(s) for s in args.steps.split(",")]
+
+    # synthetic scripts import lib from the path directory
+    sys.path.insert(0, args.path_dir)
+    path_dirs = [args.path_dir]
+    with tempfile.TemporaryDirectory() as synthetic_dir:
+        if args.synthetic:
+            write_synthetic(synthetic_dir, args.synthetic)
+            sys.path.insert(0, synthetic_dir)
+            path_dirs.append(synthetic_dir)
+
+        results = bench(path_dirs, step_counts, args.repeat)
+
+    for path_dir, elapsed in results["collect"].items():
+        print("collectPath {}: {:.3f}s".format(path_dir, elapsed))
+    summarize(results, step_counts)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=4)
+        print("Results written to {}".format(args.out))
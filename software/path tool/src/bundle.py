@@ -0,0 +1,52 @@
+import json
+import os
+
+import numpy as np
+
+import angle_table
+
+BUNDLE_VERSION = 1
+MANIFEST = "manifest.json"
+
+def path_arrays(params):
+    data, mode, _, _ = params
+
+    if mode == "shift":
+        # data: float[6][N][3] -> offset: float[N][6][3]
+        assert(len(data) == 6)
+        return {"offset": np.array([list(leg) for leg in data], dtype=np.float64).transpose(1, 0, 2)}
+    elif mode == "matrix":
+        # data: np.matrix[N] -> transform: float[N][4][4]
+        return {"transform": np.array([np.asarray(m) for m in data], dtype=np.float64)}
+
+    raise RuntimeError("Generation mode: {} not supported".format(mode))
+
+def write_bundle(out_dir, results, angles=None, durations=None):
+    # results: {path: (data, mode, dur, entries)}, angles: {path: float[N][6][3]}
+    # durations: {path: float[N]} retimed frame durations in s
+    os.makedirs(out_dir, exist_ok=True)
+
+    manifest = {"version": BUNDLE_VERSION, "gaits": {}}
+    for path, params in results.items():
+        _, mode, dur, entries = params
+        arrays = path_arrays(params)
+        if angles is not None and path in angles:
+            arrays["angles"] = angle_table.to_servo_angles(angles[path])
+        if durations is not None and path in durations:
+            arrays["durations"] = angle_table.round_durations(durations[path])
+
+        files = {}
+        for key, array in arrays.items():
+            files[key] = "{}_{}.npy".format(path, key)
+            np.save(os.path.join(out_dir, files[key]), np.ascontiguousarray(array))
+
+        manifest["gaits"][path] = {
+            "mode": mode,
+            "steps": len(next(iter(arrays.values()))),
+            "dur": dur,
+            "entries": [int(e) for e in entries],
+            "files": files,
+        }
+
+    with open(os.path.join(out_dir, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=4)
@@ -46,3 +46,18 @@ angleLimitation = (
     (-45, 75),
     (-60, 60),
 )
+
+# servo angle = servoAngleCenter + servoAngleSign * ik angle
+servoAngleCenter = (90, 90, 90)
+servoAngleSign = (1, -1, 1)
+
+# PCA9685 pulse settings, used to quantize servo angles into ticks
+servoFrequency = 50
+servoMinPulse = 750
+servoMaxPulse = 2250
+servoActuationRange = 180
+servoTickResolution = 4096
+
+# servo speed limits per joint, degree/s and degree/s^2 (SG90/MG90S: 0.1s/60deg)
+servoMaxVelocity = (600, 600, 600)
+servoMaxAcceleration = (50000, 50000, 50000)
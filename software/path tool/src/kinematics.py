@@ -1,5 +1,7 @@
 import math
 
+import numpy as np
+
 import config
 
 pi = math.acos(-1)
@@ -22,4 +24,27 @@ def ik(to):
     angles.append((ar + a1) * 180 / pi)
     angles.append(90 - ((a1 + a2)  * 180 / pi))
 
-    return angles
\ No newline at end of file
+    return angles
+
+def ik_batch(to):
+    # same as ik() for an array of points float[...][3] -> float[...][3]
+    to = np.asarray(to, dtype=np.float64)
+    angles = np.zeros_like(to)
+    x = to[..., 0] - config.kLegRootToJoint1
+    y = to[..., 1]
+
+    angles[..., 0] = np.arctan2(y, x) * 180 / pi
+
+    x = np.sqrt(x*x + y*y) - config.kLegJoint1ToJoint2
+    y = to[..., 2]
+    ar = np.arctan2(y, x)
+    lr2 = x*x + y*y
+    lr = np.sqrt(lr2)
+    with np.errstate(invalid='ignore'):
+        a1 = np.arccos((lr2 + config.kLegJoint2ToJoint3*config.kLegJoint2ToJoint3 - config.kLegJoint3ToTip*config.kLegJoint3ToTip)/(2*config.kLegJoint2ToJoint3*lr))
+        a2 = np.arccos((lr2 - config.kLegJoint2ToJoint3*config.kLegJoint2ToJoint3 + config.kLegJoint3ToTip*config.kLegJoint3ToTip)/(2*config.kLegJoint3ToTip*lr))
+
+    angles[..., 1] = (ar + a1) * 180 / pi
+    angles[..., 2] = 90 - ((a1 + a2) * 180 / pi)
+
+    return angles
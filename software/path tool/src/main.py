@@ -3,7 +3,12 @@ import logging
 import os
 import sys
 
+import numpy as np
+
+import angle_table
+import bundle
 import config
+import dynamics
 import kinematics
 from path.lib import point_rotate_z, matrix_mul
 
@@ -32,7 +37,7 @@ def verify_points(pt):
             ok = False
             failed.append((i, angle))
 
-    return ok, failed
+    return ok, failed, angles
 
 def verify_path(path, params):
     data, mode, _, _ = params
@@ -43,11 +48,12 @@ def verify_path(path, params):
         # data: float[6][N][3]
         assert(len(data) == 6)
 
+        angles = np.zeros((len(data[0]), 6, 3))
         for i in range(len(data[0])):
             for j in range(6):
                 pt = [config.defaultPosition[j][k] - config.mountPosition[j][k] + data[j][i][k] for k in range(3)]
                 pt = point_rotate_z(pt, config.defaultAngle[j])
-                ok, failed = verify_points(pt)
+                ok, failed, angles[i, j] = verify_points(pt)
 
                 if not ok:
                     print("{}, {} failed: {}".format(i, j, failed))
@@ -55,6 +61,7 @@ def verify_path(path, params):
 
     elif mode == "matrix":
         # data: np.matrix[N]
+        angles = np.zeros((len(data), 6, 3))
         for i in range(len(data)):
             for j in range(6):
                 pt = matrix_mul(data[i], config.defaultPosition[j])
@@ -62,14 +69,29 @@ def verify_path(path, params):
                     pt[k] -= config.mountPosition[j][k]
                 pt = point_rotate_z(pt, config.defaultAngle[j])
 
-                ok, failed = verify_points(pt)
+                ok, failed, angles[i, j] = verify_points(pt)
 
                 if not ok:
                     print("{}, {} failed: {}".format(i, j, failed))
                     all_ok = False
-    
-    return all_ok
 
+    else:
+        raise RuntimeError("Generation mode: {} not supported".format(mode))
+
+    # angles: float[N][6][3], ik angles of every frame and leg
+    return all_ok, angles
+
+
+def verify_rates(path, params, angles, max_velocity=None, max_acceleration=None):
+    _, _, dur, _ = params
+    report = dynamics.check_rates(angles, dur, max_velocity, max_acceleration)
+
+    print("{}: max {:.0f} deg/s, {:.0f} deg/s^2, max playback {:.1f} frames/s (dur >= {:.1f} ms, using {})".format(
+        path, report["max_velocity"], report["max_acceleration"], report["max_rate"], report["min_dur"], dur))
+    if report["failed"]:
+        print("too fast at frames: {}".format(sorted(report["failed"])))
+
+    return len(report["failed"]) == 0
 
 def generate_c_body(path, params):
     data, mode, dur, entries = params
@@ -120,6 +142,22 @@ if __name__ == '__main__':
                         help='path script directory (default: {})'.format('path'))
     parser.add_argument('--outPath', metavar='PATH',  dest='out_path', default='output/movement_table.h',
                         help='path script directory (default: {})'.format('output/movement_table.h'))
+    parser.add_argument('--angleTable', metavar='PATH',  dest='angle_path', default=None,
+                        help='also write pre-solved servo angle tables as C header')
+    parser.add_argument('--angleNpz', metavar='PATH',  dest='angle_npz_path', default=None,
+                        help='also write pre-solved servo angle tables as NumPy .npz')
+    parser.add_argument('--ticks', dest='ticks', action='store_true',
+                        help='quantize angle tables to PCA9685 servo ticks')
+    parser.add_argument('--bundle', metavar='DIR',  dest='bundle_dir', default=None,
+                        help='also write a NumPy gait bundle for the Raspberry Pi runtime')
+    parser.add_argument('--maxVelocity', metavar='DEG/S', dest='max_velocity', type=float, default=None,
+                        help='servo velocity limit (default: config.servoMaxVelocity)')
+    parser.add_argument('--maxAcceleration', metavar='DEG/S^2', dest='max_acceleration', type=float, default=None,
+                        help='servo acceleration limit (default: config.servoMaxAcceleration)')
+    parser.add_argument('--retime', dest='retime', action='store_true',
+                        help='add time-optimal per-frame durations to angle tables and gait bundle')
+    parser.add_argument('--strictRates', dest='strict_rates', action='store_true',
+                        help='treat servo velocity/acceleration violations as errors')
     args = parser.parse_args()
 
     sys.path.insert(0, args.path_dir)
@@ -131,9 +169,13 @@ if __name__ == '__main__':
     results = {path: generator() for path, generator in paths.items()}
 
     # verify all path is within safe angles
-    
-    verified = [1 for path, data in results.items() if not verify_path(path, data)]
-    if len(verified) > 0:
+    verified = {path: verify_path(path, data) for path, data in results.items()}
+
+    # check servos can follow every path at its frame duration
+    rates_ok = all([verify_rates(path, data, verified[path][1], args.max_velocity, args.max_acceleration)
+                    for path, data in results.items()])
+
+    if not all(ok for ok, _ in verified.values()) or (args.strict_rates and not rates_ok):
         print("There were errors, exit...")
     else:
         # output results
@@ -150,4 +192,21 @@ if __name__ == '__main__':
 
         print("Result written to {}".format(args.out_path))
 
+        durations = {}
+        if args.retime:
+            for path, data in results.items():
+                durations[path] = dynamics.retime(verified[path][1], args.max_velocity, args.max_acceleration)
+                print("{}: retimed cycle {:.1f} ms (was {} ms)".format(path, durations[path].sum() * 1000, len(durations[path]) * data[2]))
+
+        tables = {path: (verified[path][1], data[2], data[3], durations.get(path)) for path, data in results.items()}
+        if args.angle_path:
+            angle_table.write_c_file(args.angle_path, tables, args.ticks)
+            print("Angle tables written to {}".format(args.angle_path))
+        if args.angle_npz_path:
+            angle_table.write_npz_file(args.angle_npz_path, tables, args.ticks)
+            print("Angle tables written to {}".format(args.angle_npz_path))
+        if args.bundle_dir:
+            bundle.write_bundle(args.bundle_dir, results, {path: v[1] for path, v in verified.items()}, durations)
+            print("Gait bundle written to {}".format(args.bundle_dir))
+
 
@@ -0,0 +1,199 @@
+import argparse
+import multiprocessing
+import os
+import sys
+
+import numpy as np
+
+import bundle
+import config
+import kinematics
+from main import collectPath
+from transforms import apply, rotate_z
+
+# objectives, all maximized
+OBJECTIVES = ("stride", "clearance", "margin")
+
+def parse_param(text):
+    # name=lo:hi[:count]
+    name, _, spec = text.partition("=")
+    values = [float(v) for v in spec.split(":")]
+    if len(values) == 2:
+        values.append(0)
+    if len(values) != 3:
+        raise argparse.ArgumentTypeError("expected name=lo:hi[:count], got {}".format(text))
+    return name, values[0], values[1], int(values[2])
+
+def default_params(module):
+    # every numeric module setting except the step count, +-50% around its current value
+    return [(name, min(value * 0.5, value * 1.5), max(value * 0.5, value * 1.5), 0) for name, value in vars(module).items()
+            if not name.startswith("_") and name != "g_steps" and type(value) in (int, float) and value != 0]
+
+def gen_candidates(module, params, samples, seed):
+    # grid over params with a count, random samples over the others
+    rng = np.random.default_rng(seed)
+
+    grid = [np.linspace(lo, hi, count) for _, lo, hi, count in params if count > 0]
+    if grid:
+        grid = np.stack([g.ravel() for g in np.meshgrid(*grid, indexing="ij")], axis=-1)
+        if samples:
+            grid = grid[rng.choice(len(grid), min(samples, len(grid)), replace=False)]
+    else:
+        grid = np.zeros((samples, 0))
+
+    candidates = []
+    for row in grid:
+        values = iter(row)
+        candidate = {}
+        for name, lo, hi, count in params:
+            value = next(values) if count > 0 else rng.uniform(lo, hi)
+            candidate[name] = int(round(value)) if type(getattr(module, name)) is int else float(value)
+        candidates.append(candidate)
+
+    # rounding integer settings gives duplicates
+    return list({tuple(c.items()): c for c in candidates}.values())
+
+def foot_positions(params):
+    # path_generator() result -> body foot positions float[N][6][3]
+    arrays = bundle.path_arrays(params)
+    if "offset" in arrays:
+        return np.asarray(config.defaultPosition) + arrays["offset"]
+    return apply(arrays["transform"], config.defaultPosition)
+
+def local_positions(feet):
+    # body foot positions -> leg local positions, as verify_path() does point by point
+    rotation = rotate_z(config.defaultAngle)[:, :3, :3]
+    return np.einsum("lij,nlj->nli", rotation, feet - np.asarray(config.mountPosition))
+
+def metrics(feet, angles):
+    limits = np.asarray(config.angleLimitation)
+    margin = np.minimum(angles - limits[:, 0], limits[:, 1] - angles)
+    if np.isnan(margin).any():
+        margin = -np.inf
+    else:
+        margin = np.min(margin)
+
+    # longest horizontal foot travel and highest foot lift of any leg
+    xy = feet[:, :, :2]
+    travel = np.linalg.norm(xy[:, None] - xy[None, :], axis=-1)
+    return {
+        "stride": float(np.max(travel)),
+        "clearance": float(np.max(np.ptp(feet[:, :, 2], axis=0))),
+        "margin": float(margin),
+    }
+
+_module = None
+
+def init_worker(path_dir, name):
+    global _module
+    sys.path.insert(0, path_dir)
+    _module = __import__(name)
+
+def evaluate(candidates):
+    # generate all paths of the chunk, then solve ik for all of them in one batch
+    generated = []
+    for candidate in candidates:
+        for key, value in candidate.items():
+            setattr(_module, key, value)
+        try:
+            feet = foot_positions(_module.path_generator())
+        except (AssertionError, ValueError, ZeroDivisionError):
+            feet = None
+        generated.append(feet)
+
+    valid = [feet for feet in generated if feet is not None]
+    if not valid:
+        return [None] * len(candidates)
+
+    local = np.concatenate([local_positions(feet).reshape(-1, 3) for feet in valid])
+    angles = kinematics.ik_batch(local)
+
+    results = []
+    offset = 0
+    for feet in generated:
+        if feet is None:
+            results.append(None)
+            continue
+        count = feet.shape[0] * 6
+        results.append(metrics(feet, angles[offset:offset + count].reshape(feet.shape)))
+        offset += count
+    return results
+
+def pareto_front(scores):
+    # scores: float[N][K], maximized -> indices of the non dominated rows
+    better_eq = np.all(scores[None, :, :] >= scores[:, None, :], axis=-1)
+    better = np.any(scores[None, :, :] > scores[:, None, :], axis=-1)
+    dominated = np.any(better_eq & better, axis=1)
+    return np.nonzero(~dominated)[0]
+
+def optimize(path_dir, name, params, samples, seed, jobs, chunk):
+    init_worker(path_dir, name)
+    if not params:
+        params = default_params(_module)
+    candidates = gen_candidates(_module, params, samples, seed)
+    chunks = [candidates[i:i + chunk] for i in range(0, len(candidates), chunk)]
+
+    with multiprocessing.Pool(jobs, initializer=init_worker, initargs=(path_dir, name)) as pool:
+        results = [r for rs in pool.map(evaluate, chunks) for r in rs]
+
+    feasible = [(c, r) for c, r in zip(candidates, results) if r is not None and r["margin"] >= 0]
+    if not feasible:
+        return []
+
+    scores = np.array([[r[k] for k in OBJECTIVES] for _, r in feasible])
+    return sorted((feasible[i] for i in pareto_front(scores)), key=lambda cr: -cr[1]["stride"])
+
+def show_front(name, front, count):
+    print("{}: {} candidates on the Pareto front".format(name, len(front)))
+    for candidate, result in front[:count]:
+        print("  stride {stride:6.1f}  clearance {clearance:6.1f}  margin {margin:5.1f}  ".format(**result) +
+              ", ".join("{}={:.4g}".format(k, v) for k, v in candidate.items()))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='pathTool: optimize gait parameters within joint limits')
+    parser.add_argument('--pathDir', metavar='DIR',  dest='path_dir', default='path',
+                        help='path script directory (default: {})'.format('path'))
+    parser.add_argument('--gait', metavar='NAME', dest='gaits', action='append', default=None,
+                        help='path script to optimize, can be repeated (default: all)')
+    parser.add_argument('--param', metavar='NAME=LO:HI[:COUNT]', dest='params', action='append', type=parse_param, default=None,
+                        help='parameter range, swept with COUNT values or sampled randomly (default: all numeric settings +-50%%)')
+    parser.add_argument('--samples', metavar='N', dest='samples', type=int, default=2000,
+                        help='random candidates per gait (default: 2000)')
+    parser.add_argument('--seed', metavar='N', dest='seed', type=int, default=0,
+                        help='random seed (default: 0)')
+    parser.add_argument('--jobs', metavar='N', dest='jobs', type=int, default=os.cpu_count(),
+                        help='worker processes (default: all cores)')
+    parser.add_argument('--chunk', metavar='N', dest='chunk', type=int, default=100,
+                        help='candidates evaluated per ik batch (default: 100)')
+    parser.add_argument('--show', metavar='N', dest='show', type=int, default=20,
+                        help='Pareto front entries to print per gait (default: 20)')
+    parser.add_argument('--pick', dest='pick', choices=OBJECTIVES, default='stride',
+                        help='objective used to choose from the Pareto front (default: stride)')
+    parser.add_argument('--bundle', metavar='DIR',  dest='bundle_dir', default=None,
+                        help='write the chosen parameters as a gait bundle')
+    args = parser.parse_args()
+
+    path_dir = os.path.abspath(args.path_dir)
+    sys.path.insert(0, path_dir)
+    gaits = args.gaits or list(collectPath(path_dir))
+
+    chosen = {}
+    for name in gaits:
+        front = optimize(path_dir, name, args.params, args.samples, args.seed, args.jobs, args.chunk)
+        show_front(name, front, args.show)
+        if front:
+            chosen[name] = max(front, key=lambda cr: cr[1][args.pick])[0]
+            print("  chosen: " + ", ".join("{} = {!r}".format(k, v) for k, v in chosen[name].items()))
+
+    if args.bundle_dir and chosen:
+        results = {}
+        angles = {}
+        for name, candidate in chosen.items():
+            module = __import__(name)
+            for key, value in candidate.items():
+                setattr(module, key, value)
+            results[name] = module.path_generator()
+            angles[name] = kinematics.ik_batch(local_positions(foot_positions(results[name])))
+
+        bundle.write_bundle(args.bundle_dir, results, angles)
+        print("Gait bundle written to {}".format(args.bundle_dir))
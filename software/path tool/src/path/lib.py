@@ -1,6 +1,7 @@
 from collections import deque
 import math
-import numpy as np
+
+from transforms import rotate_x, rotate_y, rotate_z, apply
 
 pi = math.acos(-1)
 
@@ -62,56 +63,34 @@ def semicircle2_generator(steps, y_radius, z_radius, x_radius, reverse=False):
     return result
 
 def get_rotate_x_matrix(angle):
-    angle = angle * pi / 180
-    return np.matrix([
-        [1, 0, 0, 0],
-        [0, math.cos(angle), -math.sin(angle), 0],
-        [0, math.sin(angle), math.cos(angle), 0],
-        [0, 0, 0, 1],
-    ])
+    return rotate_x(angle)
 
 def get_rotate_y_matrix(angle):
-    angle = angle * pi / 180
-    return np.matrix([
-        [math.cos(angle), 0, math.sin(angle), 0],
-        [0, 1, 0, 0],
-        [-math.sin(angle), 0, math.cos(angle), 0],
-        [0, 0, 0, 1],
-    ])
+    return rotate_y(angle)
 
 def get_rotate_z_matrix(angle):
-    angle = angle * pi / 180
-    return np.matrix([
-        [math.cos(angle), -math.sin(angle), 0, 0],
-        [math.sin(angle), math.cos(angle), 0, 0],
-        [0, 0, 1, 0],
-        [0, 0, 0, 1],
-    ])
+    return rotate_z(angle)
 
 def matrix_mul(m, pt):
-    ptx = list(pt) + [1]
-    return list((m * np.matrix(ptx).T).T.flat)[:-1]
+    return apply(m, [pt])[0].tolist()
 
 def point_rotate_x(pt, angle):
-    ptx = list(pt) + [1]
-    return list((get_rotate_x_matrix(angle) * np.matrix(ptx).T).T.flat)[:-1]
+    return apply(rotate_x(angle), [pt])[0].tolist()
 
 def point_rotate_y(pt, angle):
-    ptx = list(pt) + [1]
-    return list((get_rotate_y_matrix(angle) * np.matrix(ptx).T).T.flat)[:-1]
+    return apply(rotate_y(angle), [pt])[0].tolist()
 
 def point_rotate_z(pt, angle):
-    ptx = list(pt) + [1]
-    return list((get_rotate_z_matrix(angle) * np.matrix(ptx).T).T.flat)[:-1]
+    return apply(rotate_z(angle), [pt])[0].tolist()
 
 def path_rotate_x(path, angle):
-    return [point_rotate_x(p, angle) for p in path]
+    return apply(rotate_x(angle), list(path)).tolist()
 
 def path_rotate_y(path, angle):
-    return [point_rotate_y(p, angle) for p in path]
+    return apply(rotate_y(angle), list(path)).tolist()
 
 def path_rotate_z(path, angle):
-    return [point_rotate_z(p, angle) for p in path]
+    return apply(rotate_z(angle), list(path)).tolist()
 
 if __name__ == '__main__':
     pt = [0, 1, 0]
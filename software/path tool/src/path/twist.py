@@ -21,15 +21,15 @@ def path_generator():
 
     m = get_rotate_x_matrix(raise_angle)
     for i in range(quarter):
-        result.append(m * get_rotate_z_matrix(i*step_x_angle) * get_rotate_x_matrix(i*step_y_angle))
+        result.append(m @ get_rotate_z_matrix(i*step_x_angle) @ get_rotate_x_matrix(i*step_y_angle))
 
     for i in range(quarter):
-        result.append(m * get_rotate_z_matrix((quarter-i)*step_x_angle) * get_rotate_x_matrix((quarter-i)*step_y_angle))
+        result.append(m @ get_rotate_z_matrix((quarter-i)*step_x_angle) @ get_rotate_x_matrix((quarter-i)*step_y_angle))
 
     for i in range(quarter):
-        result.append(m * get_rotate_z_matrix(-i*step_x_angle) * get_rotate_x_matrix(i*step_y_angle))
+        result.append(m @ get_rotate_z_matrix(-i*step_x_angle) @ get_rotate_x_matrix(i*step_y_angle))
 
     for i in range(quarter):
-        result.append(m * get_rotate_z_matrix((-quarter+i)*step_x_angle) * get_rotate_x_matrix((quarter-i)*step_y_angle))
+        result.append(m @ get_rotate_z_matrix((-quarter+i)*step_x_angle) @ get_rotate_x_matrix((quarter-i)*step_y_angle))
 
     return result, "matrix", 50, [0, 10]
\ No newline at end of file
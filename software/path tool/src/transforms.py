@@ -0,0 +1,113 @@
+# Batched homogeneous transforms
+#
+# Every builder takes scalars or arrays of angles (in degree) / offsets and
+# returns a stack of 4x4 transforms with the same leading shape, so a whole
+# path is built with one call instead of one np.matrix per step.
+
+import numpy as np
+
+def _stack(shape):
+    m = np.zeros(shape + (4, 4))
+    m[..., 0, 0] = 1
+    m[..., 1, 1] = 1
+    m[..., 2, 2] = 1
+    m[..., 3, 3] = 1
+    return m
+
+def rotate_x(angle):
+    angle = np.asarray(angle, dtype=np.float64) * np.pi / 180
+    m = _stack(angle.shape)
+    c = np.cos(angle)
+    s = np.sin(angle)
+    m[..., 1, 1] = c
+    m[..., 1, 2] = -s
+    m[..., 2, 1] = s
+    m[..., 2, 2] = c
+    return m
+
+def rotate_y(angle):
+    angle = np.asarray(angle, dtype=np.float64) * np.pi / 180
+    m = _stack(angle.shape)
+    c = np.cos(angle)
+    s = np.sin(angle)
+    m[..., 0, 0] = c
+    m[..., 0, 2] = s
+    m[..., 2, 0] = -s
+    m[..., 2, 2] = c
+    return m
+
+def rotate_z(angle):
+    angle = np.asarray(angle, dtype=np.float64) * np.pi / 180
+    m = _stack(angle.shape)
+    c = np.cos(angle)
+    s = np.sin(angle)
+    m[..., 0, 0] = c
+    m[..., 0, 1] = -s
+    m[..., 1, 0] = s
+    m[..., 1, 1] = c
+    return m
+
+def translate(offset):
+    offset = np.asarray(offset, dtype=np.float64)
+    m = _stack(offset.shape[:-1])
+    m[..., :3, 3] = offset
+    return m
+
+def compose(*transforms):
+    # compose(a, b, c) == a @ b @ c, stacks broadcast against each other
+    result = transforms[0]
+    for m in transforms[1:]:
+        result = np.matmul(result, m)
+    return result
+
+def homogeneous(points):
+    points = np.asarray(points, dtype=np.float64)
+    ptx = np.ones(points.shape[:-1] + (4,))
+    ptx[..., :3] = points
+    return ptx
+
+def apply(transform, points):
+    # transform: (..., 4, 4), points: (..., P, 3) -> (..., P, 3)
+    ptx = homogeneous(points)
+    return np.matmul(transform, np.swapaxes(ptx, -1, -2))[..., :3, :].swapaxes(-1, -2)
+
+if __name__ == '__main__':
+    # micro-benchmark against the np.matrix based functions in lib.py
+    import timeit
+
+    def legacy_rotate_x_matrix(angle):
+        angle = angle * np.pi / 180
+        return np.matrix([
+            [1, 0, 0, 0],
+            [0, np.cos(angle), -np.sin(angle), 0],
+            [0, np.sin(angle), np.cos(angle), 0],
+            [0, 0, 0, 1],
+        ])
+
+    def legacy_path_rotate_x(path, angle):
+        ptx = np.append(path, np.ones((np.shape(path)[0], 1)), axis=1)
+        return ((legacy_rotate_x_matrix(angle) * np.matrix(ptx).T).T)[:, :-1]
+
+    def legacy_frames(points, angles):
+        return np.array([legacy_path_rotate_x(points, a) for a in angles])
+
+    def batched_frames(points, angles):
+        return apply(rotate_x(angles), points)
+
+    rng = np.random.default_rng(0)
+    points = rng.uniform(-150, 150, (6, 3))
+
+    for steps in (20, 200, 2000):
+        angles = np.linspace(-15, 15, steps)
+        diff = np.max(np.abs(legacy_frames(points, angles) -
+                             batched_frames(points, angles)))
+
+        number = max(1, 2000 // steps)
+        t_legacy = timeit.timeit(
+            lambda: legacy_frames(points, angles), number=number)/number
+        t_batched = timeit.timeit(
+            lambda: batched_frames(points, angles), number=number)/number
+        print('{:5d} frames  np.matrix {:9.3f} ms  batched {:7.3f} ms  '
+              'speedup {:6.1f}x  max diff {:.1e}'.format(
+                  steps, t_legacy*1e3, t_batched*1e3,
+                  t_legacy/t_batched, diff))
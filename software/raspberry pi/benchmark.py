@@ -0,0 +1,245 @@
+#!python
+#
+# 2021  Zhengyu Peng
+# Website: https://zpeng.me
+#
+# `                      `
+# -:.                  -#:
+# -//:.              -###:
+# -////:.          -#####:
+# -/:.://:.      -###++##:
+# ..   `://:-  -###+. :##:
+#        `:/+####+.   :##:
+# .::::::::/+###.     :##:
+# .////-----+##:    `:###:
+#  `-//:.   :##:  `:###/.
+#    `-//:. :##:`:###/.
+#      `-//:+######/.
+#        `-/+####/.
+#          `+##+.
+#           :##:
+#           :##:
+#           :##:
+#           :##:
+#           :##:
+#            .+:
+
+
+# Control loop benchmarks on fake servos, runs on any Linux box
+#
+# python3 benchmark.py --out bench.json [--compare old.json]
+# python3 benchmark.py --set compileGaits=false
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from queue import Queue
+
+import numpy as np
+
+import path_generator
+from hexapod import Hexapod
+from simulator import FakeServoKit, VirtualClock
+
+
+def summarize(times_ns):
+    # per frame times -> frames/s and percentiles in us
+    times_us = np.asarray(times_ns, dtype=np.float64)/1000
+    return {'frames': len(times_us),
+            'fps': 1e6/np.mean(times_us),
+            'mean_us': float(np.mean(times_us)),
+            'p50_us': float(np.percentile(times_us, 50)),
+            'p99_us': float(np.percentile(times_us, 99))}
+
+
+def alloc_stats(func, count):
+    # peak memory allocated while running one call, and blocks still
+    # allocated per call after count calls (a leak shows up here, blocks
+    # allocated and freed within a call do not)
+    func()
+    tracemalloc.start()
+    try:
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        func()
+        peak = tracemalloc.get_traced_memory()[1] - base
+    finally:
+        tracemalloc.stop()
+
+    blocks = sys.getallocatedblocks()
+    for _ in range(count):
+        func()
+    return {'peak_alloc_bytes': int(peak),
+            'retained_blocks_per_call':
+                (sys.getallocatedblocks() - blocks)/count}
+
+
+def bench_call(func, count):
+    func()
+    times = np.empty(count, dtype=np.int64)
+    for idx in range(count):
+        start = time.perf_counter_ns()
+        func()
+        times[idx] = time.perf_counter_ns() - start
+    result = summarize(times)
+    result.update(alloc_stats(func, min(count, 100)))
+    return result
+
+
+def bench_motion(hexapod, motion, cycles):
+    # frame time is the time between two frames sent to the servos, it
+    # covers inverse kinematics, servo output and the queue poll
+    stamps = []
+    move_legs = hexapod.move_legs
+
+    def timed_move_legs(angles, played=True):
+        move_legs(angles, played)
+        stamps.append(time.perf_counter_ns())
+
+    def play():
+        if 'angles' in motion:
+            hexapod.angle_motion(motion['angles'], motion.get('durations'))
+        elif motion['type'] == 'motion':
+            hexapod.motion(motion['coord'], motion.get('durations'))
+        else:
+            hexapod.posture(motion['coord'])
+
+    play()
+    hexapod.move_legs = timed_move_legs
+    times = []
+    try:
+        for _ in range(cycles):
+            del stamps[:]
+            play()
+            times.extend(np.diff(stamps))
+    finally:
+        del hexapod.move_legs
+
+    result = summarize(times if times else [0])
+    frames = max(len(np.asarray(motion.get('coord', []))), 1)
+    allocs = alloc_stats(play, 3)
+    result['peak_alloc_bytes'] = allocs['peak_alloc_bytes']
+    result['retained_blocks_per_frame'] = \
+        allocs['retained_blocks_per_call']/frames
+    return result
+
+
+def make_hexapod(config_file, overrides):
+    with open(config_file, 'r') as read_file:
+        config = json.load(read_file)
+    config.update(overrides)
+    with tempfile.NamedTemporaryFile('w', suffix='.json',
+                                     delete=False) as write_file:
+        json.dump(config, write_file)
+    try:
+        return Hexapod(Queue(), write_file.name, FakeServoKit,
+                       VirtualClock())
+    finally:
+        os.remove(write_file.name)
+
+
+def run_benchmarks(hexapod, count, cycles):
+    results = {}
+    standby = hexapod.standby_posture['coord']
+    angles = hexapod.kinematics.inverse_kinematics(standby)
+    results['inverse_kinematics'] = bench_call(
+        lambda: hexapod.kinematics.inverse_kinematics(standby), count)
+    results['Leg.move_junctions'] = bench_call(
+        lambda: hexapod.legs[0].move_junctions(angles[0]), count)
+    results['move_legs'] = bench_call(
+        lambda: hexapod.move_legs(angles), count)
+
+    for cmd, motion in hexapod.cmd_dict.items():
+        if motion['type'] == 'posture':
+            continue
+        results['motion/' + cmd] = bench_motion(hexapod, motion, cycles)
+
+    for name in sorted(vars(path_generator)):
+        generator = getattr(path_generator, name)
+        if name.startswith('gen_') and name.endswith('_path') and \
+                name != 'gen_body_pose_path':
+            results['generator/' + name] = bench_call(
+                lambda: generator(standby), max(count//100, 10))
+    return results
+
+
+def version():
+    try:
+        return subprocess.check_output(
+            ['git', 'describe', '--always', '--dirty'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline):
+    print('{:40} {:>10} {:>10} {:>7}'.format(
+        'benchmark', 'p50 us', 'was', 'ratio'))
+    for name, result in results.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        ratio = result['p50_us']/old['p50_us'] if old['p50_us'] else 0
+        print('{:40} {:10.1f} {:10.1f} {:6.2f}x{}'.format(
+            name, result['p50_us'], old['p50_us'], ratio,
+            '  slower' if ratio > 1.1 else ''))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='benchmark the control loop on fake servos')
+    parser.add_argument('--config', default=os.path.join(
+                            os.path.dirname(os.path.abspath(__file__)),
+                            'config.json'),
+                        help='config file (default: %(default)s)')
+    parser.add_argument('--set', metavar='KEY=JSON', dest='overrides',
+                        action='append', default=[],
+                        help='override a config value, can be repeated')
+    parser.add_argument('--count', type=int, default=2000,
+                        help='calls per micro benchmark (default: '
+                        '%(default)s)')
+    parser.add_argument('--cycles', type=int, default=5,
+                        help='gait cycles per motion (default: %(default)s)')
+    parser.add_argument('--out', default=None, help='write results as json')
+    parser.add_argument('--compare', default=None,
+                        help='results json to compare against')
+    args = parser.parse_args()
+
+    overrides = {}
+    for item in args.overrides:
+        key, value = item.split('=', 1)
+        overrides[key] = json.loads(value)
+
+    hexapod = make_hexapod(args.config, overrides)
+    results = run_benchmarks(hexapod, args.count, args.cycles)
+
+    for name, result in results.items():
+        print('{:40} {:9.0f} /s  p50 {:8.1f} us  p99 {:8.1f} us  '
+              'peak {:7d} B'.format(name, result['fps'], result['p50_us'],
+                                    result['p99_us'],
+                                    result['peak_alloc_bytes']))
+
+    if args.compare:
+        with open(args.compare, 'r') as read_file:
+            compare(results, json.load(read_file)['results'])
+
+    if args.out:
+        with open(args.out, 'w') as write_file:
+            json.dump({'version': version(),
+                       'python': platform.python_version(),
+                       'numpy': np.__version__,
+                       'machine': platform.machine(),
+                       'overrides': overrides,
+                       'results': results}, write_file, indent=4)
+
+
+if __name__ == '__main__':
+    main()
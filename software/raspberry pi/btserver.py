@@ -29,10 +29,12 @@
 
 import socket
 from threading import Thread
-import json
 
 import os
 
+from config_service import load_config
+from tracing import tracer
+
 
 class BluetoothServer(Thread):
     ERROR = -1
@@ -44,13 +46,15 @@ class BluetoothServer(Thread):
     SIG_STOP = 1
     SIG_DISCONNECT = 2
 
-    def __init__(self, out_cmd_queue):
+    def __init__(self, out_cmd_queue, config=None):
         Thread.__init__(self)
 
         self.cmd_queue = out_cmd_queue
 
-        with open('/home/pi/hexapod/software/raspberry pi/config.json', 'r') as read_file:
-            self.config = json.load(read_file)
+        # shared with the other components by the config service
+        if config is None:
+            config = load_config()
+        self.config = config
 
         stream = os.popen('hciconfig hci0')
         output = stream.read()
@@ -81,7 +85,8 @@ class BluetoothServer(Thread):
                 # print('wait for a connection')
                 # self.status.emit(self.LISTEN, '')
                 try:
-                    self.connection, addr = self.bt_socket.accept()
+                    with tracer.span('accept', 'bt'):
+                        self.connection, addr = self.bt_socket.accept()
                     # self.connection.setblocking(False)
                     # self.connection.settimeout(1)
                     print('New connection')
@@ -92,7 +97,8 @@ class BluetoothServer(Thread):
                         # print('waiting for data')
                         # if self.signal == self.SIG_NORMAL:
                         try:
-                            data = self.connection.recv(4096)
+                            with tracer.span('recv', 'bt'):
+                                data = self.connection.recv(4096)
                         except socket.error as e:
                             print(e)
                             break
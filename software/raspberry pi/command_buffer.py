@@ -0,0 +1,187 @@
+#!python
+#
+# 2021  Zhengyu Peng
+# Website: https://zpeng.me
+#
+# `                      `
+# -:.                  -#:
+# -//:.              -###:
+# -////:.          -#####:
+# -/:.://:.      -###++##:
+# ..   `://:-  -###+. :##:
+#        `:/+####+.   :##:
+# .::::::::/+###.     :##:
+# .////-----+##:    `:###:
+#  `-//:.   :##:  `:###/.
+#    `-//:. :##:`:###/.
+#      `-//:+######/.
+#        `-/+####/.
+#          `+##+.
+#           :##:
+#           :##:
+#           :##:
+#           :##:
+#           :##:
+#            .+:
+
+import heapq
+import itertools
+import math
+import time
+from collections import deque
+from threading import Condition, Thread, get_ident
+
+
+class CommandJitterBuffer(Thread):
+    # Plays sender timestamped commands with the sender's timing
+    #
+    # Sits between the servers and the hexapod, the servers put() into it
+    # like into the command queue. '@<sender time in s>:walk0:' is played
+    # at sender time + clock offset + playout delay; commands without a
+    # timestamp are passed on at once, unchanged.
+    #
+    # The clock offset is the smallest transit time (arrival - sender
+    # time) of the last window commands, the playout delay 4x the arrival
+    # jitter (RFC 3550 estimate) within [min_delay, max_delay]. Both are
+    # set when a new sequence starts (sender time gap over sequence_gap s),
+    # so the commands of one sequence keep their spacing; a late command
+    # raises the delay for the rest of its sequence. A transit more than
+    # outlier s off the window is passed on at once and kept out of the
+    # estimates, unless 3 in a row agree (the sender clock was reset)
+    def __init__(self, out_cmd_queue, min_delay=0.02, max_delay=0.5,
+                 sequence_gap=1.0, window=64, outlier=5.0, clock=time):
+        Thread.__init__(self, name='CommandJitterBuffer', daemon=True)
+        self.cmd_queue = out_cmd_queue
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.sequence_gap = sequence_gap
+        self.outlier = outlier
+        self.clock = clock
+
+        self.condition = Condition()
+        self.pending = []
+        self.order = itertools.count()
+        # a timestamp may come in a chunk before its command, kept per
+        # receiving thread (tcp, bluetooth) so it stays with its client
+        self.sent = {}
+
+        self.transits = deque(maxlen=window)
+        self.outliers = []
+        self.last_transit = None
+        self.last_sent = None
+        self.jitter = 0.0
+        self.offset = 0.0
+        self.delay = min_delay
+
+        self.timed = 0
+        self.late = 0
+        self.max_late = 0.0
+        self.rejected = 0
+
+    def put(self, cmd_string):
+        arrival = self.clock.monotonic()
+        source = get_ident()
+        with self.condition:
+            sent = self.sent.pop(source, None)
+            if '@' not in cmd_string and sent is None:
+                self.cmd_queue.put(cmd_string)
+                return
+
+            for token in cmd_string.split(':'):
+                token = token.strip()
+                if not token:
+                    continue
+                if token.startswith('@'):
+                    try:
+                        sent = float(token[1:])
+                        if not math.isfinite(sent):
+                            raise ValueError(token)
+                    except ValueError:
+                        print('invalid command timestamp: {}'.format(token))
+                        sent = None
+                elif sent is None:
+                    self.cmd_queue.put(token + ':')
+                else:
+                    self.schedule(token + ':', sent, arrival)
+                    sent = None
+            if sent is not None:
+                self.sent[source] = sent
+
+    def schedule(self, cmd_string, sent, arrival):
+        # called with the condition held
+        transit = arrival - sent
+        if not self.accept(transit):
+            self.rejected += 1
+            self.cmd_queue.put(cmd_string)
+            return
+
+        if self.last_transit is not None:
+            # interarrival jitter, RFC 3550 6.4.1
+            self.jitter += (abs(transit - self.last_transit) -
+                            self.jitter)/16
+        self.last_transit = transit
+        self.transits.append(transit)
+
+        if self.last_sent is None or \
+                abs(sent - self.last_sent) > self.sequence_gap:
+            if self.timed:
+                print('command jitter: {}'.format(self.stats()))
+            self.offset = min(self.transits)
+            self.delay = min(max(4*self.jitter, self.min_delay),
+                             self.max_delay)
+        self.last_sent = sent
+
+        due = sent + self.offset + self.delay
+        self.timed += 1
+        if due < arrival:
+            self.late += 1
+            self.max_late = max(self.max_late, arrival - due)
+            # stretch this one gap rather than being late for the rest of
+            # the sequence, the delay only shrinks at the next sequence
+            self.delay = min(self.delay + arrival - due, self.max_delay)
+        heapq.heappush(self.pending, (due, next(self.order), cmd_string))
+        self.condition.notify()
+
+    def accept(self, transit):
+        if not self.transits or \
+                abs(transit - min(self.transits)) <= self.outlier:
+            self.outliers.clear()
+            return True
+
+        if self.outliers and \
+                abs(transit - self.outliers[-1]) > self.outlier:
+            self.outliers.clear()
+        self.outliers.append(transit)
+        if len(self.outliers) < 3:
+            return False
+        # a new sender clock, start over with its transits
+        self.transits.clear()
+        self.transits.extend(self.outliers[:-1])
+        self.outliers.clear()
+        self.last_transit = None
+        self.last_sent = None
+        return True
+
+    def run(self):
+        while True:
+            with self.condition:
+                while True:
+                    if not self.pending:
+                        self.condition.wait()
+                        continue
+                    delay = self.pending[0][0] - self.clock.monotonic()
+                    if delay <= 0:
+                        break
+                    self.condition.wait(delay)
+                _, _, cmd_string = heapq.heappop(self.pending)
+            self.cmd_queue.put(cmd_string)
+
+    def stats(self):
+        with self.condition:
+            return {'timed': self.timed,
+                    'late': self.late,
+                    'rejected': self.rejected,
+                    'max_late': round(self.max_late, 4),
+                    'jitter': round(self.jitter, 4),
+                    'delay': round(self.delay, 4),
+                    'pending': len(self.pending)}
@@ -0,0 +1,77 @@
+#!python
+#
+# 2021  Zhengyu Peng
+# Website: https://zpeng.me
+#
+# `                      `
+# -:.                  -#:
+# -//:.              -###:
+# -////:.          -#####:
+# -/:.://:.      -###++##:
+# ..   `://:-  -###+. :##:
+#        `:/+####+.   :##:
+# .::::::::/+###.     :##:
+# .////-----+##:    `:###:
+#  `-//:.   :##:  `:###/.
+#    `-//:. :##:`:###/.
+#      `-//:+######/.
+#        `-/+####/.
+#          `+##+.
+#           :##:
+#           :##:
+#           :##:
+#           :##:
+#           :##:
+#            .+:
+
+
+import numpy as np
+
+
+class CompactGait:
+    # A gait stored as one foot trajectory shared by all legs
+    #
+    # base: (S, 3) foot trajectory
+    # phase: (6,) per-leg frame offset, leg l plays base[(i - phase[l]) % S]
+    # transform: (6, 3, 3) per-leg rotation or mirror of the trajectory
+    # standby: (6, 3) standby posture the trajectory is relative to
+    #
+    # Frames are resolved when they are played, indexing a CompactGait
+    # gives the same (6, 3) foot coordinates as the full (S, 6, 3) table
+    def __init__(self, base, phase, standby, transform=None):
+        self.base = np.asarray(base, dtype=np.float64)
+        self.phase = np.asarray(phase, dtype=np.intp)
+        self.standby = standby
+        if transform is None:
+            transform = np.tile(np.eye(3), (6, 1, 1))
+        self.transform = np.asarray(transform, dtype=np.float64)
+
+        self.steps = np.shape(self.base)[0]
+        self.shape = (self.steps, 6, 3)
+        self._index = np.empty(6, dtype=np.intp)
+
+    @property
+    def nbytes(self):
+        # the standby posture is shared by all gaits
+        return self.base.nbytes + self.phase.nbytes + self.transform.nbytes
+
+    def __len__(self):
+        return self.steps
+
+    def frame(self, idx):
+        np.subtract(idx % self.steps, self.phase, out=self._index)
+        np.mod(self._index, self.steps, out=self._index)
+        return np.einsum('lij,lj->li', self.transform,
+                         self.base[self._index]) + self.standby
+
+    def __getitem__(self, idx):
+        return self.frame(idx)
+
+    def __array__(self, dtype=None, copy=None):
+        index = (np.arange(self.steps)[:, np.newaxis] -
+                 self.phase[np.newaxis, :]) % self.steps
+        path = np.einsum('lij,nlj->nli', self.transform,
+                         self.base[index]) + self.standby
+        if dtype is not None:
+            path = path.astype(dtype)
+        return path
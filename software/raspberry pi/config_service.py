@@ -0,0 +1,170 @@
+#!python
+#
+# 2021  Zhengyu Peng
+# Website: https://zpeng.me
+#
+# `                      `
+# -:.                  -#:
+# -//:.              -###:
+# -////:.          -#####:
+# -/:.://:.      -###++##:
+# ..   `://:-  -###+. :##:
+#        `:/+####+.   :##:
+# .::::::::/+###.     :##:
+# .////-----+##:    `:###:
+#  `-//:.   :##:  `:###/.
+#    `-//:. :##:`:###/.
+#      `-//:+######/.
+#        `-/+####/.
+#          `+##+.
+#           :##:
+#           :##:
+#           :##:
+#           :##:
+#           :##:
+#            .+:
+
+import json
+import math
+import time
+
+from threading import Thread
+
+from config_writer import ConfigWriter, file_stamp
+
+CONFIG_FILE = '/home/pi/hexapod/software/raspberry pi/config.json'
+
+# key: (item count, None for a single number, positive)
+NUMBER_KEYS = {
+    'legMountX': (6, False),
+    'legMountY': (6, False),
+    'legMountAngle': (6, False),
+    'legRootToJoint1': (None, True),
+    'legJoint1ToJoint2': (None, True),
+    'legJoint2ToJoint3': (None, True),
+    'legJoint3ToTip': (None, True),
+    'movementInterval': (None, True),
+    'movementSwitchDuration': (None, False),
+    'streamMaxInterval': (None, True),
+    'servoMaxVelocity': (3, True),
+    'servoMaxAcceleration': (3, True),
+}
+for idx in range(6):
+    NUMBER_KEYS['leg{}Offset'.format(idx)] = (3, False)
+    NUMBER_KEYS['leg{}Scale'.format(idx)] = (3, False)
+
+REQUIRED_KEYS = ('legMountX', 'legMountY', 'legMountAngle',
+                 'legRootToJoint1', 'legJoint1ToJoint2', 'legJoint2ToJoint3',
+                 'legJoint3ToTip')
+
+
+def is_number(value, positive=False):
+    return isinstance(value, (int, float)) and \
+        not isinstance(value, bool) and math.isfinite(value) and \
+        (value > 0 or not positive)
+
+
+def validate_config(config):
+    if not isinstance(config, dict):
+        raise ValueError('expected a JSON object')
+    for key in REQUIRED_KEYS:
+        if key not in config:
+            raise ValueError('{} is missing'.format(key))
+
+    for key, (count, positive) in NUMBER_KEYS.items():
+        if key not in config:
+            continue
+        value = config[key]
+        if count is None:
+            if not is_number(value, positive):
+                raise ValueError('{}: expected a{} number, got {!r}'.format(
+                    key, ' positive' if positive else '', value))
+        elif not isinstance(value, list) or len(value) != count or \
+                not all(is_number(v, positive) for v in value):
+            raise ValueError('{}: expected {}{} numbers, got {!r}'.format(
+                key, count, ' positive' if positive else '', value))
+    return config
+
+
+def load_config(filename=CONFIG_FILE):
+    with open(filename, 'r') as read_file:
+        try:
+            config = json.load(read_file)
+        except ValueError as err:
+            raise ValueError('{}: {}'.format(filename, err))
+    try:
+        return validate_config(config)
+    except ValueError as err:
+        raise ValueError('{}: {}'.format(filename, err))
+
+
+class ConfigService(Thread):
+    # The one parsed and validated config.json of all components
+    #
+    # config is shared, a reload updates it in place and calls every
+    # subscriber with the set of changed keys. The thread polls the file
+    # every interval (s) once started; our own saves and invalid files
+    # (e.g. half written by an editor) are not loaded
+    def __init__(self, filename=CONFIG_FILE, interval=1.0):
+        Thread.__init__(self, name='ConfigService', daemon=True)
+        self.filename = filename
+        self.interval = interval
+
+        self.stamp = file_stamp(filename)
+        self.config = load_config(filename)
+        self.subscribers = []
+        self.reloads = 0
+
+        # calibration changes are saved in the background
+        self.writer = ConfigWriter(
+            filename, self.config.get('configSaveDelay', 1.0))
+
+    def subscribe(self, callback):
+        # callback(changed_keys), called from this thread
+        self.subscribers.append(callback)
+
+    def save(self):
+        self.writer.save(self.config)
+
+    def flush(self):
+        self.writer.flush()
+
+    def check(self):
+        # reload if the file changed, returns the changed keys
+        stamp = file_stamp(self.filename)
+        if stamp is None or stamp == self.stamp:
+            return set()
+        self.stamp = stamp
+        if stamp == self.writer.written:
+            return set()
+
+        try:
+            new = load_config(self.filename)
+        except (OSError, ValueError) as err:
+            print('config not reloaded: {}'.format(err))
+            return set()
+
+        # key by key, readers see either the old or the new value
+        changed = {key for key in set(self.config) | set(new)
+                   if self.config.get(key) != new.get(key)}
+        for key in changed:
+            if key in new:
+                self.config[key] = new[key]
+            else:
+                del self.config[key]
+        if not changed:
+            return changed
+
+        self.reloads += 1
+        print('config reloaded: {}'.format(', '.join(sorted(changed))))
+        for callback in self.subscribers:
+            try:
+                callback(changed)
+            except Exception as err:
+                print('config reload failed: {!r}'.format(err))
+        return changed
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            self.check()
@@ -0,0 +1,155 @@
+#!python
+#
+# 2021  Zhengyu Peng
+# Website: https://zpeng.me
+#
+# `                      `
+# -:.                  -#:
+# -//:.              -###:
+# -////:.          -#####:
+# -/:.://:.      -###++##:
+# ..   `://:-  -###+. :##:
+#        `:/+####+.   :##:
+# .::::::::/+###.     :##:
+# .////-----+##:    `:###:
+#  `-//:.   :##:  `:###/.
+#    `-//:. :##:`:###/.
+#      `-//:+######/.
+#        `-/+####/.
+#          `+##+.
+#           :##:
+#           :##:
+#           :##:
+#           :##:
+#           :##:
+#            .+:
+
+
+import atexit
+import copy
+import json
+import os
+import tempfile
+import time
+
+from threading import Condition, Thread
+
+
+def file_stamp(filename):
+    # changes with every write, also with a rename over the file
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def keep_access(fd, filename):
+    # mkstemp creates 0600 files of this user, the renamed file keeps the
+    # mode and owner of the one it replaces
+    try:
+        stat = os.stat(filename)
+    except FileNotFoundError:
+        return
+    os.fchmod(fd, stat.st_mode & 0o7777)
+    if (stat.st_uid, stat.st_gid) != (os.geteuid(), os.getegid()):
+        try:
+            os.fchown(fd, stat.st_uid, stat.st_gid)
+        except PermissionError:
+            print('{}: owner not kept'.format(filename))
+
+
+class ConfigWriter(Thread):
+    # Write-behind saving of config.json
+    #
+    # save() only takes a snapshot, the file is written by this thread once
+    # no save came in for delay seconds (at most max_delay after the first
+    # unsaved change), through a temp file renamed over the config so a
+    # power loss leaves either the old or the new file
+    def __init__(self, filename, delay=1.0, max_delay=5.0):
+        Thread.__init__(self, name='ConfigWriter', daemon=True)
+        self.filename = filename
+        self.delay = delay
+        self.max_delay = max_delay
+
+        self.condition = Condition()
+        self.pending = None
+        self.first_change = None
+        self.last_change = None
+        self.writing = False
+        self.writes = 0
+        # file_stamp() of the last write, to tell it from outside edits
+        self.written = None
+
+        atexit.register(self.flush)
+        self.start()
+
+    def save(self, config):
+        snapshot = copy.deepcopy(config)
+        with self.condition:
+            now = time.monotonic()
+            if self.pending is None:
+                self.first_change = now
+            self.pending = snapshot
+            self.last_change = now
+            self.condition.notify()
+
+    def flush(self):
+        # block until every saved change is on disk
+        with self.condition:
+            while self.pending is not None or self.writing:
+                self.last_change = self.first_change = float('-inf')
+                self.condition.notify_all()
+                self.condition.wait(0.1)
+
+    def run(self):
+        while True:
+            with self.condition:
+                while True:
+                    if self.pending is None:
+                        self.condition.wait()
+                        continue
+                    due = min(self.last_change + self.delay,
+                              self.first_change + self.max_delay)
+                    delay = due - time.monotonic()
+                    if delay <= 0:
+                        break
+                    self.condition.wait(delay)
+
+                config = self.pending
+                self.pending = None
+                self.writing = True
+
+            try:
+                self.write(config)
+            finally:
+                with self.condition:
+                    self.writing = False
+                    self.condition.notify_all()
+
+    def write(self, config):
+        dirname = os.path.dirname(os.path.abspath(self.filename))
+        try:
+            fd, tmp_name = tempfile.mkstemp(
+                dir=dirname, prefix='.config.', suffix='.tmp')
+            try:
+                keep_access(fd, self.filename)
+                with os.fdopen(fd, 'w') as write_file:
+                    json.dump(config, write_file, indent=4)
+                    write_file.flush()
+                    os.fsync(write_file.fileno())
+                os.replace(tmp_name, self.filename)
+                self.written = file_stamp(self.filename)
+            except BaseException:
+                os.unlink(tmp_name)
+                raise
+
+            # make the rename itself durable
+            dir_fd = os.open(dirname, os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+            self.writes += 1
+        except OSError as err:
+            print('saving {} failed: {}'.format(self.filename, err))
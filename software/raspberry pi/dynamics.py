@@ -0,0 +1,101 @@
+#!python
+#
+# 2021  Zhengyu Peng
+# Website: https://zpeng.me
+#
+# `                      `
+# -:.                  -#:
+# -//:.              -###:
+# -////:.          -#####:
+# -/:.://:.      -###++##:
+# ..   `://:-  -###+. :##:
+#        `:/+####+.   :##:
+# .::::::::/+###.     :##:
+# .////-----+##:    `:###:
+#  `-//:.   :##:  `:###/.
+#    `-//:. :##:`:###/.
+#      `-//:+######/.
+#        `-/+####/.
+#          `+##+.
+#           :##:
+#           :##:
+#           :##:
+#           :##:
+#           :##:
+#            .+:
+
+
+import numpy as np
+
+
+def joint_rates(angles, interval):
+    # angles: (N, 6, 3) of a cyclic path, interval: s per frame
+    # velocity[i] is the move from frame i to frame i+1,
+    # acceleration[i] is at frame i
+    step = np.roll(angles, -1, axis=0) - angles
+    velocity = step / interval
+    acceleration = (step - np.roll(step, 1, axis=0)) / (interval*interval)
+    return velocity, acceleration
+
+
+def min_frame_time(angles, max_velocity, max_acceleration):
+    # shortest uniform frame time in s that keeps every joint within limits
+    step = np.abs(np.roll(angles, -1, axis=0) - angles)
+    change = np.abs(np.roll(angles, -1, axis=0) - 2 * angles +
+                    np.roll(angles, 1, axis=0))
+    return max(np.max(step / max_velocity),
+               np.sqrt(np.max(change / max_acceleration)))
+
+
+def check_rates(angles, interval, max_velocity, max_acceleration):
+    max_velocity = np.asarray(max_velocity, dtype=np.float64)
+    max_acceleration = np.asarray(max_acceleration, dtype=np.float64)
+
+    velocity, acceleration = joint_rates(angles, interval)
+    # share of the limit every joint uses, > 1 is too fast
+    load = np.maximum(np.abs(velocity)/max_velocity,
+                      np.abs(acceleration)/max_acceleration)
+    over = load > 1
+
+    frame_time = min_frame_time(angles, max_velocity, max_acceleration)
+    return {'max_velocity': np.max(np.abs(velocity)),
+            'max_acceleration': np.max(np.abs(acceleration)),
+            # frame index -> [(leg, joint), ...]
+            'failed': {int(i): [(int(j), int(k))
+                                for j, k in zip(*np.nonzero(over[i]))]
+                       for i in np.nonzero(over.any(axis=(1, 2)))[0]},
+            # (leg, joint) closest to or furthest over its limits
+            'worst_joint': tuple(int(idx) for idx in np.unravel_index(
+                np.argmax(np.max(load, axis=0)), load.shape[1:])),
+            'max_rate': 1/frame_time if frame_time > 0 else float('inf')}
+
+
+def retime(angles, max_velocity, max_acceleration, iterations=200):
+    # time-optimal frame timing of a cyclic path under servo limits
+    # returns durations in s, durations[i] is the time from frame i to i+1
+    max_velocity = np.asarray(max_velocity, dtype=np.float64)
+    max_acceleration = np.asarray(max_acceleration, dtype=np.float64)
+
+    step = np.roll(angles, -1, axis=0) - angles
+
+    # fastest timing each segment allows by velocity alone
+    durations = np.max(np.abs(step) / max_velocity, axis=(1, 2))
+    durations = np.maximum(durations, 1e-4)
+
+    for _ in range(iterations):
+        velocity = step / durations[:, None, None]
+        previous = np.roll(durations, 1)
+        acceleration = (velocity - np.roll(velocity, 1, axis=0)) / \
+            ((durations + previous)[:, None, None] / 2)
+
+        # slow down both segments around frames that accelerate too hard
+        ratio = np.max(np.abs(acceleration) / max_acceleration, axis=(1, 2))
+        if np.all(ratio <= 1 + 1e-6):
+            return durations
+
+        scale = np.sqrt(np.maximum(ratio, 1))
+        durations = durations * np.maximum(scale, np.roll(scale, -1))
+
+    # not converged, fall back to the fastest uniform timing
+    return np.full(len(angles), min_frame_time(
+        angles, max_velocity, max_acceleration))
@@ -0,0 +1,115 @@
+#!python
+#
+# 2021  Zhengyu Peng
+# Website: https://zpeng.me
+#
+# `                      `
+# -:.                  -#:
+# -//:.              -###:
+# -////:.          -#####:
+# -/:.://:.      -###++##:
+# ..   `://:-  -###+. :##:
+#        `:/+####+.   :##:
+# .::::::::/+###.     :##:
+# .////-----+##:    `:###:
+#  `-//:.   :##:  `:###/.
+#    `-//:. :##:`:###/.
+#      `-//:+######/.
+#        `-/+####/.
+#          `+##+.
+#           :##:
+#           :##:
+#           :##:
+#           :##:
+#           :##:
+#            .+:
+
+
+import numpy as np
+
+# leg local y -> -y only flips the first joint, servo angle a -> 180 - a
+MIRROR_SCALE = np.array([1, -1, 1])
+
+
+class CompactAngles:
+    # Servo angles of a gait, stored once per unique leg trajectory
+    #
+    # unique: (U, S, 3) solved angles
+    # source: (6,) unique trajectory of every leg
+    # shift: (6,) leg l plays unique[source[l]][(i - shift[l]) % S]
+    # mirror: (6,) legs whose local trajectory is mirrored in y
+    def __init__(self, unique, source, shift, mirror):
+        self.unique = unique
+        self.source = np.asarray(source, dtype=np.intp)
+        self.shift = np.asarray(shift, dtype=np.intp)
+        self.mirror = np.asarray(mirror, dtype=bool)
+
+        self.steps = np.shape(unique)[1]
+        self.shape = (self.steps, 6, 3)
+
+    @property
+    def nbytes(self):
+        return self.unique.nbytes + self.source.nbytes + \
+            self.shift.nbytes + self.mirror.nbytes
+
+    def __len__(self):
+        return self.steps
+
+    def frame(self, idx):
+        angles = self.unique[self.source, (idx - self.shift) % self.steps]
+        angles[self.mirror, 0] = 180 - angles[self.mirror, 0]
+        return angles
+
+    def __getitem__(self, idx):
+        return self.frame(idx)
+
+    def __array__(self, dtype=None, copy=None):
+        index = (np.arange(self.steps)[:, np.newaxis] -
+                 self.shift[np.newaxis, :]) % self.steps
+        angles = self.unique[self.source[np.newaxis, :], index]
+        angles[:, self.mirror, 0] = 180 - angles[:, self.mirror, 0]
+        if dtype is not None:
+            angles = angles.astype(dtype)
+        return angles
+
+
+def find_shift(trajectory, target, atol):
+    # k with np.roll(trajectory, k) == target, or None
+    steps = len(trajectory)
+    candidates = np.nonzero(
+        np.all(np.abs(trajectory - target[0]) <= atol, axis=1))[0]
+    for idx in candidates:
+        k = (-idx) % steps
+        if np.allclose(np.roll(trajectory, k, axis=0), target,
+                       rtol=0, atol=atol):
+            return k
+    return None
+
+
+def compile_angles(path, kinematics, atol=1e-9):
+    # solve a gait (S, 6, 3) into CompactAngles, legs whose local foot
+    # trajectories are equal up to a phase shift or a mirror share one
+    # inverse kinematics solution
+    local = kinematics.to_local(np.asarray(path))
+
+    uniques = []
+    source = np.zeros(6, dtype=np.intp)
+    shift = np.zeros(6, dtype=np.intp)
+    mirror = np.zeros(6, dtype=bool)
+    for leg in range(6):
+        target = local[:, leg, :]
+        for u_idx, trajectory in enumerate(uniques):
+            k = find_shift(trajectory, target, atol)
+            if k is not None:
+                source[leg], shift[leg] = u_idx, k
+                break
+            k = find_shift(trajectory*MIRROR_SCALE, target, atol)
+            if k is not None:
+                source[leg], shift[leg], mirror[leg] = u_idx, k, True
+                break
+        else:
+            source[leg] = len(uniques)
+            uniques.append(target)
+
+    unique = kinematics.solve_local(np.stack(uniques))
+    return CompactAngles(unique, source, shift, mirror)
@@ -0,0 +1,155 @@
+#!python
+#
+# 2021  Zhengyu Peng
+# Website: https://zpeng.me
+#
+# `                      `
+# -:.                  -#:
+# -//:.              -###:
+# -////:.          -#####:
+# -/:.://:.      -###++##:
+# ..   `://:-  -###+. :##:
+#        `:/+####+.   :##:
+# .::::::::/+###.     :##:
+# .////-----+##:    `:###:
+#  `-//:.   :##:  `:###/.
+#    `-//:. :##:`:###/.
+#      `-//:+######/.
+#        `-/+####/.
+#          `+##+.
+#           :##:
+#           :##:
+#           :##:
+#           :##:
+#           :##:
+#            .+:
+
+
+import math
+from collections import Counter, OrderedDict
+
+# errors of invalid parameters, from the registry or a generator
+GAIT_ERRORS = (KeyError, TypeError, ValueError, AssertionError,
+               ArithmeticError)
+
+
+def gait_nbytes(gait):
+    return sum(getattr(v, 'nbytes', 0) for v in gait.values())
+
+
+class GaitRegistry:
+    # Memoized parametric gaits
+    #
+    # Parameters are quantized (e.g. direction to 5 degree) so nearby
+    # requests share one compiled table, tables are kept in an LRU bounded
+    # by byte_budget, compiler (e.g. solving the angles) is applied to every
+    # newly generated gait. Parameters outside their limits are rejected
+    # before anything is generated
+    def __init__(self, byte_budget=4*1024*1024, compiler=None):
+        self.byte_budget = byte_budget
+        self.compiler = compiler
+        self.generators = {}
+        self.cache = OrderedDict()
+        self.nbytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.usage = Counter()
+
+    def register(self, name, generator, quantum=None, limits=None):
+        # quantum: parameter -> step, int steps give int parameters
+        # limits: parameter -> (min, max) of the quantized value, or a list
+        # of the allowed values, parameters without limits are rejected
+        self.generators[name] = (generator, quantum or {}, limits or {})
+
+    def quantize(self, name, params):
+        _, quantum, limits = self.generators[name]
+        result = {}
+        for key, value in params.items():
+            if key not in limits:
+                raise ValueError('{}: unknown parameter {}'.format(name, key))
+            if isinstance(limits[key], list):
+                if value not in limits[key]:
+                    raise ValueError('{}={!r} not in {}'.format(
+                        key, value, limits[key]))
+                result[key] = value
+                continue
+
+            if isinstance(value, str) or not math.isfinite(value):
+                raise ValueError('{}={!r} is not a number'.format(key, value))
+            step = quantum.get(key)
+            if step is not None:
+                value = round(float(value)/step)*step
+                if isinstance(step, int):
+                    value = int(value)
+            low, high = limits[key]
+            if not low <= value <= high:
+                raise ValueError('{}={} out of range [{}, {}]'.format(
+                    key, value, low, high))
+            result[key] = value
+        return result
+
+    def get(self, name, **params):
+        generator = self.generators[name][0]
+        params = self.quantize(name, params)
+        key = (name, tuple(sorted(params.items())))
+
+        gait = self.cache.get(key)
+        if gait is not None:
+            self.hits += 1
+            self.usage[key] += 1
+            self.cache.move_to_end(key)
+            return gait
+
+        gait = generator(**params)
+        if self.compiler is not None:
+            gait = self.compiler(gait)
+        self.misses += 1
+        self.usage[key] += 1
+        self.cache[key] = gait
+        self.nbytes += gait_nbytes(gait)
+
+        # always keep the newest table, even if it alone exceeds the budget
+        while self.nbytes > self.byte_budget and len(self.cache) > 1:
+            _, old = self.cache.popitem(last=False)
+            self.nbytes -= gait_nbytes(old)
+            self.evictions += 1
+        return gait
+
+    def prewarm(self, variants):
+        # variants: [(name, params), ...], invalid ones are skipped
+        usage = Counter(self.usage)
+        for name, params in variants:
+            try:
+                self.get(name, **params)
+            except GAIT_ERRORS as err:
+                print('gait not prewarmed: {} {} ({})'.format(
+                    name, params, err))
+        # prewarming is not a request
+        self.hits = 0
+        self.misses = 0
+        self.usage = usage
+
+    def most_frequent(self, count):
+        return [(name, dict(params))
+                for (name, params), _ in self.usage.most_common(count)]
+
+    def usage_state(self, count=64):
+        # JSON compatible counts of the most used variants
+        return [[name, dict(params), used]
+                for (name, params), used in self.usage.most_common(count)]
+
+    def load_usage(self, state):
+        for name, params, used in state:
+            self.usage[(name, tuple(sorted(params.items())))] += used
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits/total if total else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self.cache),
+                'bytes': self.nbytes,
+                'byte_budget': self.byte_budget}
@@ -0,0 +1,130 @@
+#!python
+#
+# 2021  Zhengyu Peng
+# Website: https://zpeng.me
+#
+# `                      `
+# -:.                  -#:
+# -//:.              -###:
+# -////:.          -#####:
+# -/:.://:.      -###++##:
+# ..   `://:-  -###+. :##:
+#        `:/+####+.   :##:
+# .::::::::/+###.     :##:
+# .////-----+##:    `:###:
+#  `-//:.   :##:  `:###/.
+#    `-//:. :##:`:###/.
+#      `-//:+######/.
+#        `-/+####/.
+#          `+##+.
+#           :##:
+#           :##:
+#           :##:
+#           :##:
+#           :##:
+#            .+:
+
+
+import json
+import os
+
+import numpy as np
+
+BUNDLE_VERSION = 1
+
+
+# load pre-solved servo angle tables exported by the path tool
+# (main.py --angleNpz), keyed by path name
+def load_angle_tables(filename):
+    tables = {}
+    with np.load(filename) as data:
+        for key in data.files:
+            if not key.endswith('_angles'):
+                continue
+
+            name = key[:-len('_angles')]
+            tables[name] = {'angles': data[key].astype(np.float64),
+                            'dur': int(data[name+'_dur']),
+                            'entries': data[name+'_entries'].tolist(),
+                            'type': 'angles'}
+            if name+'_durations' in data.files:
+                # retimed frame durations, ms -> s
+                tables[name]['durations'] = data[name+'_durations']/1000
+    return tables
+
+
+class BundlePath:
+    # A memory-mapped bundle path resolved against the standby posture
+    #
+    # mode 'shift': array (N, 6, 3) offsets, 'matrix': (N, 4, 4) transforms
+    #
+    # Frames are resolved when they are played, so the mapped pages stay
+    # shared with the file; np.asarray() resolves the whole path
+    def __init__(self, mode, array, standby):
+        if mode not in ('shift', 'matrix'):
+            raise ValueError('unsupported gait mode: {}'.format(mode))
+        self.mode = mode
+        self.array = array
+        self.standby = np.asarray(standby, dtype=np.float64)
+        self.shape = (len(array), 6, 3)
+
+    @property
+    def nbytes(self):
+        # mapped, not resident
+        return 0
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, idx):
+        if self.mode == 'shift':
+            return self.array[idx] + self.standby
+        transform = self.array[idx]
+        return np.matmul(self.standby, transform[:3, :3].T) + \
+            transform[:3, 3]
+
+    def __array__(self, dtype=None, copy=None):
+        if self.mode == 'shift':
+            path = self.array + self.standby
+        else:
+            path = np.matmul(self.standby, np.swapaxes(
+                self.array[:, :3, :3], 1, 2)) + \
+                self.array[:, np.newaxis, :3, 3]
+        if dtype is not None:
+            path = path.astype(dtype)
+        return path
+
+
+# load a gait bundle exported by the path tool (main.py --bundle), the
+# arrays are memory-mapped and resolved against the runtime standby posture
+# frame by frame
+def load_gait_bundle(dirname, standby_coordinate):
+    with open(os.path.join(dirname, 'manifest.json'), 'r') as read_file:
+        manifest = json.load(read_file)
+
+    if manifest.get('version') != BUNDLE_VERSION:
+        raise ValueError('unsupported gait bundle version: {}'.format(
+            manifest.get('version')))
+
+    gaits = {}
+    for name, meta in manifest['gaits'].items():
+        arrays = {key: np.load(os.path.join(dirname, filename), mmap_mode='r')
+                  for key, filename in meta['files'].items()}
+
+        key = {'shift': 'offset', 'matrix': 'transform'}.get(meta['mode'])
+        if key is None:
+            raise ValueError('unsupported gait mode: {}'.format(meta['mode']))
+
+        gaits[name] = {'coord': BundlePath(meta['mode'], arrays[key],
+                                           standby_coordinate),
+                       'dur': meta['dur'],
+                       'entries': meta['entries'],
+                       'type': 'motion'}
+        if 'angles' in arrays:
+            # solved with the path tool geometry, played when it matches the
+            # runtime one, see Hexapod.bundle_angles()
+            gaits[name]['table_angles'] = arrays['angles']
+        if 'durations' in arrays:
+            # retimed frame durations, ms -> s
+            gaits[name]['durations'] = arrays['durations']/1000
+    return gaits
@@ -26,8 +26,11 @@
 
 # Libraries
 # https://circuitpython.readthedocs.io/projects/servokit/en/latest/
-from audioop import reverse
-from adafruit_servokit import ServoKit
+try:
+    from adafruit_servokit import ServoKit
+except ImportError:
+    # the simulator runs without the servo driver
+    ServoKit = None
 
 from leg import Leg
 
@@ -36,7 +39,12 @@ from queue import Queue, Empty
 # python3-numpy
 import numpy as np
 import time
+import os
+import argparse
 import json
+import signal
+import sys
+import types
 from path_generator import gen_walk_path
 from path_generator import gen_fastwalk_path
 from path_generator import gen_turn_path
@@ -44,8 +52,26 @@ from path_generator import gen_turn_path
 from path_generator import gen_climb_path
 from path_generator import gen_rotatex_path, gen_rotatey_path, gen_rotatez_path
 from path_generator import gen_twist_path
-
-from threading import Thread
+from gait_table import load_angle_tables, load_gait_bundle
+from kinematics import Kinematics, IKCache
+from dynamics import check_rates, retime
+from gait_registry import GaitRegistry, GAIT_ERRORS
+from gait_compiler import compile_angles
+from workspace import WorkspaceMap, angle_limits
+from recorder import FlightRecorder
+from tracing import tracer, TracedQueue
+from servo_ring import FrameRing, RingServoKit, ServoProcessError
+from servo_ring import BOARDS, start_servo_process
+from realtime import enable_realtime, JitterMonitor
+from config_service import ConfigService, CONFIG_FILE
+from config_writer import ConfigWriter
+from command_buffer import CommandJitterBuffer
+from stream import FrameStream, ANGLES
+from macro import parse_macro, concat_steps
+from pose import BodyPose
+
+from functools import partial
+from threading import Lock, Thread
 
 from tcpserver import TCPServer
 from btserver import BluetoothServer
@@ -81,42 +107,98 @@ class Hexapod(Thread):
 
     CMD_TWIST = 'twist'
 
+    # frames sent by a client, see stream.py
+    CMD_STREAM = 'stream'
+
+    # 'macro,name=walk0*3;turnleft*2;rotatex@1.5', see macro.py
+    CMD_MACRO = 'macro'
+
+    # 'pose,roll=5,pitch=-3,z=10' on top of the playing motion, 'pose'
+    # returns to the neutral pose, see pose.py
+    CMD_POSE = 'pose'
+
     CMD_CALIBRATION = 'calibration'
     CMD_NORMAL = 'normal'
 
-    def __init__(self, in_cmd_queue):
+    # path tool table names of the commands
+    TABLE_NAMES = {
+        'forward': CMD_WALK_0,
+        'backward': CMD_WALK_180,
+        'shiftleft': CMD_WALK_L90,
+        'shiftright': CMD_WALK_R90,
+        'forwardfast': CMD_FASTFORWARD,
+        'climb': CMD_CLIMBFORWARD,
+    }
+
+    # config keys and what a reload rebuilds for them, see reload()
+    GEOMETRY_KEYS = {'legMountX', 'legMountY', 'legMountAngle',
+                     'legRootToJoint1', 'legJoint1ToJoint2',
+                     'legJoint2ToJoint3', 'legJoint3ToTip'}
+    OFFSET_KEYS = {'leg{}Offset'.format(idx) for idx in range(6)}
+    IK_CACHE_KEYS = {'ikCacheSize', 'ikCacheResolution', 'ikCacheTolerance'}
+    WORKSPACE_KEYS = {'workspaceCheck', 'workspaceResolution',
+                      'workspaceTolerance', 'workspaceCache'}
+    RATE_KEYS = {'movementInterval', 'servoMaxVelocity',
+                 'servoMaxAcceleration', 'rateCheckVerbose'}
+    REGISTRY_KEYS = {'gaitCacheBytes', 'gaitPrewarm', 'gaitPrewarmCount'}
+    # gait sources, by precedence
+    GAIT_SOURCES = ('table', 'bundle', 'generator', 'posture')
+    # what the build_* helpers read and rebuild, staged by reload()
+    RELOAD_STATE = ('config', 'legs', 'mount_x', 'mount_y', 'root_j1',
+                    'j1_j2', 'j2_j3', 'j3_tip', 'mount_angle',
+                    'mount_position', 'kinematics', 'ik_cache', 'ik_misses',
+                    'workspace', 'standby_posture', 'gait_generators',
+                    'compile_enabled', 'cmd_dict', 'gait_sources',
+                    'rate_reports', 'gait_registry', 'gait_usage', 'macros')
+
+    def __init__(self, in_cmd_queue, config_file=CONFIG_FILE, servo_kit=None,
+                 clock=time, frame_ring=None, realtime=None,
+                 config_service=None, frame_stream=None):
+        # servo_kit: ServoKit compatible factory, clock: monotonic() and
+        # sleep(), both replaced by the simulator
+        # frame_ring: FrameRing of a servo output process
+        # realtime: SCHED_FIFO priority of the frame loop, None to disable
+        # config_service: ConfigService shared with the servers, by
+        # default one of config_file
+        # frame_stream: FrameStream filled by the tcp server
         Thread.__init__(self)
 
         self.cmd_queue = in_cmd_queue
         self.interval = 0.005
+        self.clock = clock
 
         self.calibration_mode = False
 
-        with open('/home/pi/hexapod/software/raspberry pi/config.json', 'r') as read_file:
-            self.config = json.load(read_file)
-
-        # legs' coordinates
-        # x -> right
-        # y -> front
-        # z -> up
-        # origin is the center of the body
-        # roots are the positions of the bottom screws
-        # length units are in mm
-        # time units are in ms
-        self.mount_x = np.array(self.config['legMountX'])
-        self.mount_y = np.array(self.config['legMountY'])
-        self.root_j1 = self.config['legRootToJoint1']
-        self.j1_j2 = self.config['legJoint1ToJoint2']
-        self.j2_j3 = self.config['legJoint2ToJoint3']
-        self.j3_tip = self.config['legJoint3ToTip']
-        self.mount_angle = np.array(self.config['legMountAngle'])/180*np.pi
-        self.mount_position = np.zeros((6, 3))
-        self.mount_position[:, 0] = self.mount_x
-        self.mount_position[:, 1] = self.mount_y
+        if config_service is None:
+            config_service = ConfigService(config_file)
+        self.config_service = config_service
+        self.config_file = config_service.filename
+        self.config = config_service.config
+
+        self.build_kinematics()
+
+        # frames go to the output process, which holds each until its due
+        # time, the loop here runs up to servoLead (s) ahead
+        self.frame_ring = frame_ring
+        self.frame_due = 0.0
+        self.realtime = realtime
+        self.frame_stream = frame_stream
+        self.gc_scheduler = None
+        self.jitter = None
+        self.output_lead = 0.0
+        # late frames of the output process, printed when they changed
+        self.output_report = None
+        self.output_late = 0
+        if frame_ring is not None:
+            servo_kit = servo_kit or partial(RingServoKit, frame_ring)
+            self.output_lead = self.config.get('servoLead', 0.02)
 
         # Objects
-        self.pca_left = ServoKit(channels=16, address=0x40, frequency=50)
-        self.pca_right = ServoKit(channels=16, address=0x41, frequency=50)
+        servo_kit = servo_kit or ServoKit
+        if servo_kit is None:
+            raise RuntimeError('adafruit_servokit is not installed')
+        self.pca_left = servo_kit(channels=16, address=0x40, frequency=50)
+        self.pca_right = servo_kit(channels=16, address=0x41, frequency=50)
 
         self.legs = [
             # front right
@@ -150,6 +232,16 @@ class Hexapod(Thread):
                  self.pca_left.servo[0]],
                 correction=self.config.get('leg5Offset', [0, 0, 0]))]
 
+        # every command and frame, to reproduce incidents in the simulator
+        self.recorder = None
+        if self.config.get('flightRecorder'):
+            self.recorder = FlightRecorder(
+                self.config['flightRecorder'],
+                self.config.get('flightRecorderRecords', 65536),
+                self.clock)
+
+        self.build_workspace()
+
         # self.leg_0.reset(True)
         # self.leg_1.reset(True)
         # self.leg_2.reset(True)
@@ -157,49 +249,276 @@ class Hexapod(Thread):
         # self.leg_4.reset(True)
         # self.leg_5.reset(True)
 
+        self.build_postures()
+        self.cmd_dict = {}
+        self.gait_sources = {}
+        cmds = self.build_gaits()
+        self.current_motion = self.standby_posture
+
+        # solve every gait once, instead of every frame while playing
+        self.compile_gaits(cmds)
+        self.check_workspace()
+
+        self.check_rates()
+        if self.config.get('retimeGaits', False):
+            self.retime_gaits()
+
+        self.gait_registry = None
+        self.gait_usage = ConfigWriter(
+            self.config.get('gaitUsageFile', os.path.join(
+                os.path.dirname(os.path.abspath(__file__)),
+                'gait_usage.json')),
+            delay=30.0, max_delay=300.0)
+        self.build_registry()
+        self.build_macros()
+
+        self.pose = BodyPose(self.config.get('poseAngleRate', 60.0),
+                             self.config.get('poseShiftRate', 50.0),
+                             limits=self.config.get('poseLimits'))
+
+        # config changes are rebuilt by the config service thread and
+        # swapped in by step()
+        self.pending_reload = None
+        self.reload_lock = Lock()
+        self.config_service.subscribe(self.reload)
+
+        self.posture(self.standby_posture['coord'])
+        self.clock.sleep(1)
+
+    def build_kinematics(self):
+        # legs' coordinates
+        # x -> right
+        # y -> front
+        # z -> up
+        # origin is the center of the body
+        # roots are the positions of the bottom screws
+        # length units are in mm
+        # time units are in ms
+        self.mount_x = np.array(self.config['legMountX'])
+        self.mount_y = np.array(self.config['legMountY'])
+        self.root_j1 = self.config['legRootToJoint1']
+        self.j1_j2 = self.config['legJoint1ToJoint2']
+        self.j2_j3 = self.config['legJoint2ToJoint3']
+        self.j3_tip = self.config['legJoint3ToTip']
+        self.mount_angle = np.array(self.config['legMountAngle'])/180*np.pi
+        self.mount_position = np.zeros((6, 3))
+        self.mount_position[:, 0] = self.mount_x
+        self.mount_position[:, 1] = self.mount_y
+        self.kinematics = Kinematics(self.config)
+        # optional cache for paths solved while playing, its stats are
+        # printed when a command brought new misses
+        self.ik_cache = None
+        self.ik_misses = 0
+        if self.config.get('ikCacheSize', 0) > 0:
+            self.ik_cache = IKCache(
+                self.kinematics,
+                self.config['ikCacheSize'],
+                self.config.get('ikCacheResolution', 0.1),
+                self.config.get('ikCacheTolerance', 0.5))
+
+    def build_workspace(self):
+        # reachable foot positions of every leg with its calibration
+        self.workspace = None
+        if self.config.get('workspaceCheck', True):
+            self.workspace = WorkspaceMap(
+                self.kinematics,
+                [angle_limits(leg.constraint, self.config.get(
+                    'leg{}Offset'.format(leg.id), [0, 0, 0]))
+                 for leg in self.legs],
+                self.config.get('workspaceResolution', 2.0),
+                self.config.get('workspaceTolerance', 15.0),
+                self.config.get('workspaceCache', os.path.join(
+                    os.path.dirname(os.path.abspath(__file__)),
+                    'workspace.npz')))
+
+    def build_postures(self):
         self.standby_posture = self.gen_posture(60, 75)
 
-        self.current_motion = self.standby_posture
+        standby = self.standby_posture['coord']
+        self.gait_generators = {
+            self.CMD_WALK_0: partial(gen_walk_path, standby, direction=0),
+            self.CMD_WALK_180: partial(gen_walk_path, standby, direction=180),
+            self.CMD_WALK_R45: partial(gen_walk_path, standby, direction=315),
+            self.CMD_WALK_R90: partial(gen_walk_path, standby, direction=270),
+            self.CMD_WALK_R135: partial(
+                gen_walk_path, standby, direction=225),
+            self.CMD_WALK_L45: partial(gen_walk_path, standby, direction=45),
+            self.CMD_WALK_L90: partial(gen_walk_path, standby, direction=90),
+            self.CMD_WALK_L135: partial(
+                gen_walk_path, standby, direction=135),
+            self.CMD_FASTFORWARD: partial(gen_fastwalk_path, standby),
+            self.CMD_FASTBACKWARD: partial(
+                gen_fastwalk_path, standby, reverse=True),
+            self.CMD_TURNLEFT: partial(gen_turn_path, standby, direction='left'),
+            self.CMD_TURNRIGHT: partial(
+                gen_turn_path, standby, direction='right'),
+            self.CMD_CLIMBFORWARD: partial(
+                gen_climb_path, standby, reverse=False),
+            self.CMD_CLIMBBACKWARD: partial(
+                gen_climb_path, standby, reverse=True),
+            self.CMD_ROTATEX: partial(gen_rotatex_path, standby),
+            self.CMD_ROTATEY: partial(gen_rotatey_path, standby),
+            self.CMD_ROTATEZ: partial(gen_rotatez_path, standby),
+            self.CMD_TWIST: partial(gen_twist_path, standby)
+        }
+
+    def build_gaits(self, sources=GAIT_SOURCES):
+        # (re)builds every gait that comes, or now would come, from one of
+        # sources, the others are kept; returns the rebuilt commands
+        self.compile_enabled = self.config.get('compileGaits', True)
 
-        self.cmd_dict = {
-            self.CMD_STANDBY: self.standby_posture,
-            self.CMD_LAYDOWN: self.gen_posture(0, 15),
-            self.CMD_WALK_0: gen_walk_path(
-                self.standby_posture['coord'], direction=0),
-            self.CMD_WALK_180: gen_walk_path(
-                self.standby_posture['coord'], direction=180),
-            self.CMD_WALK_R45: gen_walk_path(
-                self.standby_posture['coord'], direction=315),
-            self.CMD_WALK_R90: gen_walk_path(
-                self.standby_posture['coord'], direction=270),
-            self.CMD_WALK_R135: gen_walk_path(
-                self.standby_posture['coord'], direction=225),
-            self.CMD_WALK_L45: gen_walk_path(
-                self.standby_posture['coord'], direction=45),
-            self.CMD_WALK_L90: gen_walk_path(
-                self.standby_posture['coord'], direction=90),
-            self.CMD_WALK_L135: gen_walk_path(
-                self.standby_posture['coord'], direction=135),
-            self.CMD_FASTFORWARD: gen_fastwalk_path(
-                self.standby_posture['coord']),
-            self.CMD_FASTBACKWARD: gen_fastwalk_path(
-                self.standby_posture['coord'], reverse=True),
-            self.CMD_TURNLEFT: gen_turn_path(
-                self.standby_posture['coord'], direction='left'),
-            self.CMD_TURNRIGHT: gen_turn_path(
-                self.standby_posture['coord'], direction='right'),
-            self.CMD_CLIMBFORWARD: gen_climb_path(
-                self.standby_posture['coord'], reverse=False),
-            self.CMD_CLIMBBACKWARD: gen_climb_path(
-                self.standby_posture['coord'], reverse=True),
-            self.CMD_ROTATEX: gen_rotatex_path(self.standby_posture['coord']),
-            self.CMD_ROTATEY: gen_rotatey_path(self.standby_posture['coord']),
-            self.CMD_ROTATEZ: gen_rotatez_path(self.standby_posture['coord']),
-            self.CMD_TWIST: gen_twist_path(self.standby_posture['coord'])
+        # gaits exported by the path tool are loaded instead of generated
+        bundle = {}
+        if self.config.get('gaitBundle'):
+            try:
+                bundle = {self.TABLE_NAMES.get(name, name): gait
+                          for name, gait in load_gait_bundle(
+                              self.config['gaitBundle'],
+                              self.standby_posture['coord']).items()}
+            except (OSError, ValueError) as err:
+                print(err)
+
+        # pre-solved angle tables from the path tool replace the generated
+        # paths, no inverse kinematics is needed for them
+        tables = {}
+        if self.config.get('angleTable'):
+            tables = {self.TABLE_NAMES.get(name, name): table
+                      for name, table in load_angle_tables(
+                          self.config['angleTable']).items()}
+
+        gaits = {
+            self.CMD_STANDBY: ('posture', lambda: self.standby_posture),
+            self.CMD_LAYDOWN: ('posture', partial(self.gen_posture, 0, 15)),
         }
+        for cmd, generator in self.gait_generators.items():
+            gaits[cmd] = ('generator', generator)
+        for cmd, gait in bundle.items():
+            gaits[cmd] = ('bundle', partial(dict, gait))
+        for cmd, table in tables.items():
+            gaits[cmd] = ('table', partial(dict, table))
+
+        cmds = []
+        for cmd in list(gaits) + [c for c in self.cmd_dict if c not in gaits]:
+            source, make = gaits.get(cmd, (None, None))
+            if source not in sources and \
+                    self.gait_sources.get(cmd) not in sources:
+                continue
+            cmds.append(cmd)
+            if make is None:
+                del self.cmd_dict[cmd]
+                del self.gait_sources[cmd]
+            else:
+                self.cmd_dict[cmd] = make()
+                self.gait_sources[cmd] = source
+        return cmds
+
+    def build_registry(self):
+        # parametric gaits, e.g. 'walk,direction=30,g_radius=30:'
+        # limits keep the generators away from degenerate or huge paths
+        standby = self.standby_posture['coord']
+        previous = self.gait_registry
+        self.gait_registry = GaitRegistry(
+            self.config.get('gaitCacheBytes', 4*1024*1024),
+            self.prepare_gait)
+        steps = (4, 200)
+        radius = (0, 80)
+        self.gait_registry.register(
+            'walk', partial(gen_walk_path, standby),
+            {'direction': 5, 'g_radius': 1, 'g_steps': 4},
+            {'direction': (-360, 360), 'g_radius': radius,
+             'g_steps': steps})
+        self.gait_registry.register(
+            'fastwalk', partial(gen_fastwalk_path, standby),
+            {'y_radius': 1, 'z_radius': 1, 'x_radius': 1, 'g_steps': 4},
+            {'y_radius': radius, 'z_radius': radius, 'x_radius': radius,
+             'g_steps': steps, 'reverse': [0, 1]})
+        self.gait_registry.register(
+            'turn', partial(gen_turn_path, standby),
+            {'g_radius': 1, 'g_steps': 4},
+            {'g_radius': radius, 'g_steps': steps,
+             'direction': ['left', 'right']})
+        self.gait_registry.register(
+            'climb', partial(gen_climb_path, standby),
+            {'y_radius': 1, 'z_radius': 1, 'x_radius': 1, 'z_shift': 1,
+             'g_steps': 4},
+            {'y_radius': radius, 'z_radius': (0, 120), 'x_radius': radius,
+             'z_shift': (-80, 40), 'g_steps': steps, 'reverse': [0, 1]})
+        self.gait_registry.register(
+            'rotatex', partial(gen_rotatex_path, standby),
+            {'swing_angle': 1, 'y_radius': 1, 'g_steps': 4},
+            {'swing_angle': (0, 30), 'y_radius': radius, 'g_steps': steps})
+        self.gait_registry.register(
+            'rotatey', partial(gen_rotatey_path, standby),
+            {'swing_angle': 1, 'x_radius': 1, 'g_steps': 4},
+            {'swing_angle': (0, 30), 'x_radius': radius, 'g_steps': steps})
+        self.gait_registry.register(
+            'rotatez', partial(gen_rotatez_path, standby),
+            {'z_lift': 0.5, 'xy_radius': 0.5, 'g_steps': 4},
+            {'z_lift': (0, 30), 'xy_radius': (0, 30), 'g_steps': steps})
+        self.gait_registry.register(
+            'twist', partial(gen_twist_path, standby),
+            {'raise_angle': 1, 'twist_x_angle': 1, 'twise_y_angle': 1,
+             'g_steps': 4},
+            {'raise_angle': (0, 30), 'twist_x_angle': (0, 40),
+             'twise_y_angle': (0, 40), 'g_steps': steps})
+
+        # request counts survive reloads and, through gaitUsageFile,
+        # restarts, the most requested variants are compiled at boot
+        if previous is not None:
+            self.gait_registry.usage.update(previous.usage)
+        else:
+            self.load_gait_usage()
+        self.gait_registry.prewarm(
+            self.config.get('gaitPrewarm', []) +
+            self.gait_registry.most_frequent(
+                self.config.get('gaitPrewarmCount', 8)))
 
-        self.posture(self.standby_posture['coord'])
-        time.sleep(1)
+    def load_gait_usage(self):
+        try:
+            with open(self.gait_usage.filename, 'r') as read_file:
+                self.gait_registry.load_usage(json.load(read_file))
+        except FileNotFoundError:
+            pass
+        except (OSError, AttributeError, KeyError, TypeError,
+                ValueError) as err:
+            print('gait usage not loaded: {}'.format(err))
+
+    def build_macros(self):
+        # every macro is compiled once into one angle table
+        self.macros = {}
+        for name, text in self.config.get('macros', {}).items():
+            try:
+                self.macros[name] = self.compile_macro(text)
+            except GAIT_ERRORS as err:
+                print('invalid macro: {} ({})'.format(name, err))
+
+    def compile_macro(self, text):
+        interval = self.config.get('movementInterval', 5)/1000
+        steps = []
+        for cmd, cycles, seconds in parse_macro(text):
+            if ',' in cmd:
+                name, params = self.parse_gait(cmd)
+                motion = self.gait_registry.get(name, **params)
+            else:
+                motion = self.cmd_dict[cmd]
+
+            if motion['type'] == 'posture':
+                angles = self.kinematics.inverse_kinematics(
+                    np.asarray(motion['coord']))[None]
+            else:
+                angles = self.motion_angles(motion)
+            durations = motion.get('durations')
+            if durations is None:
+                durations = np.full(len(angles), interval)
+            steps.append((angles, durations, cycles, seconds))
+
+        angles, durations = concat_steps(
+            steps, self.config.get('macroMaxFrames', 20000))
+        # played once, see step()
+        return {'angles': angles,
+                'durations': durations,
+                'once': True,
+                'type': 'angles'}
 
     def gen_posture(self, j2_angle, j3_angle):
         j2_rad = j2_angle/180*np.pi
@@ -219,22 +538,21 @@ class Hexapod(Thread):
                 'type': 'posture'}
 
     def posture(self, coordinate):
-        angles = self.inverse_kinematics(coordinate)
-
-        self.legs[0].move_junctions(angles[0, :])
-        self.legs[5].move_junctions(angles[5, :])
+        angles = self.inverse_kinematics(self.posed(coordinate))
+        self.frame_due = 0.0
 
-        self.legs[1].move_junctions(angles[1, :])
-        self.legs[4].move_junctions(angles[4, :])
+        self.move_legs(angles, played=False)
 
-        self.legs[2].move_junctions(angles[2, :])
-        self.legs[3].move_junctions(angles[3, :])
+    def move_legs(self, angles, played=True):
+        # played: a frame of a motion, held postures are not timed
+        if self.recorder is not None:
+            self.recorder.record_frame(angles)
 
-    def move(self, path):
-        for p_idx in range(0, np.shape(path)[0]):
-            dest = path[p_idx, :, :]
-            angles = self.inverse_kinematics(dest)
+        # never pass nan to the servos, hold the last pose instead
+        if not np.all(np.isfinite(angles)):
+            return
 
+        with tracer.span('move_legs'):
             self.legs[0].move_junctions(angles[0, :])
             self.legs[5].move_junctions(angles[5, :])
 
@@ -244,21 +562,70 @@ class Hexapod(Thread):
             self.legs[2].move_junctions(angles[2, :])
             self.legs[3].move_junctions(angles[3, :])
 
-            # time.sleep(self.interval)
+        if self.frame_ring is not None:
+            self.publish_frame(self.frame_due)
+        if self.jitter is not None and played:
+            self.jitter.frame(self.clock.monotonic())
 
-    def motion(self, path):
-        for p_idx in range(0, np.shape(path)[0]):
-            dest = path[p_idx, :, :]
-            angles = self.inverse_kinematics(dest)
+    def publish_frame(self, due=0.0):
+        try:
+            self.frame_ring.publish(due)
+        except ServoProcessError as err:
+            print('{}, writing servos in-process'.format(err))
+            self.output_in_process()
+
+    def output_in_process(self):
+        # the output process is gone, the legs get the servos of in-process
+        # kits with the angles staged so far
+        if ServoKit is None:
+            raise RuntimeError('adafruit_servokit is not installed')
+        kits = {address: ServoKit(channels=16, address=address,
+                                  frequency=50)
+                for address in BOARDS}
+        self.pca_left = kits[0x40]
+        self.pca_right = kits[0x41]
+        for leg in self.legs:
+            servos = []
+            for ring_servo in leg.junction_servos:
+                board, channel = divmod(ring_servo.channel, 16)
+                servo = kits[BOARDS[board]].servo[channel]
+                if ring_servo.angle is not None:
+                    servo.angle = ring_servo.angle
+                servos.append(servo)
+            leg.junction_servos = servos
+        self.frame_ring = None
+        self.output_lead = 0.0
 
-            self.legs[0].move_junctions(angles[0, :])
-            self.legs[5].move_junctions(angles[5, :])
+    def move(self, path):
+        for p_idx in range(0, len(path)):
+            dest = path[p_idx]
+            angles = self.inverse_kinematics(dest)
+            self.move_legs(angles)
 
-            self.legs[1].move_junctions(angles[1, :])
-            self.legs[4].move_junctions(angles[4, :])
+            # time.sleep(self.interval)
 
-            self.legs[2].move_junctions(angles[2, :])
-            self.legs[3].move_junctions(angles[3, :])
+    def wait_frame(self, deadline):
+        delay = deadline - self.output_lead - self.clock.monotonic()
+        if self.gc_scheduler is not None:
+            # collect garbage in the slack before the frame
+            self.gc_scheduler.idle(delay)
+            delay = deadline - self.output_lead - self.clock.monotonic()
+        if delay > 0:
+            with tracer.span('wait'):
+                self.clock.sleep(delay)
+
+    def motion(self, path, durations=None):
+        deadline = self.clock.monotonic()
+        for p_idx in range(0, len(path)):
+            dest = self.posed(path[p_idx])
+            self.frame_due = deadline if durations is not None else 0.0
+            angles = self.inverse_kinematics(self.reach(dest))
+            self.move_legs(angles)
+
+            # retimed gaits hold every frame for its own duration
+            if durations is not None:
+                deadline += durations[p_idx]
+                self.wait_frame(deadline)
 
             try:
                 cmd_string = self.cmd_queue.get(block=False)
@@ -268,61 +635,334 @@ class Hexapod(Thread):
                 pass
             else:
                 self.cmd_handler(cmd_string)
-                break
+                if not self.is_pose_cmd(cmd_string):
+                    break
+
+    def angle_motion(self, angle_table, durations=None):
+        deadline = self.clock.monotonic()
+        for p_idx in range(0, len(angle_table)):
+            self.frame_due = deadline if durations is not None else 0.0
+            self.move_legs(angle_table[p_idx])
+
+            if durations is not None:
+                deadline += durations[p_idx]
+                self.wait_frame(deadline)
+
+            try:
+                cmd_string = self.cmd_queue.get(block=False)
+                print('interrput')
+            except Empty:
+                pass
+            else:
+                self.cmd_handler(cmd_string)
+                if not self.is_pose_cmd(cmd_string):
+                    break
+
+    def stream_motion(self):
+        # plays streamed frames at their interval until the jitter buffer
+        # runs dry, the last pose is held meanwhile
+        default_interval = self.config.get('movementInterval', 5)/1000
+        deadline = None
+        while True:
+            frame = self.frame_stream.get(timeout=default_interval)
+            if frame is None:
+                return
+
+            kind, interval, dest = frame
+            if deadline is None:
+                deadline = self.clock.monotonic()
+            self.frame_due = deadline
+            if kind == ANGLES:
+                self.move_legs(dest)
+            else:
+                dest = self.reach(self.posed(dest))
+                self.move_legs(self.inverse_kinematics(dest))
+
+            deadline += interval or default_interval
+            self.wait_frame(deadline)
+
+            try:
+                cmd_string = self.cmd_queue.get(block=False)
+            except Empty:
+                pass
+            else:
+                self.cmd_handler(cmd_string)
+                if not self.is_pose_cmd(cmd_string):
+                    return
+
+    def posed(self, dest):
+        # foot positions with the body pose applied, one batched transform
+        if not self.pose.active:
+            return dest
+        if self.pose.moving:
+            self.pose.update(self.clock.monotonic())
+        return self.pose.apply(dest)
+
+    def reach(self, dest):
+        # targets out of reach are clamped, not skipped, so the legs
+        # follow instead of holding and jumping
+        if self.workspace is None:
+            return dest
+        if np.all(self.workspace.reachable(dest)):
+            return dest
+        return self.workspace.clamp(dest)
+
+    def motion_coord(self, motion):
+        # foot positions of angle tables, for a body pose on top of them
+        if 'coord' not in motion:
+            motion['coord'] = self.kinematics.forward_kinematics(
+                np.asarray(motion['angles']))
+        return motion['coord']
 
     def inverse_kinematics(self, dest):
-        temp_dest = dest-self.mount_position
-        local_dest = np.zeros_like(dest)
-        local_dest[:, 0] = temp_dest[:, 0] * \
-            np.cos(self.mount_angle) + \
-            temp_dest[:, 1] * np.sin(self.mount_angle)
-        local_dest[:, 1] = temp_dest[:, 0] * \
-            np.sin(self.mount_angle) - \
-            temp_dest[:, 1] * np.cos(self.mount_angle)
-        local_dest[:, 2] = temp_dest[:, 2]
-
-        angles = np.zeros((6, 3))
-        x = local_dest[:, 0] - self.root_j1
-        y = local_dest[:, 1]
-
-        angles[:, 0] = -(np.arctan2(y, x) * 180 / np.pi)+90
-
-        x = np.sqrt(x*x + y*y) - self.j1_j2
-        y = local_dest[:, 2]
-        ar = np.arctan2(y, x)
-        lr2 = x*x + y*y
-        lr = np.sqrt(lr2)
-        a1 = np.arccos((lr2 + self.j2_j3*self.j2_j3 -
-                        self.j3_tip*self.j3_tip)/(2*self.j2_j3*lr))
-        a2 = np.arccos((lr2 - self.j2_j3*self.j2_j3 +
-                        self.j3_tip*self.j3_tip)/(2*self.j3_tip*lr))
-
-        angles[:, 1] = 90-((ar + a1) * 180 / np.pi)
-        angles[:, 2] = (90 - ((a1 + a2) * 180 / np.pi))+90
-
-        return angles
+        with tracer.span('ik'):
+            if self.ik_cache is not None:
+                return self.ik_cache.inverse_kinematics(dest)
+            return self.kinematics.inverse_kinematics(dest)
+
+    def compile_gait(self, motion):
+        motion['angles'] = compile_angles(motion['coord'], self.kinematics)
+        return motion
+
+    def gaits(self, cmds=None):
+        # (cmd, motion) of cmds, all gaits by default
+        if cmds is None:
+            return list(self.cmd_dict.items())
+        return [(cmd, self.cmd_dict[cmd]) for cmd in cmds
+                if cmd in self.cmd_dict]
+
+    def bundle_angles(self, cmd, motion):
+        # angles solved by the path tool are played when they match the
+        # runtime geometry and standby posture, checked on every frame
+        angles = motion.get('table_angles')
+        if angles is None or len(angles) != len(motion['coord']):
+            return False
+        error = np.max(np.abs(self.kinematics.forward_kinematics(
+            angles) - np.asarray(motion['coord'])))
+        if not error <= self.config.get('gaitBundleTolerance', 1.0):
+            print('{}: bundled angles off by {:.1f} mm, solved'.format(
+                cmd, error))
+            return False
+        motion['angles'] = angles
+        return True
+
+    def compile_gaits(self, cmds=None):
+        solved = 0
+        total = 0
+        bundled = 0
+        for cmd, motion in self.gaits(cmds):
+            if motion['type'] != 'motion':
+                continue
+            if self.bundle_angles(cmd, motion):
+                bundled += 1
+            elif self.compile_enabled:
+                self.compile_gait(motion)
+                solved += len(motion['angles'].unique)
+                total += 6
+        if self.compile_enabled:
+            print('compiled gaits: {} of {} leg trajectories solved, '
+                  '{} gaits from the bundle'.format(solved, total, bundled))
+
+    def unreachable_frames(self, motion):
+        if self.workspace is None or motion['type'] != 'motion':
+            return 0
+        reachable = self.workspace.solvable(np.asarray(motion['coord']))
+        return int(np.count_nonzero(~np.all(reachable, axis=-1)))
+
+    def check_workspace(self, cmds=None):
+        for cmd, motion in self.gaits(cmds):
+            count = self.unreachable_frames(motion)
+            if count:
+                print('{}: {} frames out of reach'.format(cmd, count))
+
+    def prepare_gait(self, motion):
+        # parametric gaits out of reach are rejected, not cached
+        count = self.unreachable_frames(motion)
+        if count:
+            raise ValueError('{} frames out of reach'.format(count))
+        if self.compile_enabled:
+            self.compile_gait(motion)
+        return motion
+
+    def motion_angles(self, motion):
+        if 'angles' in motion:
+            return np.asarray(motion['angles'])
+        elif motion['type'] == 'motion':
+            return self.kinematics.inverse_kinematics(
+                np.asarray(motion['coord']))
+        return None
+
+    def check_rates(self, cmds=None):
+        # report how fast servos have to move for every gait at the
+        # movement interval, and the fastest rate each gait can be played
+        interval = self.config.get('movementInterval', 5)/1000
+        reports = {} if cmds is None else {
+            cmd: report for cmd, report in self.rate_reports.items()
+            if cmd in self.cmd_dict}
+        for cmd, motion in self.gaits(cmds):
+            angles = self.motion_angles(motion)
+            if angles is None:
+                continue
+
+            report = check_rates(
+                angles,
+                interval,
+                self.config.get('servoMaxVelocity', [600, 600, 600]),
+                self.config.get('servoMaxAcceleration', [50000, 50000, 50000]))
+            reports[cmd] = report
+
+            # one line per gait, every frame with rateCheckVerbose
+            print('{}: max {:.0f} deg/s, {:.0f} deg/s^2, '
+                  'max playback {:.1f} frames/s, {} of {} frames too fast, '
+                  'worst leg {} joint {}'.format(
+                      cmd, report['max_velocity'], report['max_acceleration'],
+                      report['max_rate'], len(report['failed']), len(angles),
+                      *report['worst_joint']))
+            if self.config.get('rateCheckVerbose', False):
+                for frame, joints in sorted(report['failed'].items()):
+                    print('{}: frame {} too fast at {}'.format(
+                        cmd, frame, ', '.join(
+                            'leg {} joint {}'.format(*joint)
+                            for joint in joints)))
+        self.rate_reports = reports
+
+    def retime_gaits(self, cmds=None):
+        # play every gait as fast as the servo limits allow
+        for cmd, motion in self.gaits(cmds):
+            angles = self.motion_angles(motion)
+            if angles is None:
+                continue
+
+            motion['durations'] = retime(
+                angles,
+                self.config.get('servoMaxVelocity', [600, 600, 600]),
+                self.config.get('servoMaxAcceleration', [50000, 50000, 50000]))
+            print('{}: retimed cycle {:.1f} ms'.format(
+                cmd, np.sum(motion['durations'])*1000))
 
     def cmd_handler(self, cmd_string):
+        with tracer.span('cmd_handler'):
+            if self.recorder is not None:
+                self.recorder.record_command(cmd_string)
+
+            data = cmd_string.split(':')[-2]
+
+            if data == self.CMD_CALIBRATION:
+                self.calibration_mode = True
+                self.legs[0].reset(calibrated=True)
+                self.legs[1].reset(calibrated=True)
+                self.legs[2].reset(calibrated=True)
+                self.legs[3].reset(calibrated=True)
+                self.legs[4].reset(calibrated=True)
+                self.legs[5].reset(calibrated=True)
+            elif data == self.CMD_NORMAL:
+                self.calibration_mode = False
+            else:
+                # any other command ends a stream
+                if self.frame_stream is not None and \
+                        data != self.CMD_STREAM:
+                    self.frame_stream.stop()
+
+                if self.calibration_mode:
+                    self.calibration_cmd_handler(data)
+                elif data == self.CMD_STREAM and \
+                        self.frame_stream is not None:
+                    self.current_motion = {'type': 'stream'}
+                elif data.startswith(self.CMD_MACRO + ','):
+                    self.define_macro(data)
+                elif self.is_pose_cmd(cmd_string):
+                    self.pose_cmd_handler(data)
+                elif data in self.macros and data not in self.cmd_dict:
+                    self.current_motion = self.macros[data]
+                elif ',' in data:
+                    self.current_motion = self.parametric_motion(data)
+                else:
+                    self.current_motion = self.cmd_dict.get(
+                        data, self.standby_posture)
+
+                if self.ik_cache is not None and \
+                        self.ik_cache.misses != self.ik_misses:
+                    self.ik_misses = self.ik_cache.misses
+                    print('ik cache: {}'.format(self.ik_cache.stats()))
+
+            # calibration moves servos outside of frames
+            if self.frame_ring is not None:
+                self.publish_frame()
+
+            self.cmd_queue.task_done()
+
+    def parse_gait(self, cmd_string):
+        # 'name,key=value,...'
+        data_array = cmd_string.split(',')
+        name = data_array[0].strip()
+
+        params = {}
+        for item in data_array[1:]:
+            key, value = item.split('=')
+            try:
+                params[key.strip()] = float(value)
+            except ValueError:
+                params[key.strip()] = value.strip()
+        return name, params
+
+    def parametric_motion(self, cmd_string):
+        try:
+            name, params = self.parse_gait(cmd_string)
+            misses = self.gait_registry.misses
+            motion = self.gait_registry.get(name, **params)
+        except GAIT_ERRORS as err:
+            print('invalid gait: {} ({})'.format(cmd_string, err))
+            return self.standby_posture
+
+        if self.gait_registry.misses != misses:
+            print('gait cache: {}'.format(self.gait_registry.stats()))
+        self.gait_usage.save(self.gait_registry.usage_state())
+        return motion
+
+    def is_pose_cmd(self, cmd_string):
         data = cmd_string.split(':')[-2]
+        return data == self.CMD_POSE or data.startswith(self.CMD_POSE + ',')
 
-        if data == self.CMD_CALIBRATION:
-            self.calibration_mode = True
-            self.legs[0].reset(calibrated=True)
-            self.legs[1].reset(calibrated=True)
-            self.legs[2].reset(calibrated=True)
-            self.legs[3].reset(calibrated=True)
-            self.legs[4].reset(calibrated=True)
-            self.legs[5].reset(calibrated=True)
-        elif data == self.CMD_NORMAL:
-            self.calibration_mode = False
+    def pose_cmd_handler(self, cmd_string):
+        if cmd_string == self.CMD_POSE:
+            self.pose.reset()
+            return
+        try:
+            _, params = self.parse_gait(cmd_string)
+            self.pose.set(**params)
+        except (KeyError, TypeError, ValueError) as err:
+            print('invalid pose: {} ({})'.format(cmd_string, err))
+
+    def define_macro(self, cmd_string):
+        # 'macro,name=step;step;...', an empty definition deletes the macro
+        name, _, text = cmd_string[len(self.CMD_MACRO)+1:].partition('=')
+        name = name.strip()
+        text = text.strip()
+        macros = dict(self.config.get('macros', {}))
+
+        if not text:
+            self.macros.pop(name, None)
+            macros.pop(name, None)
+            print('macro {} deleted'.format(name))
         else:
-            if self.calibration_mode:
-                self.calibration_cmd_handler(data)
-            else:
-                self.current_motion = self.cmd_dict.get(
-                    data, self.standby_posture)
+            if not name or ',' in name or name in self.cmd_dict or \
+                    name in (self.CMD_STREAM, self.CMD_MACRO,
+                             self.CMD_CALIBRATION, self.CMD_NORMAL):
+                print('invalid macro name: {}'.format(name))
+                return
+            try:
+                self.macros[name] = self.compile_macro(text)
+            except GAIT_ERRORS as err:
+                print('invalid macro: {} ({})'.format(cmd_string, err))
+                return
+            macros[name] = text
+            print('macro {}: {} frames, {:.2f} s'.format(
+                name, len(self.macros[name]['angles']),
+                np.sum(self.macros[name]['durations'])))
 
-        self.cmd_queue.task_done()
+        # uploaded once, kept in config.json
+        self.config['macros'] = macros
+        self.save_config()
 
     def calibration_cmd_handler(self, cmd_string):
         data_array = cmd_string.split(',')
@@ -349,40 +989,279 @@ class Hexapod(Thread):
                 self.save_config()
 
     def save_config(self):
+        self.config_service.save()
+
+    def reload(self, changed):
+        # called by the config service with the changed keys, rebuilds only
+        # what depends on them, on a stage while the robot keeps running;
+        # step() swaps the result in between two motions
+        with self.reload_lock:
+            staged = ReloadStage(self, self.pending_reload)
+        before = dict(staged.__dict__)
+        staged.cmd_dict = dict(staged.cmd_dict)
+        staged.gait_sources = dict(staged.gait_sources)
+
+        geometry = bool(changed & self.GEOMETRY_KEYS)
+        if geometry or changed & self.IK_CACHE_KEYS:
+            staged.build_kinematics()
+        if geometry:
+            staged.build_postures()
+
+        # postures, generated paths and bundles are placed around the
+        # standby posture, angle tables are solved by the path tool
+        sources = set()
+        if geometry:
+            sources.update(('posture', 'generator', 'bundle'))
+        if changed & {'gaitBundle', 'gaitBundleTolerance'}:
+            sources.add('bundle')
+        if 'angleTable' in changed:
+            sources.add('table')
+        if changed & {'compileGaits', 'retimeGaits'}:
+            sources.update(self.GAIT_SOURCES)
+        cmds = staged.build_gaits(sources) if sources else []
+        staged.compile_gaits(cmds)
+
+        if geometry or changed & (self.OFFSET_KEYS | self.WORKSPACE_KEYS):
+            staged.build_workspace()
+            staged.check_workspace()
+        else:
+            staged.check_workspace(cmds)
+
+        retime = staged.config.get('retimeGaits', False)
+        if changed & self.RATE_KEYS:
+            cmds = None
+            if retime:
+                # the durations of a playing gait are replaced, not changed
+                for cmd, motion in staged.gaits():
+                    if motion['type'] != 'posture':
+                        staged.cmd_dict[cmd] = dict(motion)
+        staged.check_rates(cmds)
+        if retime:
+            staged.retime_gaits(cmds)
+
+        if geometry or changed & (self.OFFSET_KEYS | self.WORKSPACE_KEYS |
+                                  self.REGISTRY_KEYS | {'compileGaits'}):
+            staged.build_registry()
+        # macros copy the angles of the gaits they use
+        staged.build_macros()
+
+        ignored = changed - (
+            self.GEOMETRY_KEYS | self.OFFSET_KEYS | self.IK_CACHE_KEYS |
+            self.WORKSPACE_KEYS | self.RATE_KEYS | self.REGISTRY_KEYS |
+            {'gaitBundle', 'gaitBundleTolerance', 'angleTable',
+             'compileGaits', 'retimeGaits', 'macros'})
+        if ignored:
+            print('not reloaded: {}'.format(', '.join(sorted(ignored))))
+
+        update = {name: value for name, value in staged.__dict__.items()
+                  if before.get(name) is not value}
+        with self.reload_lock:
+            if self.pending_reload is None:
+                self.pending_reload = update
+            else:
+                self.pending_reload.update(update)
+
+    def apply_reload(self):
+        with self.reload_lock:
+            update, self.pending_reload = self.pending_reload, None
+        cmd_dict = self.cmd_dict
+        self.__dict__.update(update)
+        # the registry may come from the stage
+        self.gait_registry.compiler = self.prepare_gait
+
+        for leg in self.legs:
+            correction = self.config.get('leg{}Offset'.format(leg.id))
+            if correction is not None and correction != leg.correction:
+                leg.correction = correction
+
+        for cmd, motion in cmd_dict.items():
+            if self.current_motion is motion:
+                self.current_motion = self.cmd_dict.get(
+                    cmd, self.standby_posture)
+                break
+
+    def step(self):
+        if self.pending_reload is not None:
+            self.apply_reload()
+
+        # a held posture has no frames to keep in time, in real-time mode
+        # the loop waits for commands then instead of taking the only core
+        idle = self.realtime is not None and (
+            self.calibration_mode or
+            self.current_motion['type'] == 'posture')
+        if idle and self.gc_scheduler is not None:
+            self.gc_scheduler.between_commands(self.clock.monotonic())
+
+        # if self.current_motion is None:
         try:
-            json.dump(self.config, open(
-                '/home/pi/hexapod/software/raspberry pi/config.json', 'w+'), indent=4)
-        except PermissionError as err:
+            if idle:
+                cmd_string = self.cmd_queue.get(
+                    timeout=self.config.get('movementInterval', 5)/1000)
+            else:
+                cmd_string = self.cmd_queue.get(block=False)
+        except Empty:
+            # time.sleep(self.interval)
             pass
+        else:
+            self.cmd_handler(cmd_string)
+
+        if not self.calibration_mode:
+            with tracer.span('motion'):
+                motion = self.current_motion
+                if 'angles' in motion and not self.pose.active:
+                    self.angle_motion(motion['angles'],
+                                      motion.get('durations'))
+                elif motion['type'] in ('motion', 'angles'):
+                    # a body pose is solved per frame from the feet
+                    self.motion(self.motion_coord(motion),
+                                motion.get('durations'))
+                elif motion['type'] == 'posture':
+                    self.posture(motion['coord'])
+                elif motion['type'] == 'stream':
+                    self.stream_motion()
+
+                if motion.get('once') and self.current_motion is motion:
+                    # macros hold their last pose when done
+                    self.current_motion = {
+                        'angles': motion['angles'][-1:],
+                        'durations': motion['durations'][-1:],
+                        'type': 'angles'}
+
+        if self.gc_scheduler is not None:
+            self.gc_scheduler.between_motions()
+        if self.jitter is not None and \
+                self.jitter.due(self.clock.monotonic()):
+            print('frame jitter: {}'.format(
+                self.jitter.report(self.clock.monotonic())))
+        if self.frame_ring is not None:
+            self.report_output()
+
+    def report_output(self):
+        now = self.clock.monotonic()
+        if self.output_report is None:
+            self.output_report = now
+        if now - self.output_report < self.config.get(
+                'servoReportInterval', 30):
+            return
+        self.output_report = now
+        stats = self.frame_ring.output_stats()
+        if stats['late'] != self.output_late:
+            self.output_late = stats['late']
+            print('servo output: {}'.format(stats))
 
     def run(self):
+        if self.realtime is not None:
+            # scheduling applies to this thread only
+            report, self.gc_scheduler = enable_realtime(self.realtime)
+            self.jitter = JitterMonitor(
+                interval=self.config.get('jitterReportInterval', 30))
+            print('real-time mode: {}'.format(report))
+
         while True:
-            # if self.current_motion is None:
-            try:
-                cmd_string = self.cmd_queue.get(block=False)
-            except Empty:
-                # time.sleep(self.interval)
-                pass
-            else:
-                self.cmd_handler(cmd_string)
+            self.step()
+
 
-            if not self.calibration_mode:
-                if self.current_motion['type'] == 'motion':
-                    self.motion(self.current_motion['coord'])
-                elif self.current_motion['type'] == 'posture':
-                    self.posture(self.current_motion['coord'])
+class ReloadStage(object):
+    # the state of a Hexapod that reload() rebuilds, without the thread,
+    # its queues, locks and servos; the build_* helpers of Hexapod run on
+    # it unchanged and only see the attributes in Hexapod.RELOAD_STATE
+    def __init__(self, hexapod, pending=None):
+        for name in Hexapod.RELOAD_STATE:
+            setattr(self, name, hexapod.__dict__[name])
+        if pending is not None:
+            self.__dict__.update(pending)
+
+    def __getattr__(self, name):
+        # methods and constants of Hexapod, anything else is not staged
+        value = getattr(Hexapod, name)
+        if isinstance(value, types.FunctionType):
+            return types.MethodType(value, self)
+        return value
 
 
 def main():
-    q = Queue()
-    tcp_server = TCPServer(q)
+    parser = argparse.ArgumentParser(description='hexapod runtime')
+    parser.add_argument('--trace', metavar='FILE', default=None,
+                        help='record a Chrome trace of all threads, written '
+                        'on exit and on SIGUSR1')
+    parser.add_argument('--traceEvents', metavar='N', dest='trace_events',
+                        type=int, default=1000000,
+                        help='trace events kept in memory (default: '
+                        '%(default)s)')
+    parser.add_argument('--servoProcess', dest='servo_process',
+                        action='store_true',
+                        help='write servo frames from a separate process')
+    parser.add_argument('--ringFrames', metavar='N', dest='ring_frames',
+                        type=int, default=8,
+                        help='frames buffered for the servo process '
+                        '(default: %(default)s)')
+    parser.add_argument('--realtime', dest='realtime', action='store_true',
+                        help='run the frame loop with SCHED_FIFO (or a '
+                        'raised nice level), mlockall and manual gc')
+    parser.add_argument('--rtPriority', metavar='N', dest='rt_priority',
+                        type=int, default=50,
+                        help='SCHED_FIFO priority (default: %(default)s)')
+    args = parser.parse_args()
+
+    realtime = args.rt_priority if args.realtime else None
+    frame_ring = None
+    if args.servo_process:
+        frame_ring = FrameRing(args.ring_frames)
+        # the output process is the frame loop then, a real-time control
+        # thread could starve it on a single core
+        start_servo_process(frame_ring, realtime=realtime)
+        realtime = None
+
+    if args.trace:
+        tracer.enable(args.trace_events)
+        q = TracedQueue()
+    else:
+        q = Queue()
+
+    # config.json is parsed once, and reloaded when it changes
+    config_service = ConfigService()
+
+    # frames streamed by a client over tcp
+    frame_stream = FrameStream(
+        config_service.config.get('streamFrames', 64),
+        config_service.config.get('streamPrefill', 8))
+
+    # sender timestamped commands keep their timing over wifi and rfcomm
+    server_queue = q
+    if config_service.config.get('commandJitterBuffer', False):
+        server_queue = CommandJitterBuffer(
+            q,
+            config_service.config.get('commandDelayMin', 0.02),
+            config_service.config.get('commandDelayMax', 0.5))
+        server_queue.start()
+
+    tcp_server = TCPServer(server_queue, config_service.config, frame_stream)
     tcp_server.start()
 
-    bt_server = BluetoothServer(q)
+    bt_server = BluetoothServer(server_queue, config_service.config)
     bt_server.start()
 
-    hexapod = Hexapod(q)
+    hexapod = Hexapod(q, frame_ring=frame_ring, realtime=realtime,
+                      config_service=config_service,
+                      frame_stream=frame_stream)
     hexapod.start()
+    config_service.start()
+
+    if args.trace:
+        def dump_trace(signum=None, frame=None):
+            count = tracer.dump(args.trace)
+            print('{} trace events written to {}'.format(count, args.trace))
+
+        signal.signal(signal.SIGUSR1, dump_trace)
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        try:
+            while True:
+                signal.pause()
+        except (KeyboardInterrupt, SystemExit):
+            dump_trace()
+            config_service.flush()
+            # the server threads block on their sockets
+            os._exit(0)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,227 @@
+#!python
+#
+# 2021  Zhengyu Peng
+# Website: https://zpeng.me
+#
+# `                      `
+# -:.                  -#:
+# -//:.              -###:
+# -////:.          -#####:
+# -/:.://:.      -###++##:
+# ..   `://:-  -###+. :##:
+#        `:/+####+.   :##:
+# .::::::::/+###.     :##:
+# .////-----+##:    `:###:
+#  `-//:.   :##:  `:###/.
+#    `-//:. :##:`:###/.
+#      `-//:+######/.
+#        `-/+####/.
+#          `+##+.
+#           :##:
+#           :##:
+#           :##:
+#           :##:
+#           :##:
+#            .+:
+
+
+import numpy as np
+
+
+class Kinematics:
+    # Leg inverse kinematics, works on a single frame (6, 3) as well as on
+    # whole paths (N, 6, 3)
+    def __init__(self, config):
+        self.mount_x = np.array(config['legMountX'])
+        self.mount_y = np.array(config['legMountY'])
+        self.root_j1 = config['legRootToJoint1']
+        self.j1_j2 = config['legJoint1ToJoint2']
+        self.j2_j3 = config['legJoint2ToJoint3']
+        self.j3_tip = config['legJoint3ToTip']
+        self.mount_angle = np.array(config['legMountAngle'])/180*np.pi
+        self.mount_position = np.zeros((6, 3))
+        self.mount_position[:, 0] = self.mount_x
+        self.mount_position[:, 1] = self.mount_y
+
+    def to_local(self, dest):
+        # body coordinates -> leg coordinates
+        temp_dest = dest-self.mount_position
+        local_dest = np.zeros_like(temp_dest)
+        local_dest[..., 0] = temp_dest[..., 0] * \
+            np.cos(self.mount_angle) + \
+            temp_dest[..., 1] * np.sin(self.mount_angle)
+        local_dest[..., 1] = temp_dest[..., 0] * \
+            np.sin(self.mount_angle) - \
+            temp_dest[..., 1] * np.cos(self.mount_angle)
+        local_dest[..., 2] = temp_dest[..., 2]
+        return local_dest
+
+    def solve_local(self, local_dest):
+        # leg coordinates -> servo angles in degree
+        angles = np.zeros_like(local_dest)
+        x = local_dest[..., 0] - self.root_j1
+        y = local_dest[..., 1]
+
+        angles[..., 0] = -(np.arctan2(y, x) * 180 / np.pi)+90
+
+        x = np.sqrt(x*x + y*y) - self.j1_j2
+        y = local_dest[..., 2]
+        ar = np.arctan2(y, x)
+        lr2 = x*x + y*y
+        lr = np.sqrt(lr2)
+        a1 = np.arccos((lr2 + self.j2_j3*self.j2_j3 -
+                        self.j3_tip*self.j3_tip)/(2*self.j2_j3*lr))
+        a2 = np.arccos((lr2 - self.j2_j3*self.j2_j3 +
+                        self.j3_tip*self.j3_tip)/(2*self.j3_tip*lr))
+
+        angles[..., 1] = 90-((ar + a1) * 180 / np.pi)
+        angles[..., 2] = (90 - ((a1 + a2) * 180 / np.pi))+90
+
+        return angles
+
+    def inverse_kinematics(self, dest):
+        return self.solve_local(self.to_local(dest))
+
+    def to_body(self, local_dest):
+        # leg coordinates -> body coordinates, inverse of to_local
+        dest = np.zeros_like(local_dest)
+        dest[..., 0] = local_dest[..., 0] * np.cos(self.mount_angle) + \
+            local_dest[..., 1] * np.sin(self.mount_angle)
+        dest[..., 1] = local_dest[..., 0] * np.sin(self.mount_angle) - \
+            local_dest[..., 1] * np.cos(self.mount_angle)
+        dest[..., 2] = local_dest[..., 2]
+        return dest + self.mount_position
+
+    def forward_kinematics(self, angles):
+        # servo angles in degree -> body coordinates of the tips
+        rad = np.asarray(angles, dtype=np.float64)/180*np.pi
+        heading = np.pi/2 - rad[..., 0]
+        # elevation of joint2 -> joint3 and joint3 -> tip
+        e1 = np.pi/2 - rad[..., 1]
+        e2 = e1 - np.pi + rad[..., 2]
+
+        r = self.j1_j2 + self.j2_j3*np.cos(e1) + self.j3_tip*np.cos(e2)
+        local_dest = np.zeros(np.shape(rad))
+        local_dest[..., 0] = self.root_j1 + r*np.cos(heading)
+        local_dest[..., 1] = r*np.sin(heading)
+        local_dest[..., 2] = self.j2_j3*np.sin(e1) + self.j3_tip*np.sin(e2)
+        return self.to_body(local_dest)
+
+
+class IKCache:
+    # Inverse kinematics memoized on leg local foot positions quantized to
+    # resolution (mm), in a fixed size open addressing table
+    #
+    # A miss is solved exactly, a cell caches the solution at its center
+    # and only if the solutions at its 8 corners agree with it within
+    # tolerance (degree). The angles are close to linear across a cell of
+    # a fraction of a mm, so a hit anywhere in the cell is off by at most
+    # tolerance (max_error in practice) from the exact solution, later hits
+    # are not checked again. 0.5 degree is below one PCA9685 tick at 50 Hz.
+    # Non-finite and far off positions are solved, never cached.
+    HASH = np.array([73856093, 19349663, 83492791], dtype=np.uint64)
+    CORNERS = np.array([[x, y, z] for x in (-0.5, 0.5) for y in (-0.5, 0.5)
+                        for z in (-0.5, 0.5)])
+    # mm, keeps keys far from the int64 range
+    MAX_COORD = 1e6
+
+    def __init__(self, kinematics, size=4096, resolution=0.1, tolerance=0.5,
+                 max_probe=8):
+        # size is rounded up to a power of two
+        size = 1 << max(int(size) - 1, 1).bit_length()
+        self.kinematics = kinematics
+        self.resolution = resolution
+        self.tolerance = tolerance
+        self.max_probe = max_probe
+        self.mask = np.uint64(size - 1)
+
+        self.used = np.zeros(size, dtype=bool)
+        self.keys = np.zeros((size, 3), dtype=np.int64)
+        self.values = np.zeros((size, 3))
+
+        self.hits = 0
+        self.misses = 0
+        self.max_error = 0.0
+
+    def slots(self, keys):
+        hashed = keys.astype(np.uint64) * self.HASH
+        return (hashed[:, 0] ^ hashed[:, 1] ^ hashed[:, 2]) & self.mask
+
+    def lookup(self, local_dest):
+        points = np.asarray(local_dest, dtype=np.float64).reshape(-1, 3)
+        with np.errstate(invalid='ignore'):
+            cacheable = np.abs(points) < self.MAX_COORD
+        if not np.all(cacheable):
+            cacheable = np.all(cacheable, axis=1)
+            with np.errstate(invalid='ignore'):
+                result = self.kinematics.solve_local(points)
+            result[cacheable] = self.lookup(points[cacheable])
+            return result.reshape(np.shape(local_dest))
+
+        keys = np.rint(points/self.resolution).astype(np.int64)
+        home = self.slots(keys)
+
+        # steady state, every point hits its home slot
+        idx = home.astype(np.intp)
+        if np.all(self.used[idx]) and np.array_equal(self.keys[idx], keys):
+            self.hits += len(points)
+            return self.values[idx].reshape(np.shape(local_dest))
+
+        result = np.empty_like(points)
+
+        # probe all points together, a chain ends at an empty slot
+        pending = np.arange(len(points))
+        free = np.full(len(points), -1, dtype=np.int64)
+        ended = []
+        for probe in range(self.max_probe):
+            if len(pending) == 0:
+                break
+            idx = ((home[pending] + np.uint64(probe)) &
+                   self.mask).astype(np.intp)
+            used = self.used[idx]
+            hit = used & np.all(self.keys[idx] == keys[pending], axis=1)
+            result[pending[hit]] = self.values[idx[hit]]
+
+            empty = ~used
+            free[pending[empty]] = idx[empty]
+            ended.append(pending[empty])
+            pending = pending[~hit & ~empty]
+        miss = np.concatenate(ended + [pending])
+
+        self.hits += len(points) - len(miss)
+        self.misses += len(miss)
+        if len(miss):
+            result[miss] = self.fill(points[miss], keys[miss],
+                                     free[miss], home[miss])
+        return result.reshape(np.shape(local_dest))
+
+    def fill(self, points, keys, free, home):
+        exact = self.kinematics.solve_local(points)
+        centers = keys*self.resolution
+        center = self.kinematics.solve_local(centers)
+        with np.errstate(invalid='ignore'):
+            corners = self.kinematics.solve_local(
+                centers[:, np.newaxis] + self.CORNERS*self.resolution)
+        error = np.max(np.abs(corners - center[:, np.newaxis]), axis=(1, 2))
+
+        # a full chain overwrites its home slot
+        store = np.isfinite(error) & (error <= self.tolerance)
+        if np.any(store):
+            self.max_error = max(self.max_error, float(np.max(error[store])))
+        slot = np.where(free >= 0, free, home.astype(np.int64))[store]
+        self.used[slot] = True
+        self.keys[slot] = keys[store]
+        self.values[slot] = center[store]
+        return exact
+
+    def inverse_kinematics(self, dest):
+        return self.lookup(self.kinematics.to_local(dest))
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits/total if total else 0.0,
+                'max_error': self.max_error,
+                'entries': int(np.count_nonzero(self.used)),
+                'size': len(self.used)}
@@ -26,6 +26,8 @@
 
 import numpy as np
 
+from transforms import rotate_x, rotate_y, rotate_z, apply
+
 
 def semicircle_generator(radius, steps, reverse=False):
     assert (steps % 4) == 0
@@ -81,53 +83,31 @@ def semicircle2_generator(steps, y_radius, z_radius, x_radius, reverse=False):
 
 
 def get_rotate_x_matrix(angle):
-    angle = angle * np.pi / 180
-    return np.matrix([
-        [1, 0, 0, 0],
-        [0, np.cos(angle), -np.sin(angle), 0],
-        [0, np.sin(angle), np.cos(angle), 0],
-        [0, 0, 0, 1],
-    ])
+    return rotate_x(angle)
 
 
 def get_rotate_y_matrix(angle):
-    angle = angle * np.pi / 180
-    return np.matrix([
-        [np.cos(angle), 0, np.sin(angle), 0],
-        [0, 1, 0, 0],
-        [-np.sin(angle), 0, np.cos(angle), 0],
-        [0, 0, 0, 1],
-    ])
+    return rotate_y(angle)
 
 
 def get_rotate_z_matrix(angle):
-    angle = angle * np.pi / 180
-    return np.matrix([
-        [np.cos(angle), -np.sin(angle), 0, 0],
-        [np.sin(angle), np.cos(angle), 0, 0],
-        [0, 0, 1, 0],
-        [0, 0, 0, 1],
-    ])
+    return rotate_z(angle)
 
 
 def matrix_mul(m, pt):
-    ptx = list(pt) + [1]
-    return list((m * np.matrix(ptx).T).T.flat)[:-1]
+    return list(apply(m, [pt])[0])
 
 
 def path_rotate_x(path, angle):
-    ptx = np.append(path, np.ones((np.shape(path)[0], 1)), axis=1)
-    return ((get_rotate_x_matrix(angle) * np.matrix(ptx).T).T)[:, :-1]
+    return apply(rotate_x(angle), path)
 
 
 def path_rotate_y(path, angle):
-    ptx = np.append(path, np.ones((np.shape(path)[0], 1)), axis=1)
-    return ((get_rotate_y_matrix(angle) * np.matrix(ptx).T).T)[:, :-1]
+    return apply(rotate_y(angle), path)
 
 
 def path_rotate_z(path, angle):
-    ptx = np.append(path, np.ones((np.shape(path)[0], 1)), axis=1)
-    return ((get_rotate_z_matrix(angle) * np.matrix(ptx).T).T)[:, :-1]
+    return apply(rotate_z(angle), path)
 
 
 if __name__ == '__main__':
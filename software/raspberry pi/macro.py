@@ -0,0 +1,87 @@
+#!python
+#
+# 2021  Zhengyu Peng
+# Website: https://zpeng.me
+#
+# `                      `
+# -:.                  -#:
+# -//:.              -###:
+# -////:.          -#####:
+# -/:.://:.      -###++##:
+# ..   `://:-  -###+. :##:
+#        `:/+####+.   :##:
+# .::::::::/+###.     :##:
+# .////-----+##:    `:###:
+#  `-//:.   :##:  `:###/.
+#    `-//:. :##:`:###/.
+#      `-//:+######/.
+#        `-/+####/.
+#          `+##+.
+#           :##:
+#           :##:
+#           :##:
+#           :##:
+#           :##:
+#            .+:
+
+import math
+
+import numpy as np
+
+MAX_CYCLES = 1000
+
+
+# 'walk0*3;turnleft*2;rotatex@1.5' -> [('walk0', 3, None),
+# ('turnleft', 2, None), ('rotatex', None, 1.5)], '*' repeats whole
+# cycles, '@' plays (and loops) the motion for that many seconds
+def parse_macro(text):
+    steps = []
+    for item in text.split(';'):
+        item = item.strip()
+        if not item:
+            continue
+        cmd, sep, count = item.rpartition('@')
+        if sep:
+            seconds = float(count)
+            if not (seconds > 0 and math.isfinite(seconds)):
+                raise ValueError('{}: duration must be positive and finite'.format(item))
+            steps.append((cmd.strip(), None, seconds))
+            continue
+
+        cmd, sep, count = item.rpartition('*')
+        cycles = int(count) if sep else 1
+        if not 1 <= cycles <= MAX_CYCLES:
+            raise ValueError('{}: cycles must be within 1 to {}'.format(
+                item, MAX_CYCLES))
+        steps.append(((cmd if sep else item).strip(), cycles, None))
+
+    if not steps:
+        raise ValueError('empty macro')
+    return steps
+
+
+# steps: [(angles float[N][6][3], durations float[N] (s), cycles, seconds)]
+# -> one angle table and its frame durations, ValueError beyond max_frames
+def concat_steps(steps, max_frames=None):
+    angles = []
+    durations = []
+    frames = 0
+    for table, frame_durations, cycles, seconds in steps:
+        if seconds is not None:
+            # whole cycles covering the time, cut after the frame reaching it
+            cycle_time = float(np.sum(frame_durations))
+            if not cycle_time > 0:
+                raise ValueError('motion without duration')
+            cycles = math.ceil(seconds/cycle_time)
+        frames += cycles*len(table)
+        if max_frames is not None and frames > max_frames:
+            raise ValueError('more than {} frames'.format(max_frames))
+        table = np.tile(table, (cycles, 1, 1))
+        frame_durations = np.tile(frame_durations, cycles)
+        if seconds is not None:
+            end = np.searchsorted(np.cumsum(frame_durations), seconds) + 1
+            table = table[:end]
+            frame_durations = frame_durations[:end]
+        angles.append(table)
+        durations.append(frame_durations)
+    return np.concatenate(angles), np.concatenate(durations)
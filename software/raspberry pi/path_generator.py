@@ -26,9 +26,16 @@
 
 from lib import semicircle_generator, semicircle2_generator
 from lib import path_rotate_z
-from lib import get_rotate_x_matrix, get_rotate_y_matrix, get_rotate_z_matrix
+from transforms import rotate_x, rotate_y, rotate_z, translate
+from transforms import compose, apply
+from compact_gait import CompactGait
 import numpy as np
 
+ROTATIONS = {'x': rotate_x, 'y': rotate_y, 'z': rotate_z}
+
+# legs 3, 4, 5 are on the left side
+MIRROR_LEFT = np.array([np.eye(3)]*3 + [np.diag([-1.0, 1.0, 1.0])]*3)
+
 
 def gen_walk_path(standby_coordinate,
                   g_steps=28,
@@ -40,13 +47,10 @@ def gen_walk_path(standby_coordinate,
     semi_circle = semicircle_generator(g_radius, g_steps)
 
     semi_circle = np.array(path_rotate_z(semi_circle, direction))
-    mir_path = np.roll(semi_circle, halfsteps, axis=0)
-
-    path = np.zeros((g_steps, 6, 3))
-    path[:, [0, 2, 4], :] = np.tile(semi_circle[:, np.newaxis, :], (1, 3, 1))
-    path[:, [1, 3, 5], :] = np.tile(mir_path[:, np.newaxis, :], (1, 3, 1))
 
-    return {'coord': path+np.tile(standby_coordinate, (g_steps, 1, 1)),
+    return {'coord': CompactGait(semi_circle,
+                                 [0, halfsteps, 0, halfsteps, 0, halfsteps],
+                                 standby_coordinate),
             'type': 'motion'}
 
 
@@ -60,19 +64,14 @@ def gen_fastwalk_path(standby_coordinate,
 
     halfsteps = int(g_steps/2)
 
-    path = np.zeros((g_steps, 6, 3))
     semi_circle_r = semicircle2_generator(
         g_steps, y_radius, z_radius, x_radius, reverse=reverse)
-    semi_circle_l = semicircle2_generator(
-        g_steps, y_radius, z_radius, -x_radius, reverse=reverse)
 
-    path[:, [0, 2], :] = np.tile(semi_circle_r[:, np.newaxis, :], (1, 2, 1))
-    path[:, 1, :] = np.roll(semi_circle_r, halfsteps, axis=0)
-    path[:, 4, :] = semi_circle_l
-    path[:, [3, 5], :] = np.tile(
-        np.roll(semi_circle_l[:, np.newaxis, :], halfsteps, axis=0), (1, 2, 1))
-
-    return {'coord': path+np.tile(standby_coordinate, (g_steps, 1, 1)),
+    # left legs mirror the right trajectory in x
+    return {'coord': CompactGait(semi_circle_r,
+                                 [0, halfsteps, 0, halfsteps, 0, halfsteps],
+                                 standby_coordinate,
+                                 MIRROR_LEFT),
             'type': 'motion'}
 
 
@@ -83,27 +82,16 @@ def gen_turn_path(standby_coordinate,
     assert (g_steps % 4) == 0
     halfsteps = int(g_steps/2)
 
-    path = np.zeros((g_steps, 6, 3))
-
     semi_circle = semicircle_generator(g_radius, g_steps)
-    mir_path = np.roll(semi_circle, halfsteps, axis=0)
-
-    if direction == 'left':
-        path[:, 0, :] = path_rotate_z(semi_circle, 45)
-        path[:, 1, :] = path_rotate_z(mir_path, 0)
-        path[:, 2, :] = path_rotate_z(semi_circle, 315)
-        path[:, 3, :] = path_rotate_z(mir_path, 225)
-        path[:, 4, :] = path_rotate_z(semi_circle, 180)
-        path[:, 5, :] = path_rotate_z(mir_path, 135)
-    elif direction == 'right':
-        path[:, 0, :] = path_rotate_z(semi_circle, 45+180)
-        path[:, 1, :] = path_rotate_z(mir_path, 0+180)
-        path[:, 2, :] = path_rotate_z(semi_circle, 315+180)
-        path[:, 3, :] = path_rotate_z(mir_path, 225+180)
-        path[:, 4, :] = path_rotate_z(semi_circle, 180+180)
-        path[:, 5, :] = path_rotate_z(mir_path, 135+180)
-
-    return {'coord': path+np.tile(standby_coordinate, (g_steps, 1, 1)),
+
+    angles = np.array([45, 0, 315, 225, 180, 135])
+    if direction == 'right':
+        angles = angles+180
+
+    return {'coord': CompactGait(semi_circle,
+                                 [0, halfsteps, 0, halfsteps, 0, halfsteps],
+                                 standby_coordinate,
+                                 rotate_z(angles)[:, :3, :3]),
             'type': 'motion'}
 
 
@@ -121,22 +109,28 @@ def gen_climb_path(standby_coordinate,
         g_steps, y_radius, z_radius, x_radius, reverse=reverse)
     rpath[:, 2] = rpath[:, 2]+z_shift
 
-    lpath = semicircle2_generator(
-        g_steps, y_radius, z_radius, -x_radius, reverse=reverse)
-    lpath[:, 2] = lpath[:, 2]+z_shift
-
-    mir_rpath = np.roll(rpath, halfsteps, axis=0)
-    mir_lpath = np.roll(lpath, halfsteps, axis=0)
+    # left legs mirror the right trajectory in x
+    return {'coord': CompactGait(rpath,
+                                 [0, halfsteps, 0, halfsteps, 0, halfsteps],
+                                 standby_coordinate,
+                                 MIRROR_LEFT),
+            'type': 'motion'}
 
-    path = np.zeros((g_steps, 6, 3))
-    path[:, 0, :] = rpath
-    path[:, 1, :] = mir_rpath
-    path[:, 2, :] = rpath
-    path[:, 3, :] = mir_lpath
-    path[:, 4, :] = lpath
-    path[:, 5, :] = mir_lpath
 
-    return {'coord': path+np.tile(standby_coordinate, (g_steps, 1, 1)),
+def gen_body_pose_path(standby_coordinate,
+                       rotations=(),
+                       translation=None):
+    # body pose trajectory -> foot coordinates
+    # rotations: sequence of (axis, angles) composed like a matrix product,
+    #   angles are scalars or per-frame arrays in degree
+    # translation: per-frame body shift, (N, 3)
+    # all frames are computed in one batched operation
+    m = compose(np.eye(4), *[ROTATIONS[axis](angle)
+                             for axis, angle in rotations])
+    if translation is not None:
+        m = compose(translate(translation), m)
+
+    return {'coord': apply(m, standby_coordinate),
             'type': 'motion'}
 
 
@@ -147,39 +141,23 @@ def gen_rotatex_path(standby_coordinate,
     assert (g_steps % 4) == 0
     quarter = int(g_steps/4)
 
-    path = np.zeros((g_steps, 6, 3))
-
     step_angle = swing_angle / quarter
     step_offset = y_radius / quarter
 
-    scx = np.append(standby_coordinate, np.ones((6, 1)), axis=1)
-
-    for i in range(quarter):
-        m = get_rotate_x_matrix(swing_angle - i*step_angle)
-        m[1, 3] = -i * step_offset
+    i = np.arange(quarter)
+    angle = np.concatenate((swing_angle - i*step_angle,
+                            -i*step_angle,
+                            i*step_angle-swing_angle,
+                            i*step_angle))
+    shift = np.zeros((g_steps, 3))
+    shift[:, 1] = np.concatenate((-i * step_offset,
+                                  -y_radius + i * step_offset,
+                                  i * step_offset,
+                                  y_radius-i * step_offset))
 
-        path[i, :, :] = ((np.matmul(m, scx.T)).T)[:, :-1]
-
-    for i in range(quarter):
-        m = get_rotate_x_matrix(-i*step_angle)
-        m[1, 3] = -y_radius + i * step_offset
-
-        path[i+quarter, :, :] = ((np.matmul(m, scx.T)).T)[:, :-1]
-
-    for i in range(quarter):
-        m = get_rotate_x_matrix(i*step_angle-swing_angle)
-        m[1, 3] = i * step_offset
-
-        path[i+quarter*2, :, :] = ((np.matmul(m, scx.T)).T)[:, :-1]
-
-    for i in range(quarter):
-        m = get_rotate_x_matrix(i*step_angle)
-        m[1, 3] = y_radius-i * step_offset
-
-        path[i+quarter*3, :, :] = ((np.matmul(m, scx.T)).T)[:, :-1]
-
-    return {'coord': path,
-            'type': 'motion'}
+    return gen_body_pose_path(standby_coordinate,
+                              rotations=(('x', angle),),
+                              translation=shift)
 
 
 def gen_rotatey_path(standby_coordinate,
@@ -189,39 +167,23 @@ def gen_rotatey_path(standby_coordinate,
     assert (g_steps % 4) == 0
     quarter = int(g_steps/4)
 
-    path = np.zeros((g_steps, 6, 3))
-
     step_angle = swing_angle / quarter
     step_offset = x_radius / quarter
 
-    scx = np.append(standby_coordinate, np.ones((6, 1)), axis=1)
-
-    for i in range(quarter):
-        m = get_rotate_y_matrix(swing_angle - i*step_angle)
-        m[1, 3] = -i * step_offset
-
-        path[i, :, :] = ((np.matmul(m, scx.T)).T)[:, :-1]
+    i = np.arange(quarter)
+    angle = np.concatenate((swing_angle - i*step_angle,
+                            -i*step_angle,
+                            i*step_angle-swing_angle,
+                            i*step_angle))
+    shift = np.zeros((g_steps, 3))
+    shift[:, 1] = np.concatenate((-i * step_offset,
+                                  -x_radius + i * step_offset,
+                                  i * step_offset,
+                                  x_radius-i * step_offset))
 
-    for i in range(quarter):
-        m = get_rotate_y_matrix(-i*step_angle)
-        m[1, 3] = -x_radius + i * step_offset
-
-        path[i+quarter, :, :] = ((np.matmul(m, scx.T)).T)[:, :-1]
-
-    for i in range(quarter):
-        m = get_rotate_y_matrix(i*step_angle-swing_angle)
-        m[1, 3] = i * step_offset
-
-        path[i+quarter*2, :, :] = ((np.matmul(m, scx.T)).T)[:, :-1]
-
-    for i in range(quarter):
-        m = get_rotate_y_matrix(i*step_angle)
-        m[1, 3] = x_radius-i * step_offset
-
-        path[i+quarter*3, :, :] = ((np.matmul(m, scx.T)).T)[:, :-1]
-
-    return {'coord': path,
-            'type': 'motion'}
+    return gen_body_pose_path(standby_coordinate,
+                              rotations=(('y', angle),),
+                              translation=shift)
 
 
 def gen_rotatez_path(standby_coordinate,
@@ -230,22 +192,16 @@ def gen_rotatez_path(standby_coordinate,
                      xy_radius=1):
     assert (g_steps % 4) == 0
 
-    path = np.zeros((g_steps, 6, 3))
-
     step_angle = 2*np.pi / g_steps
-    scx = np.append(standby_coordinate, np.ones((6, 1)), axis=1)
-
-    for i in range(g_steps):
-        x = xy_radius * np.cos(i*step_angle)
-        y = xy_radius * np.sin(i*step_angle)
 
-        m = get_rotate_y_matrix(np.arctan2(x, z_lift)*180/np.pi) * \
-            get_rotate_x_matrix(np.arctan2(y, z_lift)*180/np.pi)
+    i = np.arange(g_steps)
+    x = xy_radius * np.cos(i*step_angle)
+    y = xy_radius * np.sin(i*step_angle)
 
-        path[i, :, :] = ((np.matmul(m, scx.T)).T)[:, :-1]
-
-    return {'coord': path,
-            'type': 'motion'}
+    return gen_body_pose_path(
+        standby_coordinate,
+        rotations=(('y', np.arctan2(x, z_lift)*180/np.pi),
+                   ('x', np.arctan2(y, z_lift)*180/np.pi)))
 
 
 def gen_twist_path(standby_coordinate,
@@ -258,35 +214,18 @@ def gen_twist_path(standby_coordinate,
     quarter = int(g_steps / 4)
     step_x_angle = twist_x_angle / quarter
     step_y_angle = twise_y_angle / quarter
-    scx = np.append(standby_coordinate, np.ones((6, 1)), axis=1)
 
-    m = get_rotate_x_matrix(raise_angle)
-
-    path = np.zeros((g_steps, 6, 3))
-
-    for i in range(quarter):
-        temp = m * get_rotate_z_matrix(i*step_x_angle) * \
-            get_rotate_x_matrix(i*step_y_angle)
-
-        path[i, :, :] = ((np.matmul(temp, scx.T)).T)[:, :-1]
-
-    for i in range(quarter):
-        temp = m * get_rotate_z_matrix((quarter-i)*step_x_angle) * \
-            get_rotate_x_matrix((quarter-i)*step_y_angle)
-
-        path[i+quarter*1, :, :] = ((np.matmul(temp, scx.T)).T)[:, :-1]
-
-    for i in range(quarter):
-        temp = m * get_rotate_z_matrix(-i*step_x_angle) * \
-            get_rotate_x_matrix(i*step_y_angle)
-
-        path[i+quarter*2, :, :] = ((np.matmul(temp, scx.T)).T)[:, :-1]
-
-    for i in range(quarter):
-        temp = m * get_rotate_z_matrix((-quarter+i)*step_x_angle) * \
-            get_rotate_x_matrix((quarter-i)*step_y_angle)
-
-        path[i+quarter*3, :, :] = ((np.matmul(temp, scx.T)).T)[:, :-1]
-
-    return {'coord': path,
-            'type': 'motion'}
+    i = np.arange(quarter)
+    z_angle = np.concatenate((i*step_x_angle,
+                              (quarter-i)*step_x_angle,
+                              -i*step_x_angle,
+                              (-quarter+i)*step_x_angle))
+    x_angle = np.concatenate((i*step_y_angle,
+                              (quarter-i)*step_y_angle,
+                              i*step_y_angle,
+                              (quarter-i)*step_y_angle))
+
+    return gen_body_pose_path(standby_coordinate,
+                              rotations=(('x', raise_angle),
+                                         ('z', z_angle),
+                                         ('x', x_angle)))
@@ -0,0 +1,127 @@
+#!python
+#
+# 2021  Zhengyu Peng
+# Website: https://zpeng.me
+#
+# `                      `
+# -:.                  -#:
+# -//:.              -###:
+# -////:.          -#####:
+# -/:.://:.      -###++##:
+# ..   `://:-  -###+. :##:
+#        `:/+####+.   :##:
+# .::::::::/+###.     :##:
+# .////-----+##:    `:###:
+#  `-//:.   :##:  `:###/.
+#    `-//:. :##:`:###/.
+#      `-//:+######/.
+#        `-/+####/.
+#          `+##+.
+#           :##:
+#           :##:
+#           :##:
+#           :##:
+#           :##:
+#            .+:
+
+import math
+
+import numpy as np
+
+# roll, pitch, yaw in degree, x, y, z body shift in mm
+AXES = ('roll', 'pitch', 'yaw', 'x', 'y', 'z')
+# axis: (min, max) a target is clamped to
+LIMITS = {'roll': (-20, 20), 'pitch': (-20, 20), 'yaw': (-20, 20),
+          'x': (-40, 40), 'y': (-40, 40), 'z': (-30, 30)}
+
+
+# rotate_z(yaw) @ rotate_y(roll) @ rotate_x(pitch) of transforms.py, 3x3
+# and from scalars, it is rebuilt every frame while the pose moves
+def rotation(roll, pitch, yaw):
+    roll, pitch, yaw = np.radians([roll, pitch, yaw])
+    cr, sr = math.cos(roll), math.sin(roll)
+    cp, sp = math.cos(pitch), math.sin(pitch)
+    cy, sy = math.cos(yaw), math.sin(yaw)
+    return np.array([
+        [cy*cr, cy*sr*sp - sy*cp, cy*sr*cp + sy*sp],
+        [sy*cr, sy*sr*sp + cy*cp, sy*sr*cp - cy*sp],
+        [-sr, cr*sp, cr*cp]])
+
+
+class BodyPose:
+    # Body pose applied to the foot positions of every frame
+    #
+    # Roll is about the front (y) axis, right side down is positive, pitch
+    # about the right (x) axis, nose up is positive, yaw about z, to the
+    # left is positive; z raises the body. set() only moves the target,
+    # update() moves the pose toward it on a straight line, no axis faster
+    # than angle_rate (deg/s) / shift_rate (mm/s), so all arrive together.
+    # Targets are clamped to limits, axis: (min, max) over LIMITS. The
+    # transform is only rebuilt while the pose changes
+    def __init__(self, angle_rate=60.0, shift_rate=50.0, max_step=0.05,
+                 limits=None):
+        self.rates = np.array([angle_rate]*3 + [shift_rate]*3, dtype=float)
+        self.max_step = max_step
+        limits = dict(LIMITS, **(limits or {}))
+        self.lower = np.array([limits[key][0] for key in AXES], dtype=float)
+        self.upper = np.array([limits[key][1] for key in AXES], dtype=float)
+        self.current = np.zeros(6)
+        self.target = np.zeros(6)
+        self.last = None
+        # cheap checks for every frame
+        self.active = False
+        self.moving = False
+        self.rotation = np.eye(3)
+        self.shift = np.zeros(3)
+
+    def set(self, **values):
+        target = self.target.copy()
+        for key, value in values.items():
+            if key not in AXES:
+                raise KeyError(key)
+            value = float(value)
+            if not math.isfinite(value):
+                raise ValueError('{}={} is not finite'.format(key, value))
+            target[AXES.index(key)] = value
+        self.move_to(np.clip(target, self.lower, self.upper))
+
+    def reset(self):
+        self.move_to(np.zeros(6))
+
+    def move_to(self, target):
+        if not self.moving:
+            # at rest, the time since the last update does not count
+            self.last = None
+        self.target = target
+        self.moving = bool(np.any(target != self.current))
+        self.active = self.moving or bool(np.any(self.current))
+
+    def update(self, now):
+        # -> True while the pose is moving
+        if not self.moving:
+            return False
+        dt = 0.0 if self.last is None else min(max(now - self.last, 0.0),
+                                               self.max_step)
+        self.last = now
+
+        delta = self.target - self.current
+        needed = np.max(np.abs(delta)/self.rates)
+        if needed <= dt:
+            self.current = self.target.copy()
+            self.moving = False
+            self.active = bool(np.any(self.current))
+        else:
+            self.current = self.current + delta*(dt/needed)
+
+        self.rotation = rotation(*self.current[:3])
+        self.shift = self.current[3:].copy()
+        return True
+
+    def apply(self, feet):
+        # body coordinates (..., 6, 3) of the feet -> in the posed body,
+        # R^T (p - t) for every point
+        return np.matmul(np.asarray(feet) - self.shift, self.rotation)
+
+    def state(self):
+        return {key: round(float(value), 2)
+                for key, value in zip(AXES, self.current)}
@@ -0,0 +1,152 @@
+#!python
+#
+# 2021  Zhengyu Peng
+# Website: https://zpeng.me
+#
+# `                      `
+# -:.                  -#:
+# -//:.              -###:
+# -////:.          -#####:
+# -/:.://:.      -###++##:
+# ..   `://:-  -###+. :##:
+#        `:/+####+.   :##:
+# .::::::::/+###.     :##:
+# .////-----+##:    `:###:
+#  `-//:.   :##:  `:###/.
+#    `-//:. :##:`:###/.
+#      `-//:+######/.
+#        `-/+####/.
+#          `+##+.
+#           :##:
+#           :##:
+#           :##:
+#           :##:
+#           :##:
+#            .+:
+
+
+# Real-time scheduling for the frame loop, every step falls back quietly
+# when not permitted (not root, no CAP_SYS_NICE, low RLIMIT_MEMLOCK)
+
+import ctypes
+import ctypes.util
+import gc
+import os
+
+import numpy as np
+
+MCL_CURRENT = 1
+MCL_FUTURE = 2
+
+
+def set_scheduling(priority=50, nice=-10):
+    # SCHED_FIFO for the calling thread, else a raised nice level
+    try:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority))
+        return 'SCHED_FIFO {}'.format(priority)
+    except (AttributeError, OSError):
+        pass
+    try:
+        os.setpriority(os.PRIO_PROCESS, 0, nice)
+        return 'nice {}'.format(nice)
+    except (AttributeError, OSError):
+        pass
+    return 'default'
+
+
+def lock_memory():
+    # keep all pages resident, a page fault in the loop is a stall
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        if libc.mlockall(MCL_CURRENT | MCL_FUTURE) == 0:
+            return True
+    except (AttributeError, OSError):
+        pass
+    return False
+
+
+class GCScheduler:
+    # Automatic collection is disabled for the whole process, so the
+    # garbage of every thread (servers, config reload, recorder) is
+    # collected from the frame loop: the youngest generation in the slack
+    # before a frame and after every step, the middle one between motions
+    # and a full collection only while idle, at most every full_interval
+    # seconds. step() runs at least every frame interval while idle, so
+    # no thread's garbage waits long
+    def __init__(self, budget=0.002, full_interval=60.0):
+        self.budget = budget
+        self.threshold = gc.get_threshold()[0]
+        self.full_interval = full_interval
+        self.last_full = None
+        # objects created at startup never need to be scanned again,
+        # disable() applies to every thread, see above
+        gc.freeze()
+        gc.disable()
+
+    def idle(self, slack):
+        count = gc.get_count()[0]
+        if (slack > self.budget and count > self.threshold) or \
+                count > 10*self.threshold:
+            gc.collect(0)
+
+    def between_motions(self):
+        # also after untimed motions, which never call idle()
+        count = gc.get_count()
+        if count[1] > gc.get_threshold()[1]:
+            gc.collect(1)
+        elif count[0] > self.threshold:
+            gc.collect(0)
+
+    def between_commands(self, now):
+        # idle in a posture, the oldest generation may take a while
+        if self.last_full is None:
+            self.last_full = now
+        elif now - self.last_full >= self.full_interval and \
+                gc.get_count()[2] > 0:
+            gc.collect()
+            self.last_full = now
+
+
+class JitterMonitor:
+    # Frame periods in a fixed ring, pauses longer than gap are skipped
+    def __init__(self, size=4096, gap=0.5, interval=30.0):
+        self.periods = np.zeros(size)
+        self.count = 0
+        self.last = None
+        self.gap = gap
+        self.interval = interval
+        self.next_report = None
+
+    def frame(self, now):
+        if self.last is not None and now - self.last < self.gap:
+            self.periods[self.count % len(self.periods)] = now - self.last
+            self.count += 1
+        self.last = now
+        if self.next_report is None:
+            self.next_report = now + self.interval
+
+    def due(self, now):
+        return self.next_report is not None and now >= self.next_report
+
+    def report(self, now=None):
+        if now is not None:
+            self.next_report = now + self.interval
+        periods = self.periods[:min(self.count, len(self.periods))]
+        if len(periods) == 0:
+            return {'frames': 0}
+        p50, p99 = np.percentile(periods, [50, 99])
+        return {'frames': self.count,
+                'p50_ms': round(float(p50)*1000, 3),
+                'p99_ms': round(float(p99)*1000, 3),
+                'max_ms': round(float(np.max(periods))*1000, 3),
+                'jitter_ms': round(float(p99 - p50)*1000, 3)}
+
+
+def enable_realtime(priority=50, nice=-10, lock=True, gc_budget=0.002):
+    # call from the thread running the frame loop, scheduling applies to
+    # that thread, the manual gc to the whole process
+    report = {'scheduling': set_scheduling(priority, nice),
+              'mlockall': lock_memory() if lock else False}
+    scheduler = GCScheduler(gc_budget)
+    report['gc'] = 'manual'
+    return report, scheduler
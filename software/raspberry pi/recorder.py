@@ -0,0 +1,160 @@
+#!python
+#
+# 2021  Zhengyu Peng
+# Website: https://zpeng.me
+#
+# `                      `
+# -:.                  -#:
+# -//:.              -###:
+# -////:.          -#####:
+# -/:.://:.      -###++##:
+# ..   `://:-  -###+. :##:
+#        `:/+####+.   :##:
+# .::::::::/+###.     :##:
+# .////-----+##:    `:###:
+#  `-//:.   :##:  `:###/.
+#    `-//:. :##:`:###/.
+#      `-//:+######/.
+#        `-/+####/.
+#          `+##+.
+#           :##:
+#           :##:
+#           :##:
+#           :##:
+#           :##:
+#            .+:
+
+
+# Flight recorder, every command and every frame sent to the servos as a
+# fixed size record in a preallocated memory mapped ring buffer
+#
+# Read a log with read_log(filename), replay its commands in the simulator
+# with commands_from_log(records)
+
+import os
+
+import numpy as np
+
+MAGIC = b'HEXLOG01'
+HEADER_DTYPE = np.dtype([('magic', 'S8'),
+                         ('capacity', '<u8'),
+                         ('count', '<u8')])
+RECORD_DTYPE = np.dtype([('time', '<f8'),
+                         ('kind', 'u1'),
+                         ('motion', '<u4'),
+                         ('angles', '<f4', (6, 3)),
+                         ('command', 'S64')], align=True)
+HEADER_SIZE = 64
+
+KIND_FRAME = 0
+KIND_COMMAND = 1
+
+
+class FlightRecorder:
+    # All storage is allocated up front, recording a frame only writes into
+    # the mapped file, the oldest records are overwritten once it is full.
+    # The log of the previous run is kept as filename.1
+    def __init__(self, filename, capacity=65536, clock=None):
+        rotate_log(filename)
+        size = HEADER_SIZE + capacity*RECORD_DTYPE.itemsize
+        with open(filename, 'wb') as write_file:
+            write_file.truncate(size)
+
+        self.header = np.memmap(filename, dtype=HEADER_DTYPE, mode='r+',
+                                shape=(1,))
+        self.header['magic'] = MAGIC
+        self.header['capacity'] = capacity
+        self.header['count'] = 0
+        self.records = np.memmap(filename, dtype=RECORD_DTYPE, mode='r+',
+                                 offset=HEADER_SIZE, shape=(capacity,))
+
+        # field views, created once
+        self.r_time = self.records['time']
+        self.r_kind = self.records['kind']
+        self.r_motion = self.records['motion']
+        self.r_angles = self.records['angles']
+        self.r_command = self.records['command']
+        self.r_count = self.header['count']
+
+        self.capacity = capacity
+        self.count = 0
+        self.motion = 0
+        self.clock = clock
+
+    def append(self, kind, angles=None, command=None):
+        idx = self.count % self.capacity
+        self.r_time[idx] = self.clock.monotonic()
+        self.r_kind[idx] = kind
+        self.r_motion[idx] = self.motion
+        if angles is not None:
+            self.r_angles[idx] = angles
+        if command is not None:
+            self.r_command[idx] = command
+        self.count += 1
+        self.r_count[0] = self.count
+
+    def record_command(self, cmd_string):
+        # every command starts a new motion id
+        self.motion += 1
+        self.append(KIND_COMMAND, command=cmd_string.encode()[:64])
+
+    def record_frame(self, angles):
+        self.append(KIND_FRAME, angles=angles)
+
+    def flush(self):
+        self.records.flush()
+        self.header.flush()
+
+    def close(self):
+        self.flush()
+        del self.r_time, self.r_kind, self.r_motion, self.r_angles
+        del self.r_command, self.r_count
+        del self.records, self.header
+
+
+def is_log(filename):
+    try:
+        with open(filename, 'rb') as read_file:
+            return read_file.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def rotate_log(filename):
+    # keeps a log with records, e.g. of a crash, for one more start
+    try:
+        header = np.fromfile(filename, dtype=HEADER_DTYPE, count=1)
+        if len(header) and header[0]['magic'] == MAGIC and \
+                header[0]['count'] > 0:
+            os.replace(filename, filename + '.1')
+    except FileNotFoundError:
+        pass
+    except OSError as err:
+        print('log not rotated: {}'.format(err))
+
+
+def read_log(filename):
+    # -> structured array of RECORD_DTYPE in recording order, a view of the
+    # file unless the ring buffer has wrapped around
+    header = np.fromfile(filename, dtype=HEADER_DTYPE, count=1)[0]
+    if header['magic'] != MAGIC:
+        raise ValueError('not a flight recorder log: {}'.format(filename))
+
+    capacity = int(header['capacity'])
+    count = int(header['count'])
+    records = np.memmap(filename, dtype=RECORD_DTYPE, mode='r',
+                        offset=HEADER_SIZE, shape=(capacity,))
+    if count <= capacity:
+        return records[:count]
+    start = count % capacity
+    return np.concatenate([records[start:], records[:start]])
+
+
+def commands_from_log(records):
+    # -> [(seconds, command)] relative to the first record, for the simulator
+    if len(records) == 0:
+        return []
+    start = records['time'][0]
+    commands = records[records['kind'] == KIND_COMMAND]
+    return [(float(t - start), c.decode())
+            for t, c in zip(commands['time'], commands['command'])]
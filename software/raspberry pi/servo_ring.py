@@ -0,0 +1,221 @@
+#!python
+#
+# 2021  Zhengyu Peng
+# Website: https://zpeng.me
+#
+# `                      `
+# -:.                  -#:
+# -//:.              -###:
+# -////:.          -#####:
+# -/:.://:.      -###++##:
+# ..   `://:-  -###+. :##:
+#        `:/+####+.   :##:
+# .::::::::/+###.     :##:
+# .////-----+##:    `:###:
+#  `-//:.   :##:  `:###/.
+#    `-//:. :##:`:###/.
+#      `-//:+######/.
+#        `-/+####/.
+#          `+##+.
+#           :##:
+#           :##:
+#           :##:
+#           :##:
+#           :##:
+#            .+:
+
+
+# Servo output in its own process
+#
+# The control process writes servo angles into a RingServoKit, every frame
+# is published into a shared memory ring. The output process waits for
+# each frame's due time and writes the changed channels to the PCA9685
+# boards, so socket handling and gait generation in the control process
+# no longer delay servo frames.
+
+import multiprocessing
+import time
+
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from realtime import enable_realtime, JitterMonitor
+
+try:
+    from adafruit_servokit import ServoKit
+except ImportError:
+    ServoKit = None
+
+BOARDS = (0x40, 0x41)
+CHANNELS = 16*len(BOARDS)
+RECORD_DTYPE = np.dtype([('due', '<f8'),
+                         ('angles', '<f8', (CHANNELS,))])
+# frames, late frames, max lateness in us
+STATS_SIZE = 3*8
+
+
+class ServoProcessError(RuntimeError):
+    pass
+
+
+class FrameRing:
+    # Single producer, single consumer ring of servo frames in shared
+    # memory, two semaphores count filled and free slots, a full ring
+    # blocks the producer until the consumer takes a frame, or raises
+    # ServoProcessError once the consumer process has exited
+    def __init__(self, capacity=8, context=None, timeout=1.0):
+        context = context or multiprocessing.get_context('spawn')
+        self.capacity = capacity
+        self.timeout = timeout
+        # consumer process, set by start_servo_process()
+        self.process = None
+        self.shm = shared_memory.SharedMemory(
+            create=True, size=STATS_SIZE + capacity*RECORD_DTYPE.itemsize)
+        self.filled = context.Semaphore(0)
+        self.free = context.Semaphore(capacity)
+        self.attach()
+
+        self.stats[:] = 0
+        self.staging[:] = np.nan
+
+    def attach(self):
+        self.stats = np.ndarray((3,), dtype=np.int64, buffer=self.shm.buf)
+        records = np.ndarray((self.capacity,), dtype=RECORD_DTYPE,
+                             buffer=self.shm.buf, offset=STATS_SIZE)
+        self.r_due = records['due']
+        self.r_angles = records['angles']
+        # latest angle of every channel, nan until first written
+        self.staging = np.full(CHANNELS, np.nan)
+        self.index = 0
+
+    def __getstate__(self):
+        return {'name': self.shm.name, 'capacity': self.capacity,
+                'filled': self.filled, 'free': self.free}
+
+    def __setstate__(self, state):
+        self.capacity = state['capacity']
+        self.timeout = None
+        self.process = None
+        self.filled = state['filled']
+        self.free = state['free']
+        self.shm = shared_memory.SharedMemory(name=state['name'])
+        self.attach()
+
+    def publish(self, due=0.0):
+        # push the staged angles, to be written at due (time.monotonic),
+        # 0 writes as soon as possible
+        while not self.free.acquire(timeout=self.timeout):
+            if self.process is not None and not self.process.is_alive():
+                raise ServoProcessError(
+                    'servo output process exited with code {} ({})'.format(
+                        self.process.exitcode, self.output_stats()))
+            print('servo output stalled, {} frames queued ({})'.format(
+                self.capacity, self.output_stats()))
+        slot = self.index % self.capacity
+        self.r_due[slot] = due
+        self.r_angles[slot] = self.staging
+        self.index += 1
+        self.filled.release()
+
+    def output_stats(self):
+        # written by the output process
+        frames, late, max_late_us = (int(value) for value in self.stats)
+        return {'frames': frames, 'late': late, 'max_late_us': max_late_us}
+
+    def get(self, angles, timeout=None):
+        # pop the next frame into angles, returns its due time or None
+        if not self.filled.acquire(timeout=timeout):
+            return None
+        slot = self.index % self.capacity
+        due = float(self.r_due[slot])
+        angles[:] = self.r_angles[slot]
+        self.index += 1
+        self.free.release()
+        return due
+
+    def close(self, unlink=False):
+        del self.stats, self.r_due, self.r_angles
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+class RingServo:
+    def __init__(self, staging, channel):
+        self.staging = staging
+        self.channel = channel
+
+    @property
+    def angle(self):
+        angle = self.staging[self.channel]
+        return None if np.isnan(angle) else float(angle)
+
+    @angle.setter
+    def angle(self, value):
+        self.staging[self.channel] = value
+
+
+class RingServoKit:
+    # ServoKit stand-in for the control process, partial(RingServoKit, ring)
+    def __init__(self, ring, channels=16, address=0x40, frequency=50):
+        board = BOARDS.index(address)
+        self.servo = [RingServo(ring.staging, board*16 + channel)
+                      for channel in range(channels)]
+
+
+def servo_output(ring, servo_kit=None, late_after=0.002, realtime=None):
+    # output process main loop, realtime: SCHED_FIFO priority or None
+    gc_scheduler = None
+    jitter = None
+    if realtime is not None:
+        report, gc_scheduler = enable_realtime(realtime)
+        jitter = JitterMonitor()
+        print('servo output real-time mode: {}'.format(report))
+
+    servo_kit = servo_kit or ServoKit
+    if servo_kit is None:
+        raise RuntimeError('adafruit_servokit is not installed')
+    kits = [servo_kit(channels=16, address=address, frequency=50)
+            for address in BOARDS]
+    servos = [servo for kit in kits for servo in kit.servo[:16]]
+
+    angles = np.empty(CHANNELS)
+    written = np.full(CHANNELS, np.nan)
+    while True:
+        due = ring.get(angles, timeout=1.0)
+        if due is None:
+            continue
+
+        if due > 0:
+            delay = due - time.monotonic()
+            if gc_scheduler is not None:
+                gc_scheduler.idle(delay)
+                delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            elif -delay > late_after:
+                ring.stats[1] += 1
+                ring.stats[2] = max(ring.stats[2], int(-delay*1e6))
+
+        # unchanged channels are not written again
+        changed = np.nonzero(np.isfinite(angles) & (angles != written))[0]
+        for channel in changed:
+            servos[channel].angle = angles[channel]
+        written[changed] = angles[changed]
+        ring.stats[0] += 1
+
+        if jitter is not None:
+            now = time.monotonic()
+            jitter.frame(now)
+            if jitter.due(now):
+                print('servo output jitter: {}'.format(jitter.report(now)))
+
+
+def start_servo_process(ring, servo_kit=None, realtime=None):
+    process = multiprocessing.get_context('spawn').Process(
+        target=servo_output, args=(ring, servo_kit, 0.002, realtime),
+        name='servo_output', daemon=True)
+    process.start()
+    ring.process = process
+    return process
@@ -0,0 +1,236 @@
+#!python
+#
+# 2021  Zhengyu Peng
+# Website: https://zpeng.me
+#
+# `                      `
+# -:.                  -#:
+# -//:.              -###:
+# -////:.          -#####:
+# -/:.://:.      -###++##:
+# ..   `://:-  -###+. :##:
+#        `:/+####+.   :##:
+# .::::::::/+###.     :##:
+# .////-----+##:    `:###:
+#  `-//:.   :##:  `:###/.
+#    `-//:. :##:`:###/.
+#      `-//:+######/.
+#        `-/+####/.
+#          `+##+.
+#           :##:
+#           :##:
+#           :##:
+#           :##:
+#           :##:
+#            .+:
+
+
+# Headless simulator, runs Hexapod on fake servos and a virtual clock
+#
+# python3 simulator.py commands.txt --out sim.npz
+#
+# commands.txt has one '<seconds> <command>' per line, e.g. '2.5 walk0:',
+# or is a flight recorder log
+
+import argparse
+import json
+import time
+
+from queue import Empty
+
+import numpy as np
+
+from hexapod import Hexapod, CONFIG_FILE
+from recorder import is_log, read_log, commands_from_log
+
+
+class VirtualClock:
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += max(seconds, 0)
+
+
+class FakeServo:
+    def __init__(self):
+        self.angle = None
+
+
+class FakeServoKit:
+    def __init__(self, channels=16, address=0x40, frequency=50, **kwargs):
+        self.servo = [FakeServo() for _ in range(channels)]
+
+
+class ReplayQueue:
+    # Stands in for the command queue, releases every recorded command once
+    # the virtual clock reaches its time
+    def __init__(self, clock, commands=()):
+        self.clock = clock
+        self.commands = sorted(commands, key=lambda command: command[0])
+        self.next = 0
+
+    def shift(self, seconds):
+        # recorded times are relative to the end of the robot's startup
+        self.commands = [(cmd_time + seconds, cmd_string)
+                         for cmd_time, cmd_string in self.commands]
+
+    def put(self, cmd_string):
+        self.commands.insert(self.next, (self.clock.now, cmd_string))
+
+    def get(self, block=True, timeout=None):
+        if self.next < len(self.commands):
+            cmd_time, cmd_string = self.commands[self.next]
+            if block and cmd_time > self.clock.now:
+                self.clock.sleep(cmd_time - self.clock.now)
+            if cmd_time <= self.clock.now:
+                self.next += 1
+                return cmd_string
+        raise Empty
+
+    def task_done(self):
+        pass
+
+    def pending(self):
+        return len(self.commands) - self.next
+
+    def next_time(self):
+        if self.next < len(self.commands):
+            return self.commands[self.next][0]
+        return None
+
+
+class SimulatedHexapod(Hexapod):
+    # Records every frame sent to the servos
+    #
+    # Frames the gait does not time itself take frame_time, as servo
+    # updates do on the robot
+    def __init__(self, cmd_queue, config_file, clock, frame_time):
+        self.frame_time = frame_time
+        self.last_frame = None
+        self.command = 'standby'
+        self.command_names = []
+        self.command_ids = {}
+        self.times = []
+        self.servo_angles = []
+        self.leg_angles = []
+        self.commands = []
+        Hexapod.__init__(self, cmd_queue, config_file, FakeServoKit, clock)
+
+    def cmd_handler(self, cmd_string):
+        self.command = cmd_string.split(':')[-2]
+        Hexapod.cmd_handler(self, cmd_string)
+
+    def move_legs(self, angles, played=True):
+        if self.last_frame == self.clock.monotonic():
+            self.clock.sleep(self.frame_time)
+        Hexapod.move_legs(self, angles, played)
+        self.last_frame = self.clock.monotonic()
+
+        servo = np.array([[np.nan if s.angle is None else s.angle
+                           for s in leg.junction_servos]
+                          for leg in self.legs])
+        correction = np.array([leg.correction for leg in self.legs])
+        if self.command not in self.command_ids:
+            self.command_ids[self.command] = len(self.command_names)
+            self.command_names.append(self.command)
+
+        self.times.append(self.last_frame)
+        self.servo_angles.append(servo)
+        self.leg_angles.append(servo - correction)
+        self.commands.append(self.command_ids[self.command])
+
+
+class Simulator:
+    def __init__(self, commands=(), config_file=CONFIG_FILE, frame_time=None):
+        self.clock = VirtualClock()
+        self.queue = ReplayQueue(self.clock, commands)
+        if frame_time is None:
+            with open(config_file, 'r') as read_file:
+                frame_time = json.load(read_file).get(
+                    'movementInterval', 5)/1000
+        self.hexapod = SimulatedHexapod(
+            self.queue, config_file, self.clock, frame_time)
+        # Hexapod.__init__ sleeps on the clock, the log starts after it
+        self.start = self.clock.now
+        self.queue.shift(self.start)
+
+    def run(self, duration=None, tail=1.0):
+        # replay all commands and run for duration (s) after startup, by
+        # default until tail (s) past the last command
+        end = None
+        if duration is not None:
+            end = self.start + duration
+        elif self.queue.commands:
+            end = self.queue.commands[-1][0] + tail
+        while self.queue.pending() or \
+                (end is not None and self.clock.now < end):
+            before = self.clock.now
+            self.hexapod.step()
+            if self.clock.now == before:
+                # nothing moved, e.g. calibration mode
+                next_time = self.queue.next_time()
+                if next_time is not None and next_time > before:
+                    self.clock.sleep(next_time - before)
+                else:
+                    self.clock.sleep(self.hexapod.frame_time)
+
+    def result(self):
+        hexapod = self.hexapod
+        leg_angles = np.array(hexapod.leg_angles)
+        return {'time': np.array(hexapod.times),
+                'servo_angles': np.array(hexapod.servo_angles),
+                'leg_angles': leg_angles,
+                'feet': hexapod.kinematics.forward_kinematics(leg_angles),
+                'command': np.array(hexapod.commands, dtype=np.int32),
+                'command_names': np.array(hexapod.command_names)}
+
+
+def load_commands(filename):
+    # '<seconds> <command>' per line -> [(seconds, command)]
+    if is_log(filename):
+        return commands_from_log(read_log(filename))
+
+    commands = []
+    with open(filename, 'r') as read_file:
+        for line in read_file:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            cmd_time, cmd_string = line.split(None, 1)
+            commands.append((float(cmd_time), cmd_string))
+    return commands
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='replay a command log on a simulated hexapod')
+    parser.add_argument('commands', help='command log')
+    parser.add_argument('--config', default=CONFIG_FILE,
+                        help='config file (default: %(default)s)')
+    parser.add_argument('--duration', type=float, default=None,
+                        help='simulated seconds (default: 1 s past the '
+                        'last command)')
+    parser.add_argument('--out', default=None,
+                        help='write the recorded trajectories as npz')
+    args = parser.parse_args()
+
+    simulator = Simulator(load_commands(args.commands), args.config)
+    start = time.perf_counter()
+    simulator.run(args.duration)
+    elapsed = time.perf_counter() - start
+
+    result = simulator.result()
+    simulated = simulator.clock.now - simulator.start
+    print('{} frames, {:.1f} s simulated in {:.2f} s ({:.0f}x)'.format(
+        len(result['time']), simulated, elapsed,
+        simulated/elapsed if elapsed > 0 else float('inf')))
+    if args.out:
+        np.savez(args.out, **result)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+#!python
+#
+# 2021  Zhengyu Peng
+# Website: https://zpeng.me
+#
+# `                      `
+# -:.                  -#:
+# -//:.              -###:
+# -////:.          -#####:
+# -/:.://:.      -###++##:
+# ..   `://:-  -###+. :##:
+#        `:/+####+.   :##:
+# .::::::::/+###.     :##:
+# .////-----+##:    `:###:
+#  `-//:.   :##:  `:###/.
+#    `-//:. :##:`:###/.
+#      `-//:+######/.
+#        `-/+####/.
+#          `+##+.
+#           :##:
+#           :##:
+#           :##:
+#           :##:
+#           :##:
+#            .+:
+
+import struct
+from collections import deque
+from threading import Condition
+
+import numpy as np
+
+# Streaming protocol, little endian, on the command socket
+#
+# client -> robot: HEADER, then count frames of 6x3 float32
+#   kind: FEET (body coordinates in mm) or ANGLES (joint angles in degree)
+#   flags: END on the last packet, plays out frames below the prefill
+#   interval_us: frame period, 0 for movementInterval
+# robot -> client: ACK after every packet
+#   free: frames the client may send ahead, frames beyond it are dropped
+# a packet of 0 frames only asks for an ACK
+MAGIC = b'HXS1'
+ACK_MAGIC = b'HXA1'
+HEADER = struct.Struct('<4sBBHII')
+ACK = struct.Struct('<4sIHHII')
+FRAME_SIZE = 6*3*4
+
+FEET = 0
+ANGLES = 1
+
+END = 1
+
+
+def pack_packet(frames, kind=FEET, seq=0, interval_us=0, end=False):
+    frames = np.ascontiguousarray(frames, dtype='<f4').reshape(-1, 6, 3)
+    return HEADER.pack(MAGIC, kind, END if end else 0, len(frames), seq,
+                       interval_us) + frames.tobytes()
+
+
+def unpack_ack(data):
+    # -> seq, free, capacity, dropped, underruns
+    magic, *fields = ACK.unpack(data)
+    if magic != ACK_MAGIC:
+        raise ValueError('not a stream ack: {!r}'.format(magic))
+    return tuple(fields)
+
+
+class StreamDecoder:
+    # Splits received bytes into text commands and stream packets
+    #
+    # feed() returns [('text', str) or ('packet', (kind, flags, seq,
+    # interval_us, frames float[N][6][3]))], incomplete commands and
+    # packets wait for the next call
+    def __init__(self):
+        self.buffer = b''
+
+    def feed(self, data):
+        self.buffer += data
+        items = []
+        while self.buffer:
+            start = self.buffer.find(MAGIC)
+            if start != 0:
+                if start < 0:
+                    # text commands end with ':', the rest may continue
+                    # in the next call
+                    start = self.buffer.rfind(b':') + 1
+                    if start == 0:
+                        break
+                text = self.buffer[:start]
+                self.buffer = self.buffer[start:]
+                items.append(('text', text.decode(errors='replace')))
+                continue
+
+            if len(self.buffer) < HEADER.size:
+                break
+            _, kind, flags, count, seq, interval_us = HEADER.unpack_from(
+                self.buffer)
+            size = HEADER.size + count*FRAME_SIZE
+            if len(self.buffer) < size:
+                break
+            frames = np.frombuffer(
+                self.buffer, '<f4', count*18, HEADER.size).reshape(
+                    count, 6, 3).astype(np.float64)
+            self.buffer = self.buffer[size:]
+            items.append(('packet', (kind, flags, seq, interval_us, frames)))
+        return items
+
+
+class FrameStream:
+    # Bounded jitter buffer between the socket and the frame loop
+    #
+    # Playback starts once prefill frames are buffered (or the stream
+    # ended), a buffer running dry is an underrun and fills up again
+    # before the next frame. Frames beyond capacity are dropped, the
+    # client is told the free space with every ack instead
+    def __init__(self, capacity=64, prefill=8):
+        self.capacity = capacity
+        self.prefill = min(prefill, capacity)
+        self.frames = deque()
+        self.condition = Condition()
+        self.active = False
+        self.playing = False
+        self.ended = False
+
+        self.received = 0
+        self.dropped = 0
+        self.underruns = 0
+
+    def put(self, kind, frames, interval=0.0, end=False):
+        # -> True if this packet starts a stream
+        with self.condition:
+            started = not self.active
+            self.active = True
+            self.ended = end
+            free = self.capacity - len(self.frames)
+            for frame in frames[:free]:
+                self.frames.append((kind, interval, frame))
+            self.received += len(frames)
+            self.dropped += max(len(frames) - free, 0)
+            self.condition.notify()
+            return started
+
+    def get(self, timeout=None):
+        # -> (kind, interval (s), frame float[6][3]), None while filling
+        with self.condition:
+            if not self.playing:
+                self.condition.wait_for(
+                    lambda: len(self.frames) >= self.prefill or
+                    (self.ended and self.frames), timeout)
+                if len(self.frames) < self.prefill and \
+                        not (self.ended and self.frames):
+                    return None
+                self.playing = True
+
+            if not self.frames:
+                self.playing = False
+                if not self.ended:
+                    self.underruns += 1
+                return None
+            return self.frames.popleft()
+
+    def stop(self):
+        # drops buffered frames, the next packet starts a new stream
+        with self.condition:
+            self.frames.clear()
+            self.active = False
+            self.playing = False
+            self.ended = False
+
+    def ack(self, seq):
+        with self.condition:
+            return ACK.pack(ACK_MAGIC, seq, self.capacity - len(self.frames),
+                            self.capacity, self.dropped, self.underruns)
+
+    def stats(self):
+        with self.condition:
+            return {'buffered': len(self.frames),
+                    'received': self.received,
+                    'dropped': self.dropped,
+                    'underruns': self.underruns}
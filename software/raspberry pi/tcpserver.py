@@ -29,7 +29,12 @@
 
 import socket
 from threading import Thread
-import json
+
+import numpy as np
+
+from config_service import load_config
+from stream import StreamDecoder, FEET, ANGLES, END
+from tracing import tracer
 
 
 class TCPServer(Thread):
@@ -42,13 +47,18 @@ class TCPServer(Thread):
     SIG_STOP = 1
     SIG_DISCONNECT = 2
 
-    def __init__(self, out_cmd_queue):
+    def __init__(self, out_cmd_queue, config=None, frame_stream=None):
+        # frame_stream: FrameStream played by the hexapod, None to ignore
+        # stream packets
         Thread.__init__(self)
 
         self.cmd_queue = out_cmd_queue
+        self.frame_stream = frame_stream
 
-        with open('/home/pi/hexapod/software/raspberry pi/config.json', 'r') as read_file:
-            self.config = json.load(read_file)
+        # shared with the other components by the config service
+        if config is None:
+            config = load_config()
+        self.config = config
 
         self.ip = '192.168.1.125'
         self.port = 1234
@@ -72,24 +82,31 @@ class TCPServer(Thread):
                 # print('wait for a connection')
                 # self.status.emit(self.LISTEN, '')
                 try:
-                    self.connection, addr = self.tcp_socket.accept()
+                    with tracer.span('accept', 'tcp'):
+                        self.connection, addr = self.tcp_socket.accept()
                     # self.connection.setblocking(False)
                     # self.connection.settimeout(1)
                     print('New connection')
                 except socket.timeout as t_out:
                     pass
                 else:
+                    decoder = StreamDecoder()
                     while True:
                         # print('waiting for data')
                         # if self.signal == self.SIG_NORMAL:
                         try:
-                            data = self.connection.recv(4096)
+                            with tracer.span('recv', 'tcp'):
+                                data = self.connection.recv(4096)
                         except socket.error as e:
                             print(e)
                             break
                         else:
                             if data:
-                                self.cmd_queue.put(data.decode())
+                                for kind, item in decoder.feed(data):
+                                    if kind == 'text':
+                                        self.cmd_queue.put(item)
+                                    else:
+                                        self.stream_packet(*item)
                             else:
                                 break
 
@@ -97,3 +114,31 @@ class TCPServer(Thread):
             self.tcp_socket.close()
             self.cmd_queue.put('standby:')
             print('exit')
+
+    def stream_interval(self, interval_us):
+        # seconds per frame, 0 plays at movementInterval, a client can't
+        # hold the frame loop longer than streamMaxInterval (ms)
+        if interval_us == 0:
+            return 0.0
+        return min(max(interval_us/1e6,
+                       self.config.get('movementInterval', 5)/1000),
+                   self.config.get('streamMaxInterval', 100)/1000)
+
+    def stream_packet(self, kind, flags, seq, interval_us, frames):
+        if self.frame_stream is None:
+            return
+        if kind not in (FEET, ANGLES):
+            print('unknown stream frames: {}'.format(kind))
+            return
+
+        if not np.all(np.isfinite(frames)):
+            # nan angles would hold the legs, nan feet too after the ik
+            print('stream frames not finite: {}'.format(seq))
+        elif len(frames) and self.frame_stream.put(
+                kind, frames, self.stream_interval(interval_us),
+                bool(flags & END)):
+            self.cmd_queue.put('stream:')
+        try:
+            self.connection.sendall(self.frame_stream.ack(seq))
+        except socket.error as e:
+            print(e)
@@ -0,0 +1,43 @@
+#!python
+#
+# 2021  Zhengyu Peng
+# Website: https://zpeng.me
+#
+# `                      `
+# -:.                  -#:
+# -//:.              -###:
+# -////:.          -#####:
+# -/:.://:.      -###++##:
+# ..   `://:-  -###+. :##:
+#        `:/+####+.   :##:
+# .::::::::/+###.     :##:
+# .////-----+##:    `:###:
+#  `-//:.   :##:  `:###/.
+#    `-//:. :##:`:###/.
+#      `-//:+######/.
+#        `-/+####/.
+#          `+##+.
+#           :##:
+#           :##:
+#           :##:
+#           :##:
+#           :##:
+#            .+:
+
+
+
+# python3 -m pytest test_dynamics.py
+
+import numpy as np
+
+from dynamics import check_rates
+
+
+def test_rate_report_names_the_worst_joint():
+    # one joint of one leg swings 10 degrees in one 5 ms frame
+    angles = np.full((8, 6, 3), 90.0)
+    angles[3, 4, 1] = 100.0
+    report = check_rates(angles, 0.005, [600]*3, [50000]*3)
+    assert report['worst_joint'] == (4, 1)
+    assert sorted(report['failed']) == [2, 3, 4]
+    assert report['failed'][3] == [(4, 1)]
@@ -0,0 +1,100 @@
+#!python
+#
+# 2021  Zhengyu Peng
+# Website: https://zpeng.me
+#
+# `                      `
+# -:.                  -#:
+# -//:.              -###:
+# -////:.          -#####:
+# -/:.://:.      -###++##:
+# ..   `://:-  -###+. :##:
+#        `:/+####+.   :##:
+# .::::::::/+###.     :##:
+# .////-----+##:    `:###:
+#  `-//:.   :##:  `:###/.
+#    `-//:. :##:`:###/.
+#      `-//:+######/.
+#        `-/+####/.
+#          `+##+.
+#           :##:
+#           :##:
+#           :##:
+#           :##:
+#           :##:
+#            .+:
+
+
+
+# python3 -m pytest test_hexapod.py, runs without adafruit_servokit
+
+import json
+import os
+
+import numpy as np
+
+from hexapod import Hexapod
+from simulator import Simulator
+
+CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                      'config.json')
+
+
+def test_reload_is_staged_until_applied():
+    hexapod = Simulator(config_file=CONFIG).hexapod
+    standby = hexapod.standby_posture
+    walk = hexapod.cmd_dict[Hexapod.CMD_WALK_0]
+    hexapod.config['legJoint3ToTip'] += 10
+    hexapod.reload({'legJoint3ToTip'})
+
+    # nothing changes on the running robot before step() applies it
+    assert set(hexapod.pending_reload) <= set(Hexapod.RELOAD_STATE)
+    assert hexapod.standby_posture is standby
+    assert hexapod.cmd_dict[Hexapod.CMD_WALK_0] is walk
+
+    hexapod.apply_reload()
+    assert hexapod.pending_reload is None
+    assert not np.allclose(hexapod.standby_posture['coord'],
+                           standby['coord'])
+    assert hexapod.cmd_dict[Hexapod.CMD_WALK_0] is not walk
+    assert hexapod.gait_registry.compiler == hexapod.prepare_gait
+
+
+def write_bundle(dirname, hexapod, angles):
+    # one shift gait, as exported by the path tool
+    standby = hexapod.standby_posture['coord']
+    coord = np.asarray(hexapod.cmd_dict[Hexapod.CMD_WALK_0]['coord'])
+    np.save(os.path.join(dirname, 'forward_offset.npy'), coord - standby)
+    np.save(os.path.join(dirname, 'forward_angles.npy'), angles(coord))
+    with open(os.path.join(dirname, 'manifest.json'), 'w') as write_file:
+        json.dump({'version': 1, 'gaits': {'forward': {
+            'mode': 'shift', 'steps': len(coord), 'dur': 20, 'entries': [0],
+            'files': {'offset': 'forward_offset.npy',
+                      'angles': 'forward_angles.npy'}}}}, write_file)
+
+
+def test_bundled_angles_are_played(tmp_path):
+    hexapod = Simulator(config_file=CONFIG).hexapod
+    write_bundle(str(tmp_path), hexapod,
+                 hexapod.kinematics.inverse_kinematics)
+    hexapod.config['gaitBundle'] = str(tmp_path)
+    hexapod.reload({'gaitBundle'})
+    hexapod.apply_reload()
+
+    walk = hexapod.cmd_dict[Hexapod.CMD_WALK_0]
+    assert walk['angles'] is walk['table_angles']
+
+
+def test_mismatched_bundled_angles_are_solved(tmp_path):
+    hexapod = Simulator(config_file=CONFIG).hexapod
+    write_bundle(str(tmp_path), hexapod,
+                 lambda coord: hexapod.kinematics.inverse_kinematics(
+                     coord) + 5)
+    hexapod.config['gaitBundle'] = str(tmp_path)
+    hexapod.reload({'gaitBundle'})
+    hexapod.apply_reload()
+
+    walk = hexapod.cmd_dict[Hexapod.CMD_WALK_0]
+    assert walk['angles'] is not walk['table_angles']
+    assert np.allclose(np.asarray(walk['angles']),
+                       np.asarray(walk['table_angles']) - 5, atol=0.01)
@@ -0,0 +1,84 @@
+#!python
+#
+# 2021  Zhengyu Peng
+# Website: https://zpeng.me
+#
+# `                      `
+# -:.                  -#:
+# -//:.              -###:
+# -////:.          -#####:
+# -/:.://:.      -###++##:
+# ..   `://:-  -###+. :##:
+#        `:/+####+.   :##:
+# .::::::::/+###.     :##:
+# .////-----+##:    `:###:
+#  `-//:.   :##:  `:###/.
+#    `-//:. :##:`:###/.
+#      `-//:+######/.
+#        `-/+####/.
+#          `+##+.
+#           :##:
+#           :##:
+#           :##:
+#           :##:
+#           :##:
+#            .+:
+
+
+import json
+import os
+import warnings
+
+import numpy as np
+
+from kinematics import Kinematics, IKCache
+
+CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                      'config.json')
+
+
+def make_cache(resolution=0.5, tolerance=0.5):
+    with open(CONFIG, 'r') as read_file:
+        kinematics = Kinematics(json.load(read_file))
+    return kinematics, IKCache(kinematics, 1 << 16, resolution, tolerance)
+
+
+def foot_positions(count, seed=0, spread=30):
+    # leg local positions around a standing foot
+    rng = np.random.default_rng(seed)
+    return np.array([110.0, 0.0, -70.0]) + \
+        rng.uniform(-spread, spread, (count, 6, 3))
+
+
+def test_hits_within_tolerance():
+    kinematics, cache = make_cache()
+    fill = foot_positions(2000, seed=1)
+    cache.lookup(fill)
+    # other points of the cached cells only hit
+    query = fill + np.random.default_rng(2).uniform(
+        -cache.resolution/2, cache.resolution/2, fill.shape)
+    hits = cache.hits
+    result = cache.lookup(query)
+    assert cache.hits > hits
+
+    exact = kinematics.solve_local(query)
+    error = np.abs(result - exact)
+    assert np.nanmax(error) <= cache.tolerance
+    assert cache.max_error <= cache.tolerance
+
+
+def test_non_finite_positions_are_not_cached():
+    kinematics, cache = make_cache()
+    points = foot_positions(1, spread=10)
+    points[0, 2] = np.nan
+    points[0, 4] = [np.inf, 0, 0]
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        result = cache.lookup(points)
+    assert np.all(np.isnan(result[0, 2]))
+    assert not np.all(np.isfinite(result[0, 4]))
+    finite = [0, 1, 3, 5]
+    assert np.allclose(result[0, finite],
+                       kinematics.solve_local(points[0, finite]),
+                       atol=cache.tolerance)
+    assert np.count_nonzero(cache.used) <= len(finite)
@@ -0,0 +1,65 @@
+#!python
+#
+# 2021  Zhengyu Peng
+# Website: https://zpeng.me
+#
+# `                      `
+# -:.                  -#:
+# -//:.              -###:
+# -////:.          -#####:
+# -/:.://:.      -###++##:
+# ..   `://:-  -###+. :##:
+#        `:/+####+.   :##:
+# .::::::::/+###.     :##:
+# .////-----+##:    `:###:
+#  `-//:.   :##:  `:###/.
+#    `-//:. :##:`:###/.
+#      `-//:+######/.
+#        `-/+####/.
+#          `+##+.
+#           :##:
+#           :##:
+#           :##:
+#           :##:
+#           :##:
+#            .+:
+
+
+# python3 -m pytest test_simulator.py, runs without adafruit_servokit
+
+import os
+
+import numpy as np
+
+from simulator import Simulator
+
+CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                      'config.json')
+
+
+def simulate(commands, duration=None):
+    simulator = Simulator(commands, CONFIG)
+    simulator.run(duration)
+    return simulator, simulator.result()
+
+
+def test_posture_frames_are_recorded():
+    # standby holds a posture, frames go through move_legs(played=False)
+    simulator, result = simulate([(0.0, 'standby:')], duration=0.5)
+    names = list(result['command_names'])
+    assert 'standby' in names
+    standby = result['command'] == names.index('standby')
+    assert np.count_nonzero(standby) > 0
+    assert np.all(np.isfinite(result['leg_angles'][standby]))
+
+
+
+def test_commands_keep_their_log_timing():
+    # the log starts after the robot's startup, not at clock 0
+    simulator, result = simulate([(0.0, 'walk0:'), (0.5, 'standby:')])
+    names = list(result['command_names'])
+    walk = result['time'][result['command'] == names.index('walk0')]
+    standby = result['time'][result['command'] == names.index('standby')]
+    assert walk[0] >= simulator.start
+    assert np.isclose(walk[-1] - walk[0], 0.5, atol=0.05)
+    assert standby[-1] > walk[-1]
@@ -0,0 +1,179 @@
+#!python
+#
+# 2021  Zhengyu Peng
+# Website: https://zpeng.me
+#
+# `                      `
+# -:.                  -#:
+# -//:.              -###:
+# -////:.          -#####:
+# -/:.://:.      -###++##:
+# ..   `://:-  -###+. :##:
+#        `:/+####+.   :##:
+# .::::::::/+###.     :##:
+# .////-----+##:    `:###:
+#  `-//:.   :##:  `:###/.
+#    `-//:. :##:`:###/.
+#      `-//:+######/.
+#        `-/+####/.
+#          `+##+.
+#           :##:
+#           :##:
+#           :##:
+#           :##:
+#           :##:
+#            .+:
+
+
+# Opt-in Chrome trace event recorder, open the dump in chrome://tracing or
+# https://ui.perfetto.dev
+#
+# from tracing import tracer
+# with tracer.span('frame'):
+#     ...
+
+import json
+import os
+import threading
+import time
+
+from collections import deque
+from queue import Queue
+
+
+class NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+class Span:
+    def __init__(self, tracer, name, cat):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        now = time.perf_counter_ns()
+        self.tracer.events.append(
+            ('X', self.name, self.cat, self.start, now - self.start,
+             threading.get_ident(), None))
+        return False
+
+
+class Tracer:
+    # Events are kept in a bounded in-memory buffer, the oldest are dropped.
+    # While disabled every call returns at once.
+    def __init__(self):
+        self.enabled = False
+        self.events = deque(maxlen=1)
+        self.flows = {}
+        self.flow_id = 0
+        self.lock = threading.Lock()
+
+    def enable(self, capacity=1000000):
+        self.events = deque(maxlen=capacity)
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def span(self, name, cat='hexapod'):
+        # complete event from enter to exit
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, cat)
+
+    def instant(self, name, cat='hexapod'):
+        if self.enabled:
+            self.events.append(('i', name, cat, time.perf_counter_ns(), 0,
+                                threading.get_ident(), None))
+
+    def queue_put(self, queue_name, cat='queue'):
+        # handoff between threads, drawn as an arrow to the matching get
+        if not self.enabled:
+            return
+        with self.lock:
+            self.flow_id += 1
+            flow_id = self.flow_id
+            self.flows.setdefault(queue_name, deque()).append(flow_id)
+        self.flow(queue_name + ' put', 's', cat, flow_id)
+
+    def queue_get(self, queue_name, cat='queue'):
+        if not self.enabled:
+            return
+        with self.lock:
+            pending = self.flows.get(queue_name)
+            flow_id = pending.popleft() if pending else None
+        if flow_id is not None:
+            self.flow(queue_name + ' get', 'f', cat, flow_id)
+
+    def flow(self, name, phase, cat, flow_id):
+        now = time.perf_counter_ns()
+        tid = threading.get_ident()
+        # flow events bind to a slice, give them a zero length one
+        self.events.append(('X', name, cat, now, 0, tid, None))
+        self.events.append((phase, name, cat, now, 0, tid, flow_id))
+
+    def dump(self, filename):
+        pid = os.getpid()
+        events = list(self.events)
+
+        trace_events = []
+        for thread in threading.enumerate():
+            name = thread.name
+            if type(thread) is not threading.Thread and \
+                    type(thread).__module__ != 'threading':
+                name = type(thread).__name__
+            trace_events.append({'name': 'thread_name', 'ph': 'M',
+                                 'pid': pid, 'tid': thread.ident,
+                                 'args': {'name': name}})
+
+        for phase, name, cat, start, dur, tid, flow_id in events:
+            event = {'name': name, 'cat': cat, 'ph': phase,
+                     'ts': start/1000, 'pid': pid, 'tid': tid}
+            if phase == 'X':
+                event['dur'] = dur/1000
+            elif phase == 'i':
+                event['s'] = 't'
+            else:
+                event['id'] = flow_id
+                if phase == 'f':
+                    event['bp'] = 'e'
+            trace_events.append(event)
+
+        with open(filename, 'w') as write_file:
+            json.dump({'traceEvents': trace_events,
+                       'displayTimeUnit': 'ms'}, write_file)
+        return len(events)
+
+
+tracer = Tracer()
+
+
+class TracedQueue(Queue):
+    # Unbounded queue recording every handoff, put and get are paired in
+    # order so the trace shows which command went from which thread
+    def __init__(self, name='cmd_queue'):
+        Queue.__init__(self)
+        self.name = name
+        self.trace_lock = threading.Lock()
+
+    def put(self, item, block=True, timeout=None):
+        with self.trace_lock:
+            tracer.queue_put(self.name)
+            Queue.put(self, item, block, timeout)
+
+    def get(self, block=True, timeout=None):
+        item = Queue.get(self, block, timeout)
+        tracer.queue_get(self.name)
+        return item
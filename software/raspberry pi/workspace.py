@@ -0,0 +1,186 @@
+#!python
+#
+# 2021  Zhengyu Peng
+# Website: https://zpeng.me
+#
+# `                      `
+# -:.                  -#:
+# -//:.              -###:
+# -////:.          -#####:
+# -/:.://:.      -###++##:
+# ..   `://:-  -###+. :##:
+#        `:/+####+.   :##:
+# .::::::::/+###.     :##:
+# .////-----+##:    `:###:
+#  `-//:.   :##:  `:###/.
+#    `-//:. :##:`:###/.
+#      `-//:+######/.
+#        `-/+####/.
+#          `+##+.
+#           :##:
+#           :##:
+#           :##:
+#           :##:
+#           :##:
+#            .+:
+
+
+import numpy as np
+
+
+def angle_limits(constraint, correction):
+    # angles Leg.set_angle passes on unclamped, (3, 2)
+    constraint = np.asarray(constraint, dtype=np.float64)
+    correction = np.asarray(correction, dtype=np.float64)
+    return np.stack([np.maximum(constraint[:, 0], -correction),
+                     np.minimum(constraint[:, 1], 180 - correction)], axis=-1)
+
+
+class WorkspaceMap:
+    # Reachable foot positions of every leg, one bit per voxel of a grid in
+    # leg local coordinates
+    #
+    # A voxel is reachable if inverse kinematics has a solution within the
+    # leg's angle limits (6, 3, 2) at all 8 corners. Limits are widened by
+    # tolerance (degree), small overshoots are clamped by Leg.set_angle and
+    # the built-in gaits rely on that. The map is conservative near its
+    # border, solvable() is the exact test of single positions and clamp()
+    # pulls positions beyond a leg's length back into reach. The map is
+    # cached in cache_file and rebuilt when geometry, limits or resolution
+    # change.
+    def __init__(self, kinematics, limits, resolution=2.0, tolerance=15.0,
+                 cache_file=None):
+        self.kinematics = kinematics
+        self.limits = np.asarray(limits, dtype=np.float64) + \
+            np.array([-tolerance, tolerance])
+        self.resolution = resolution
+
+        reach = kinematics.root_j1 + kinematics.j1_j2 + \
+            kinematics.j2_j3 + kinematics.j3_tip
+        height = kinematics.j2_j3 + kinematics.j3_tip
+        self.lower = np.array([-reach, -reach, -height])
+        # voxels along x, y, z
+        self.counts = np.ceil(
+            (np.array([reach, reach, height]) - self.lower) /
+            resolution).astype(np.intp)
+
+        self.key = np.concatenate([
+            [resolution, kinematics.root_j1, kinematics.j1_j2,
+             kinematics.j2_j3, kinematics.j3_tip],
+            self.limits.ravel()])
+
+        self.bits = None
+        if cache_file is not None:
+            self.bits = self.load(cache_file)
+        if self.bits is None:
+            self.bits = self.build()
+            if cache_file is not None:
+                self.save(cache_file)
+
+    def load(self, cache_file):
+        try:
+            with np.load(cache_file) as data:
+                if np.array_equal(data['key'], self.key):
+                    return data['bits']
+        except (OSError, KeyError, ValueError):
+            pass
+        return None
+
+    def save(self, cache_file):
+        try:
+            with open(cache_file, 'wb') as write_file:
+                np.savez(write_file, key=self.key, bits=self.bits)
+        except OSError as err:
+            print(err)
+
+    def build(self):
+        nx, ny, nz = self.counts
+        x = self.lower[0] + self.resolution*np.arange(nx + 1)
+        y = self.lower[1] + self.resolution*np.arange(ny + 1)
+        z = self.lower[2] + self.resolution*np.arange(nz + 1)
+        nodes = np.zeros((ny + 1, nx + 1, 3))
+        nodes[..., 0] = x[np.newaxis, :]
+        nodes[..., 1] = y[:, np.newaxis]
+
+        lo = self.limits[:, np.newaxis, np.newaxis, :, 0]
+        hi = self.limits[:, np.newaxis, np.newaxis, :, 1]
+
+        # one z layer of grid nodes at a time, keeps memory small on the pi
+        voxels = np.zeros((6, nz, ny, nx), dtype=bool)
+        previous = None
+        with np.errstate(invalid='ignore'):
+            for iz in range(nz + 1):
+                nodes[..., 2] = z[iz]
+                angles = self.kinematics.solve_local(nodes)[np.newaxis]
+                valid = np.all((angles >= lo) & (angles <= hi), axis=-1)
+                layer = valid[:, :-1, :-1] & valid[:, 1:, :-1] & \
+                    valid[:, :-1, 1:] & valid[:, 1:, 1:]
+                if previous is not None:
+                    voxels[:, iz - 1] = previous & layer
+                previous = layer
+        return np.packbits(voxels.ravel())
+
+    def contains(self, local_dest):
+        # leg local positions (..., 6, 3) -> reachable (..., 6)
+        with np.errstate(invalid='ignore'):
+            idx = np.floor((local_dest - self.lower)/self.resolution)
+        inside = np.all((idx >= 0) & (idx < self.counts), axis=-1)
+        idx = np.where(inside[..., np.newaxis], idx, 0).astype(np.intp)
+
+        nx, ny, nz = self.counts
+        leg = np.arange(6)
+        flat = ((leg*nz + idx[..., 2])*ny + idx[..., 1])*nx + idx[..., 0]
+        bit = (self.bits[flat >> 3] >> (7 - (flat & 7))) & 1
+        return inside & (bit == 1)
+
+    def reachable(self, dest):
+        # body positions (..., 6, 3) -> reachable (..., 6)
+        return self.contains(self.kinematics.to_local(dest))
+
+    def solvable(self, dest):
+        # body positions (..., 6, 3) -> inverse kinematics within the
+        # limits (..., 6), exact but slower than reachable()
+        with np.errstate(invalid='ignore'):
+            angles = self.kinematics.inverse_kinematics(dest)
+            return np.all((angles >= self.limits[..., 0]) &
+                          (angles <= self.limits[..., 1]), axis=-1)
+
+    def clamp_local(self, local_dest):
+        # leg local positions (..., 6, 3) moved onto the nearest distance
+        # from joint 2 the leg can span, in the same direction
+        kinematics = self.kinematics
+        x = local_dest[..., 0] - kinematics.root_j1
+        y = local_dest[..., 1]
+        z = local_dest[..., 2]
+        horizontal = np.hypot(x, y)
+        # not closer to the body than joint 2
+        radial = np.maximum(horizontal - kinematics.j1_j2, 0)
+        span = np.hypot(radial, z)
+
+        # a little inside the border, arccos must stay defined
+        inner = abs(kinematics.j2_j3 - kinematics.j3_tip) + 1e-6
+        outer = kinematics.j2_j3 + kinematics.j3_tip - 1e-6
+        scale = np.clip(span, inner, outer)/np.maximum(span, 1e-9)
+        radial = np.where(span > 0, radial*scale, inner)
+        z = z*scale
+
+        horizontal_scale = (radial + kinematics.j1_j2) / \
+            np.maximum(horizontal, 1e-9)
+        clamped = np.empty_like(local_dest)
+        clamped[..., 0] = np.where(
+            horizontal > 0, x*horizontal_scale,
+            radial + kinematics.j1_j2) + kinematics.root_j1
+        clamped[..., 1] = y*horizontal_scale
+        clamped[..., 2] = z
+        return clamped
+
+    def clamp(self, dest):
+        # body positions (..., 6, 3) with the legs inverse kinematics has
+        # no solution for clamped, Leg.set_angle clamps the angles to the
+        # limits
+        local_dest = self.kinematics.to_local(dest)
+        with np.errstate(invalid='ignore'):
+            angles = self.kinematics.solve_local(local_dest)
+        solved = np.all(np.isfinite(angles), axis=-1)
+        clamped = self.kinematics.to_body(self.clamp_local(local_dest))
+        return np.where(solved[..., np.newaxis], dest, clamped)